@@ -0,0 +1,220 @@
+# -*- coding: utf-8 -*-
+"""
+ALMACÉN HISTÓRICO DE CARTERA - GRUPO PLANETA
+
+Guarda el resultado tipado de cada ejecución en un conjunto de datos Parquet local,
+de solo anexado, particionado por origen, mes de cierre y empresa, y permite consultar
+agregados entre meses sin reabrir los Excel de resultados.
+
+ESTRUCTURA:
+    historico/ORIGEN=cartera/CIERRE=2025-09/EMPRESA=PL/<ejecucion>.parquet
+
+Cada ejecución escribe archivos nuevos y nunca modifica los anteriores. Si un mes se
+procesa varias veces, las consultas usan solo la última ejecución de ese cierre.
+"""
+
+import os
+import re
+import sys
+import json
+from datetime import datetime
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+
+from utilidades_cartera import convertir_valores_serie, convertir_fechas_serie, extraer_opcion
+from bitacora import obtener_logger
+
+log = obtener_logger(__name__)
+
+# Directorio del almacén histórico
+DIRECTORIO_HISTORICO = r'C:\wamp64\www\modelo-deuda-python\cartera\historico'
+
+# Columnas de partición (en el orden de los directorios)
+ESQUEMA_PARTICION = pa.schema([('ORIGEN', pa.string()), ('CIERRE', pa.string()), ('EMPRESA', pa.string())])
+
+# Columnas del corte histórico y nombres con los que llegan de cada procesador,
+# en orden de preferencia (p. ej. el saldo ya convertido de procesador_cartera)
+COLUMNAS_TEXTO = {
+    'EMPRESA': ['EMPRESA'],
+    'ACTIVIDAD': ['ACTIVIDAD'],
+    'CODIGO AGENTE': ['CODIGO AGENTE'],
+    'AGENTE': ['AGENTE'],
+    'CODIGO COBRADOR': ['CODIGO COBRADOR'],
+    'COBRADOR': ['COBRADOR'],
+    'CODIGO CLIENTE': ['CODIGO CLIENTE'],
+    'IDENTIFICACION': ['IDENTIFICACION'],
+    'DENOMINACION COMERCIAL': ['DENOMINACION COMERCIAL'],
+    'CLAVE CLIENTE': ['CLAVE CLIENTE'],
+    'CLIENTE CANONICO': ['CLIENTE CANONICO'],
+    'NUMERO FACTURA': ['NUMERO FACTURA']
+}
+COLUMNAS_FECHA = {
+    'FECHA VTO': ['FECHA VTO_DT', 'FECHA VTO']
+}
+COLUMNAS_VALOR = {
+    'SALDO': ['SALDO_NUM', 'SALDO'],
+    'DIAS VENCIDO': ['DIAS VENCIDO', 'DIAS_VENCIDO'],
+    'SALDO VENCIDO': ['SALDO VENCIDO', 'SALDO_VENCIDO'],
+    'VALOR DOTACION': ['  Valor Dotación  ', 'Valor Dotación', 'VALOR_DOTACION'],
+    'SALDO NO VENCIDO': ['SALDO NO VENCIDO', 'SALDO_NO_VENCIDO'],
+    'VENCIDO 30': ['VENCIDO 30', 'VENCIDO_30'],
+    'VENCIDO 60': ['VENCIDO 60', 'VENCIDO_60'],
+    'VENCIDO 90': ['VENCIDO 90', 'VENCIDO_90'],
+    'VENCIDO 180': ['VENCIDO 180', 'VENCIDO_180'],
+    'VENCIDO 360': ['VENCIDO 360', 'VENCIDO_360'],
+    'VENCIDO + 360': ['VENCIDO + 360', 'VENCIDO_+360']
+}
+
+def _primera_columna(df, candidatas):
+    """Primera columna candidata presente en el DataFrame (None si no hay ninguna)"""
+    return next((c for c in candidatas if c in df.columns), None)
+
+def _valor_particion(valor):
+    """Valor seguro para un nombre de directorio de partición"""
+    valor = re.sub(r'[^\w\-]', '_', str(valor).strip())
+    return valor or 'SIN_VALOR'
+
+def preparar_corte_historico(df):
+    """
+    Construye el corte histórico tipado a partir del resultado de un procesador:
+    columnas de texto normalizadas, FECHA VTO como fecha y valores como números.
+    """
+    corte = pd.DataFrame(index=df.index)
+
+    for destino, candidatas in COLUMNAS_TEXTO.items():
+        origen = _primera_columna(df, candidatas)
+        if origen is not None:
+            corte[destino] = (df[origen].fillna('').astype(str).str.strip()
+                              .str.replace(r'\.0+$', '', regex=True))
+
+    for destino, candidatas in COLUMNAS_FECHA.items():
+        origen = _primera_columna(df, candidatas)
+        if origen is not None:
+            fechas = df[origen]
+            corte[destino] = fechas if pd.api.types.is_datetime64_any_dtype(fechas) else convertir_fechas_serie(fechas)
+
+    for destino, candidatas in COLUMNAS_VALOR.items():
+        origen = _primera_columna(df, candidatas)
+        if origen is not None:
+            corte[destino] = convertir_valores_serie(df[origen])
+
+    if 'EMPRESA' not in corte.columns:
+        raise ValueError("El resultado no tiene columna EMPRESA; no se puede guardar en el histórico")
+    return corte.reset_index(drop=True)
+
+def guardar_corte_historico(df, fecha_cierre, origen, directorio=None):
+    """
+    Anexa el resultado de una ejecución al almacén histórico: un archivo Parquet por
+    empresa bajo ORIGEN=<origen>/CIERRE=<AAAA-MM>. Devuelve la ruta de la ejecución.
+    """
+    directorio = directorio or DIRECTORIO_HISTORICO
+    cierre = pd.Timestamp(fecha_cierre).strftime('%Y-%m')
+    ejecucion = datetime.now().strftime('%Y%m%dT%H%M%S%f')
+
+    corte = preparar_corte_historico(df)
+    base = os.path.join(directorio, f'ORIGEN={_valor_particion(origen)}', f'CIERRE={cierre}')
+
+    for empresa, parte in corte.groupby('EMPRESA', sort=False):
+        ruta_particion = os.path.join(base, f'EMPRESA={_valor_particion(empresa)}')
+        os.makedirs(ruta_particion, exist_ok=True)
+        parte.drop(columns=['EMPRESA']).to_parquet(os.path.join(ruta_particion, f'{ejecucion}.parquet'), index=False)
+
+    log.info(f"Corte histórico guardado: {origen} {cierre} ({len(corte)} registros)")
+    return base
+
+def registrar_corte_historico(df, fecha_cierre, origen, directorio=None):
+    """Como guardar_corte_historico, pero un fallo del histórico no detiene el procesamiento"""
+    try:
+        return guardar_corte_historico(df, fecha_cierre, origen, directorio)
+    except Exception as e:
+        log.warning(f"No se pudo guardar el corte en el histórico: {e}")
+        return None
+
+def archivos_vigentes(origen='cartera', directorio=None, desde=None, hasta=None):
+    """
+    Archivo de la última ejecución de cada cierre y empresa del origen (cada exportación
+    puede traer solo algunas empresas), opcionalmente limitados a los cierres entre desde
+    y hasta (AAAA-MM). La selección se hace por la estructura de directorios, sin abrir
+    ningún archivo.
+    """
+    base = os.path.join(directorio or DIRECTORIO_HISTORICO, f'ORIGEN={_valor_particion(origen)}')
+    if not os.path.isdir(base):
+        return []
+
+    archivos = []
+    for carpeta_cierre in sorted(os.listdir(base)):
+        cierre = carpeta_cierre.split('=', 1)[-1]
+        if (desde and cierre < desde) or (hasta and cierre > hasta):
+            continue
+        ruta_cierre = os.path.join(base, carpeta_cierre)
+        for carpeta_empresa in sorted(os.listdir(ruta_cierre)):
+            ruta_empresa = os.path.join(ruta_cierre, carpeta_empresa)
+            ejecuciones = [nombre for nombre in os.listdir(ruta_empresa) if nombre.endswith('.parquet')]
+            if ejecuciones:
+                archivos.append(os.path.join(ruta_empresa, max(ejecuciones)))
+    return archivos
+
+def consultar_historico(valores, agrupar_por=('CIERRE', 'EMPRESA'), filtros=None, origen='cartera',
+                        directorio=None, desde=None, hasta=None):
+    """
+    Agregado entre meses: suma de las columnas de valores agrupada por agrupar_por
+    (CIERRE y EMPRESA son columnas de partición). filtros es un diccionario
+    columna -> valor o lista de valores, aplicado al leer los archivos.
+    Ejemplo: consultar_historico(['VENCIDO 180'], filtros={'ACTIVIDAD': '25'})
+    """
+    directorio = directorio or DIRECTORIO_HISTORICO
+    archivos = archivos_vigentes(origen, directorio, desde, hasta)
+    agrupar_por = list(agrupar_por)
+    if not archivos:
+        return pd.DataFrame(columns=agrupar_por + list(valores))
+
+    particion = ds.partitioning(ESQUEMA_PARTICION, flavor='hive')
+    conjunto = ds.dataset(archivos, format='parquet', partitioning=particion, partition_base_dir=directorio)
+
+    filtro = None
+    for columna, valor in (filtros or {}).items():
+        lista = valor if isinstance(valor, (list, tuple, set)) else [valor]
+        condicion = ds.field(columna).isin([str(v) for v in lista])
+        filtro = condicion if filtro is None else filtro & condicion
+
+    columnas = list(dict.fromkeys(agrupar_por + list(valores)))
+    faltantes = [c for c in columnas + list(filtros or {}) if c not in conjunto.schema.names]
+    if faltantes:
+        raise ValueError(f"Columnas no disponibles en el histórico: {', '.join(faltantes)}. "
+                         f"Disponibles: {', '.join(conjunto.schema.names)}")
+    df = conjunto.to_table(columns=columnas, filter=filtro).to_pandas()
+
+    return df.groupby(agrupar_por, sort=True)[list(valores)].sum().reset_index()
+
+if __name__ == "__main__":
+    # python almacen_historico.py "VENCIDO 180" [--agrupar CIERRE,EMPRESA] [--filtro ACTIVIDAD=25]
+    #                             [--origen cartera] [--desde 2024-10] [--hasta 2025-09] [--directorio RUTA]
+    argumentos = sys.argv[1:]
+    agrupar, argumentos = extraer_opcion(argumentos, '--agrupar', 'CIERRE,EMPRESA')
+    filtro, argumentos = extraer_opcion(argumentos, '--filtro')
+    origen, argumentos = extraer_opcion(argumentos, '--origen', 'cartera')
+    desde, argumentos = extraer_opcion(argumentos, '--desde')
+    hasta, argumentos = extraer_opcion(argumentos, '--hasta')
+    directorio, argumentos = extraer_opcion(argumentos, '--directorio')
+
+    if argumentos:
+        filtros = {}
+        if filtro:
+            columna, valor = filtro.split('=', 1)
+            filtros[columna.strip()] = [v.strip() for v in valor.split(',')]
+        try:
+            resultado = consultar_historico(
+                [v.strip() for v in argumentos[0].split(',')],
+                [c.strip() for c in agrupar.split(',')],
+                filtros, origen, directorio, desde, hasta
+            )
+        except ValueError as e:
+            print(f"ERROR: {e}")
+            sys.exit(1)
+        print(json.dumps(resultado.to_dict(orient='records'), indent=2, ensure_ascii=False, default=str))
+    else:
+        print('Uso: python almacen_historico.py <columnas_valor> [--agrupar CIERRE,EMPRESA] [--filtro COLUMNA=V1,V2] '
+              '[--origen cartera|formato_deuda] [--desde AAAA-MM] [--hasta AAAA-MM] [--directorio RUTA]')
+        print('Ejemplo: python almacen_historico.py "VENCIDO 180" --filtro ACTIVIDAD=25')
@@ -0,0 +1,259 @@
+# -*- coding: utf-8 -*-
+"""
+BITÁCORA - GRUPO PLANETA
+
+Registro de mensajes con niveles para los procesadores, en lugar de print. Sobre el
+módulo logging de la librería estándar:
+- Consola: los mismos mensajes de progreso que antes (las páginas PHP buscan líneas
+  como "Archivo generado:"), con el prefijo ADVERTENCIA/ERROR según el nivel.
+- Archivo JSON-lines en cartera/logs/<proceso>_<fecha>.jsonl: un objeto por mensaje con
+  hora, nivel, proceso, módulo, identificador de ejecución y datos adicionales.
+- Errores de conversión agregados: cada valor que no se puede convertir incrementa un
+  contador por categoría y solo se conservan unos pocos ejemplos, en lugar de una línea
+  por valor (cientos de miles en una exportación con datos sucios).
+  Los contadores son del contexto actual: errores_propios da a cada nodo de una ejecución
+  con hilos (orquestador_cierre) sus propios contadores.
+- Modo silencioso: la consola no recibe mensajes (los errores van a stderr) y la única
+  salida estándar es el resultado final en JSON (emitir_resultado).
+
+USO:
+    log = obtener_logger(__name__)
+    log.info("Procesando fechas...")
+    contar_error('convertir_valor', valor, error)
+
+    # En el __main__ del procesador:
+    ruta_log = configurar_bitacora('cartera', silencioso=True)
+    with salida_silenciosa(True):
+        salida = procesar_cartera(...)
+    registrar_resumen_errores()
+    emitir_resultado({'success': salida is not None, 'archivo_generado': salida, 'log': ruta_log})
+"""
+
+import os
+import sys
+import json
+import logging
+import threading
+import contextvars
+from contextlib import contextmanager, redirect_stdout
+from datetime import datetime
+
+# Carpeta de logs de la aplicación (cartera/logs)
+DIRECTORIO_LOGS = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'logs')
+
+NOMBRE_RAIZ = 'cartera'
+
+# Ejemplos que se conservan de cada categoría de error de conversión
+EJEMPLOS_POR_ERROR = 5
+
+PREFIJOS_NIVEL = {
+    logging.WARNING: 'ADVERTENCIA: ',
+    logging.ERROR: 'ERROR: ',
+    logging.CRITICAL: 'ERROR: '
+}
+
+# Contadores del proceso y, dentro de errores_propios, los del bloque en curso
+_errores_proceso = {}
+_errores_contexto = contextvars.ContextVar('errores_conversion', default=_errores_proceso)
+_bloqueo_errores = threading.Lock()
+
+class _FormatoConsola(logging.Formatter):
+    """Mensaje tal cual, con el prefijo del nivel para advertencias y errores"""
+
+    def format(self, registro):
+        mensaje = PREFIJOS_NIVEL.get(registro.levelno, '') + registro.getMessage()
+        if registro.exc_info:
+            mensaje += '\n' + self.formatException(registro.exc_info)
+        return mensaje
+
+class _FormatoJson(logging.Formatter):
+    """Una línea JSON por mensaje"""
+
+    def __init__(self, proceso, ejecucion):
+        super().__init__()
+        self.proceso = proceso
+        self.ejecucion = ejecucion
+
+    def format(self, registro):
+        linea = {
+            'hora': datetime.fromtimestamp(registro.created).isoformat(timespec='milliseconds'),
+            'nivel': registro.levelname,
+            'proceso': self.proceso,
+            'ejecucion': self.ejecucion,
+            'modulo': registro.name,
+            'mensaje': registro.getMessage()
+        }
+        if getattr(registro, 'datos', None) is not None:
+            linea['datos'] = registro.datos
+        if registro.exc_info:
+            linea['excepcion'] = self.formatException(registro.exc_info)
+        return json.dumps(linea, ensure_ascii=False, default=str)
+
+class _ManejadorSalida(logging.StreamHandler):
+    """
+    Escribe en la salida estándar vigente al emitir (no en la de su creación), para que
+    contextlib.redirect_stdout siga funcionando (logs de procesador_lote, trabajadores).
+    """
+
+    def __init__(self):
+        super().__init__(sys.stdout)
+
+    @property
+    def stream(self):
+        return sys.stdout
+
+    @stream.setter
+    def stream(self, valor):
+        pass
+
+def _raiz():
+    """Logger raíz de la aplicación; sin configurar, muestra INFO y superior por consola"""
+    raiz = logging.getLogger(NOMBRE_RAIZ)
+    if not raiz.handlers:
+        manejador = _ManejadorSalida()
+        manejador.setFormatter(_FormatoConsola())
+        raiz.addHandler(manejador)
+        raiz.setLevel(logging.INFO)
+        raiz.propagate = False
+    return raiz
+
+def obtener_logger(modulo):
+    """Logger de un módulo dentro de la jerarquía de la aplicación"""
+    _raiz()
+    return logging.getLogger(f'{NOMBRE_RAIZ}.{modulo}')
+
+def configurar_bitacora(proceso, silencioso=False, nivel='INFO', directorio=None):
+    """
+    Configura la bitácora de un proceso: consola (o solo errores a stderr en modo
+    silencioso) y archivo JSON-lines en directorio, y pone a cero los contadores de
+    errores de conversión. Devuelve la ruta del archivo o None si no se pudo crear (la
+    consola sigue funcionando).
+    """
+    reiniciar_errores()
+    raiz = _raiz()
+    for manejador in list(raiz.handlers):
+        raiz.removeHandler(manejador)
+        if isinstance(manejador, logging.FileHandler):
+            manejador.close()
+    raiz.setLevel(getattr(logging, str(nivel).upper(), logging.INFO))
+
+    if silencioso:
+        consola = logging.StreamHandler(sys.stderr)
+        consola.setLevel(logging.ERROR)
+    else:
+        consola = _ManejadorSalida()
+    consola.setFormatter(_FormatoConsola())
+    raiz.addHandler(consola)
+
+    directorio = directorio or DIRECTORIO_LOGS
+    ejecucion = f"{datetime.now().strftime('%Y%m%dT%H%M%S')}-{os.getpid()}"
+    ruta = os.path.join(directorio, f"{proceso}_{datetime.now().strftime('%Y-%m-%d')}.jsonl")
+    try:
+        os.makedirs(directorio, exist_ok=True)
+        archivo = logging.FileHandler(ruta, encoding='utf-8')
+    except OSError as e:
+        raiz.warning(f"No se pudo abrir el log {ruta}: {e}")
+        return None
+    archivo.setFormatter(_FormatoJson(proceso, ejecucion))
+    raiz.addHandler(archivo)
+    return ruta
+
+def contar_error(categoria, valor, error=None):
+    """
+    Cuenta un error de conversión de la categoría y conserva los primeros ejemplos
+    (que también se registran en el log con nivel DEBUG)
+    """
+    with _bloqueo_errores:
+        entrada = _errores_contexto.get().setdefault(categoria, {'conteo': 0, 'ejemplos': []})
+        entrada['conteo'] += 1
+        if len(entrada['ejemplos']) >= EJEMPLOS_POR_ERROR:
+            return
+        ejemplo = {'valor': str(valor)[:200], 'error': str(error)[:200] if error is not None else None}
+        entrada['ejemplos'].append(ejemplo)
+    obtener_logger('conversion').debug(f"Error de conversión ({categoria}): {valor}", extra={'datos': ejemplo})
+
+def resumen_errores():
+    """Errores de conversión acumulados: categoría -> conteo y ejemplos"""
+    with _bloqueo_errores:
+        return {categoria: {'conteo': e['conteo'], 'ejemplos': list(e['ejemplos'])}
+                for categoria, e in _errores_contexto.get().items()}
+
+def reiniciar_errores():
+    """Pone a cero los contadores de errores de conversión (al empezar un procesamiento)"""
+    with _bloqueo_errores:
+        _errores_contexto.get().clear()
+
+@contextmanager
+def errores_aparte():
+    """
+    Los errores de conversión contados dentro del bloque no se suman a los del proceso
+    (p. ej. al procesar una muestra del archivo antes del procesamiento real)
+    """
+    guardados = resumen_errores()
+    try:
+        yield
+    finally:
+        with _bloqueo_errores:
+            _errores_contexto.get().clear()
+            _errores_contexto.get().update(guardados)
+
+@contextmanager
+def errores_propios():
+    """
+    Contadores de errores de conversión propios del bloque (p. ej. un nodo que se ejecuta en
+    un hilo junto a otros): su resumen solo incluye los errores del bloque, que al salir se
+    suman a los contadores anteriores
+    """
+    anteriores = _errores_contexto.get()
+    marca = _errores_contexto.set({})
+    try:
+        yield
+    finally:
+        propios = resumen_errores()
+        _errores_contexto.reset(marca)
+        with _bloqueo_errores:
+            for categoria, entrada in propios.items():
+                destino = anteriores.setdefault(categoria, {'conteo': 0, 'ejemplos': []})
+                destino['conteo'] += entrada['conteo']
+                destino['ejemplos'].extend(entrada['ejemplos'][:EJEMPLOS_POR_ERROR - len(destino['ejemplos'])])
+
+def registrar_resumen_errores(log=None):
+    """Una advertencia por categoría con el total de errores y sus ejemplos. Devuelve el resumen"""
+    log = log or obtener_logger('conversion')
+    resumen = resumen_errores()
+    for categoria, entrada in resumen.items():
+        ejemplos = ', '.join(repr(e['valor']) for e in entrada['ejemplos'])
+        log.warning(f"{entrada['conteo']} errores de conversión ({categoria}); ejemplos: {ejemplos}",
+                    extra={'datos': {'categoria': categoria, **entrada}})
+    return resumen
+
+@contextmanager
+def salida_silenciosa(silencioso=True):
+    """
+    En modo silencioso descarta lo que los módulos auxiliares aún escriben con print,
+    para que la única salida estándar sea el resultado de emitir_resultado
+    """
+    if not silencioso:
+        yield
+        return
+    with open(os.devnull, 'w', encoding='utf-8') as nulo, redirect_stdout(nulo):
+        yield
+
+@contextmanager
+def nivel_temporal(nivel):
+    """
+    Eleva temporalmente el nivel mínimo de la bitácora, p. ej. para no repetir los mensajes
+    de progreso de una etapa en cada bloque de filas
+    """
+    raiz = _raiz()
+    anterior = raiz.level
+    raiz.setLevel(max(anterior, nivel))
+    try:
+        yield
+    finally:
+        raiz.setLevel(anterior)
+
+def emitir_resultado(resultado):
+    """Escribe el resultado final en JSON (una línea) en la salida estándar"""
+    sys.stdout.write(json.dumps(resultado, ensure_ascii=False, default=str) + '\n')
+    sys.stdout.flush()
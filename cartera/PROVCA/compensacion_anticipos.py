@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+"""
+COMPENSACIÓN DE ANTICIPOS CONTRA FACTURAS - GRUPO PLANETA
+
+Aplica los anticipos (saldos negativos) de cada cliente contra sus facturas abiertas,
+empezando por la de vencimiento más antiguo, para obtener la exposición neta por cliente.
+
+PROCESO:
+1. Construir la clave de cliente (CODIGO CLIENTE o, si falta, IDENTIFICACION) y el grupo de moneda
+2. Totalizar los anticipos disponibles por cliente
+3. Ordenar las facturas por cliente y fecha de vencimiento
+4. Aplicar los anticipos con sumas acumuladas por cliente (sin bucles por cliente)
+5. Calcular saldos netos por rango de vencimiento y anticipos no aplicados
+"""
+
+import numpy as np
+import pandas as pd
+
+from utilidades_cartera import convertir_valores_serie, convertir_fechas_serie
+from procesador_cartera import VENCIMIENTOS_RANGOS
+from bitacora import obtener_logger
+
+log = obtener_logger(__name__)
+
+# Actividades facturadas en divisas; el resto se factura en pesos
+ACTIVIDADES_DIVISAS = [11, 18, 41, 57]
+
+def normalizar_codigo(serie):
+    """Normaliza códigos leídos como texto o número (69, '69', 69.0 -> '69')"""
+    return (serie.fillna('').astype(str).str.strip()
+            .str.replace(r'\.0+$', '', regex=True))
+
+def clave_cliente(df):
+    """
+    Clave de cliente: la CLAVE CLIENTE canónica si provisión y anticipos se resolvieron
+    juntos; si no, CODIGO CLIENTE normalizado o, si está vacío, la IDENTIFICACION
+    """
+    if 'CLAVE CLIENTE' in df.columns:
+        return df['CLAVE CLIENTE'].fillna('').astype(str)
+    codigo = normalizar_codigo(df['CODIGO CLIENTE']) if 'CODIGO CLIENTE' in df.columns \
+        else pd.Series('', index=df.index)
+    if 'IDENTIFICACION' in df.columns:
+        identificacion = normalizar_codigo(df['IDENTIFICACION'])
+        codigo = codigo.where(codigo != '', 'ID ' + identificacion)
+    return codigo
+
+def grupo_moneda(df):
+    """Grupo de moneda de cada fila según su ACTIVIDAD: los anticipos solo compensan en su moneda"""
+    if 'ACTIVIDAD' not in df.columns:
+        return pd.Series('PESOS', index=df.index)
+    actividad = pd.to_numeric(normalizar_codigo(df['ACTIVIDAD']), errors='coerce')
+    return pd.Series(np.where(actividad.isin(ACTIVIDADES_DIVISAS), 'DIVISAS', 'PESOS'), index=df.index)
+
+def rango_vencimiento(dias_vencido):
+    """Nombre del rango de vencimiento (VENCIMIENTOS_RANGOS) de cada valor de días vencidos"""
+    limites = [rango[1] for rango in VENCIMIENTOS_RANGOS] + [np.inf]
+    nombres = [rango[0] for rango in VENCIMIENTOS_RANGOS]
+    return pd.cut(dias_vencido, bins=limites, labels=nombres, right=False).astype(str)
+
+def compensar_anticipos(df_provision, df_anticipos, fecha_cierre):
+    """
+    Compensa anticipos contra facturas abiertas por cliente y moneda, de la más antigua a
+    la más reciente. Devuelve un diccionario con:
+    - 'facturas': detalle por factura (índice de provisión, ANTICIPO APLICADO, SALDO NETO)
+    - 'neto_clientes': saldo bruto, anticipos, saldo neto y saldo neto por rango por cliente
+    - 'anticipos_no_aplicados': anticipos que exceden la deuda abierta del cliente
+    """
+    log.info("Compensando anticipos contra facturas...")
+
+    fecha_cierre = pd.Timestamp(fecha_cierre)
+
+    facturas = pd.DataFrame({
+        'CLIENTE': clave_cliente(df_provision),
+        'MONEDA': grupo_moneda(df_provision),
+        'NOMBRE': df_provision.get('DENOMINACION COMERCIAL', pd.Series('', index=df_provision.index)),
+        'FECHA VTO': convertir_fechas_serie(df_provision['FECHA VTO']),
+        'SALDO': convertir_valores_serie(df_provision['SALDO'])
+    }, index=df_provision.index)
+
+    # Importe disponible de anticipos por cliente y moneda (en positivo)
+    anticipos = pd.DataFrame({
+        'CLIENTE': clave_cliente(df_anticipos),
+        'MONEDA': grupo_moneda(df_anticipos),
+        'ANTICIPOS': (-convertir_valores_serie(df_anticipos['SALDO'])).clip(lower=0)
+    })
+    disponible = anticipos.groupby(['CLIENTE', 'MONEDA'], sort=False)['ANTICIPOS'].sum()
+
+    # Ordenar facturas por cliente y vencimiento (las más antiguas primero)
+    facturas = facturas.sort_values(['CLIENTE', 'MONEDA', 'FECHA VTO'], kind='mergesort', na_position='last')
+    facturas = facturas.join(disponible, on=['CLIENTE', 'MONEDA'])
+    facturas['ANTICIPOS'] = facturas['ANTICIPOS'].fillna(0.0)
+
+    # Solo los saldos abiertos (positivos) reciben anticipos
+    abierto = facturas['SALDO'].clip(lower=0)
+    acumulado_previo = abierto.groupby([facturas['CLIENTE'], facturas['MONEDA']], sort=False).cumsum() - abierto
+    facturas['ANTICIPO APLICADO'] = np.minimum(abierto, (facturas['ANTICIPOS'] - acumulado_previo).clip(lower=0))
+    facturas['SALDO NETO'] = facturas['SALDO'] - facturas['ANTICIPO APLICADO']
+
+    # Rango de vencimiento de cada factura respecto a la fecha de cierre
+    dias_vencido = (fecha_cierre - facturas['FECHA VTO']).dt.days.fillna(0).clip(lower=0)
+    facturas['RANGO'] = rango_vencimiento(dias_vencido)
+
+    claves = ['CLIENTE', 'MONEDA']
+    agrupado = facturas.groupby(claves, sort=False)
+    neto = agrupado.agg(**{
+        'NOMBRE': ('NOMBRE', 'first'),
+        'SALDO BRUTO': ('SALDO', 'sum'),
+        'ANTICIPO APLICADO': ('ANTICIPO APLICADO', 'sum'),
+        'SALDO NETO': ('SALDO NETO', 'sum')
+    })
+    por_rango = facturas.pivot_table(index=claves, columns='RANGO', values='SALDO NETO',
+                                     aggfunc='sum', fill_value=0.0, observed=True)
+    por_rango = por_rango.reindex(columns=[rango[0] for rango in VENCIMIENTOS_RANGOS], fill_value=0.0)
+    neto = neto.join(por_rango)
+
+    # Anticipos por cliente, incluidos los de clientes sin facturas abiertas
+    aplicados = neto['ANTICIPO APLICADO'].reindex(disponible.index, fill_value=0.0)
+    no_aplicados = pd.DataFrame({
+        'ANTICIPOS': disponible,
+        'ANTICIPO APLICADO': aplicados,
+        'ANTICIPO NO APLICADO': disponible - aplicados
+    })
+    no_aplicados = no_aplicados[no_aplicados['ANTICIPO NO APLICADO'] > 0.005]
+
+    neto = neto.join(disponible.rename('ANTICIPOS'), how='left')
+    neto['ANTICIPOS'] = neto['ANTICIPOS'].fillna(0.0)
+    neto['ANTICIPO NO APLICADO'] = neto['ANTICIPOS'] - neto['ANTICIPO APLICADO']
+
+    log.info(f"Clientes compensados: {int((neto['ANTICIPO APLICADO'] > 0).sum())}. "
+             f"Anticipo aplicado: {neto['ANTICIPO APLICADO'].sum():,.2f}. "
+             f"Anticipo no aplicado: {no_aplicados['ANTICIPO NO APLICADO'].sum():,.2f}")
+
+    return {
+        'facturas': facturas[claves + ['FECHA VTO', 'SALDO', 'ANTICIPO APLICADO', 'SALDO NETO', 'RANGO']],
+        'neto_clientes': neto.reset_index(),
+        'anticipos_no_aplicados': no_aplicados.reset_index()
+    }
@@ -0,0 +1,186 @@
+# -*- coding: utf-8 -*-
+"""
+CONSULTA INDEXADA DE RESULTADOS DE CARTERA - GRUPO PLANETA
+
+Al final de cada ejecución de procesar_cartera se guarda una copia columnar (Arrow) del
+resultado y un índice ordenado por cada campo de búsqueda con el desplazamiento de sus
+filas. Las consultas por cliente, agente o cobrador leen solo las filas encontradas,
+sin volver a cargar el libro ni el conjunto completo.
+
+ESTRUCTURA (junto al Excel generado):
+    CARTERA_PROCESADA_<fecha>_consulta/
+        datos.arrow                      copia columnar del resultado
+        indice_CODIGO_CLIENTE.arrow      CLAVE ordenada + FILA
+        ...
+        meta.json
+"""
+
+import os
+import sys
+import json
+import glob
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+
+from bitacora import obtener_logger
+
+log = obtener_logger(__name__)
+
+# Claves que se guardan como enteros: sin ceros a la izquierda (que distinguen "0123" de
+# "123") y de hasta 18 dígitos para que quepan en int64
+PATRON_CLAVE_ENTERA = r'-?(?:0|[1-9]\d{0,17})'
+
+# Campos indexados
+CAMPOS_INDICE = ['CODIGO CLIENTE', 'IDENTIFICACION', 'CLAVE CLIENTE', 'CODIGO AGENTE', 'CODIGO COBRADOR']
+
+SUFIJO_CONSULTA = '_consulta'
+ARCHIVO_DATOS = 'datos.arrow'
+ARCHIVO_META = 'meta.json'
+
+def _archivo_indice(campo):
+    """Nombre del archivo de índice de un campo"""
+    return f"indice_{campo.replace(' ', '_')}.arrow"
+
+def normalizar_claves(serie):
+    """Normaliza los valores de un campo de búsqueda (texto sin espacios ni '.0' final)"""
+    return serie.fillna('').astype(str).str.strip().str.replace(r'\.0+$', '', regex=True)
+
+def _tabla_columnar(df):
+    """Convierte el resultado a una tabla Arrow: las columnas de objetos mixtos pasan a texto"""
+    copia = df.copy()
+    for col in copia.columns:
+        if copia[col].dtype == 'object':
+            copia[col] = copia[col].where(copia[col].isna(), copia[col].astype(str)).astype('string')
+    copia.columns = [str(c) for c in copia.columns]
+    return pa.Table.from_pandas(copia, preserve_index=False)
+
+def construir_indice(serie):
+    """
+    Índice de un campo: claves no vacías ordenadas y la fila de cada una. Si todas las
+    claves son enteros sin ceros a la izquierda que caben en int64 se guardan como enteros
+    para que los rangos sigan el orden numérico; si no, se conservan como texto.
+    """
+    claves = normalizar_claves(serie).reset_index(drop=True)
+    claves = claves[claves != '']
+    numericas = claves.str.fullmatch(PATRON_CLAVE_ENTERA).all()
+    valores = claves.astype('int64') if numericas and len(claves) else claves.astype(str)
+
+    orden = np.argsort(valores.to_numpy(), kind='stable')
+    return pa.table({
+        'CLAVE': pa.array(valores.to_numpy()[orden]),
+        'FILA': pa.array(claves.index.to_numpy()[orden], type=pa.int64())
+    })
+
+def generar_consulta(df, output_path, campos=None):
+    """
+    Guarda la copia columnar del resultado y el índice de cada campo junto al archivo
+    de salida. Devuelve el directorio de consulta.
+    """
+    campos = [c for c in (campos or CAMPOS_INDICE) if c in df.columns]
+    directorio = os.path.splitext(output_path)[0] + SUFIJO_CONSULTA
+    os.makedirs(directorio, exist_ok=True)
+
+    # Sin compresión para poder abrir el archivo con memoria mapeada
+    feather.write_feather(_tabla_columnar(df), os.path.join(directorio, ARCHIVO_DATOS), compression='uncompressed')
+    for campo in campos:
+        feather.write_feather(construir_indice(df[campo]), os.path.join(directorio, _archivo_indice(campo)),
+                              compression='uncompressed')
+
+    with open(os.path.join(directorio, ARCHIVO_META), 'w', encoding='utf-8') as f:
+        json.dump({
+            'origen': output_path,
+            'registros': len(df),
+            'campos': campos,
+            'fecha': datetime.now().isoformat()
+        }, f, indent=2, ensure_ascii=False)
+
+    log.info(f"Índice de consulta generado: {directorio} ({', '.join(campos)})")
+    return directorio
+
+def buscar_ultima_consulta(directorio):
+    """Directorio de consulta más reciente dentro de un directorio de resultados"""
+    candidatos = [d for d in glob.glob(os.path.join(directorio, f'*{SUFIJO_CONSULTA}')) if os.path.isdir(d)]
+    if not candidatos:
+        raise FileNotFoundError(f"No hay resultados indexados en {directorio}")
+    return max(candidatos, key=os.path.getmtime)
+
+def abrir_consulta(directorio):
+    """
+    Abre un directorio de consulta: los datos quedan mapeados en memoria (no se cargan)
+    y los índices se leen una sola vez. Devuelve un diccionario reutilizable entre consultas.
+    """
+    with open(os.path.join(directorio, ARCHIVO_META), 'r', encoding='utf-8') as f:
+        meta = json.load(f)
+
+    indices = {}
+    for campo in meta['campos']:
+        tabla = feather.read_table(os.path.join(directorio, _archivo_indice(campo)), memory_map=True)
+        indices[campo] = (tabla.column('CLAVE').to_numpy(zero_copy_only=False),
+                          tabla.column('FILA').to_numpy())
+
+    return {
+        'directorio': directorio,
+        'meta': meta,
+        'datos': feather.read_table(os.path.join(directorio, ARCHIVO_DATOS), memory_map=True),
+        'indices': indices
+    }
+
+def _convertir_clave(claves, valor):
+    """Convierte el valor buscado al tipo de las claves del índice"""
+    valor = normalizar_claves(pd.Series([valor])).iloc[0]
+    if claves.dtype.kind == 'i':
+        try:
+            valor = int(valor)
+        except ValueError:
+            return None
+        return valor if np.iinfo(np.int64).min <= valor <= np.iinfo(np.int64).max else None
+    return valor
+
+def _filas(consulta, campo, desde, hasta):
+    """Filas cuya clave está entre desde y hasta (ambos incluidos) por búsqueda binaria"""
+    if campo not in consulta['indices']:
+        raise ValueError(f"El campo '{campo}' no está indexado. Campos: {', '.join(consulta['indices'])}")
+    claves, filas = consulta['indices'][campo]
+    desde, hasta = _convertir_clave(claves, desde), _convertir_clave(claves, hasta)
+    if desde is None or hasta is None:
+        return np.array([], dtype=np.int64)
+    inicio = np.searchsorted(claves, desde, side='left')
+    fin = np.searchsorted(claves, hasta, side='right')
+    return np.sort(filas[inicio:fin])
+
+def buscar(consulta, campo, valor):
+    """Todas las filas del resultado con campo == valor (p. ej. todo lo del cliente X)"""
+    return buscar_rango(consulta, campo, valor, valor)
+
+def buscar_rango(consulta, campo, desde, hasta):
+    """Filas del resultado con el campo entre desde y hasta, en el orden del archivo original"""
+    filas = _filas(consulta, campo, desde, hasta)
+    return consulta['datos'].take(pa.array(filas, type=pa.int64())).to_pandas()
+
+if __name__ == "__main__":
+    # python consulta_resultados.py <directorio_consulta|directorio_resultados> <CAMPO> <VALOR> [<HASTA>]
+    if len(sys.argv) >= 4:
+        ruta = sys.argv[1]
+        if not os.path.exists(os.path.join(ruta, ARCHIVO_META)):
+            ruta = buscar_ultima_consulta(ruta)
+        consulta = abrir_consulta(ruta)
+        campo = sys.argv[2]
+        hasta = sys.argv[4] if len(sys.argv) > 4 else sys.argv[3]
+        try:
+            resultado = buscar_rango(consulta, campo, sys.argv[3], hasta)
+        except ValueError as e:
+            print(f"ERROR: {e}")
+            sys.exit(1)
+        print(json.dumps({
+            'consulta': ruta,
+            'registros': len(resultado),
+            'filas': resultado.to_dict(orient='records')
+        }, indent=2, ensure_ascii=False, default=str))
+    else:
+        print("Uso: python consulta_resultados.py <directorio_consulta|directorio_resultados> <CAMPO> <VALOR> [<HASTA>]")
+        print(f"Campos: {', '.join(CAMPOS_INDICE)}")
+        print('Ejemplo: python consulta_resultados.py resultados "CODIGO COBRADOR" 8')
@@ -0,0 +1,155 @@
+# -*- coding: utf-8 -*-
+"""
+CUBO DE VENCIMIENTOS - GRUPO PLANETA
+
+Precalcula los totales de cartera por EMPRESA × ACTIVIDAD × MONEDA × rango de vencimiento
+× agente, con todos los subtotales y el total general, para que el dashboard y los
+informes obtengan cualquier corte sin recorrer las facturas.
+
+PROCESO:
+1. Normalizar el resultado tipado del procesador (mismas columnas que el histórico)
+2. Una sola agrupación a nivel de factura por todas las dimensiones
+3. Subtotales de cada combinación de dimensiones a partir de esa agrupación
+4. Guardar el cubo en un archivo Parquet compacto junto a la salida
+5. Consultar cortes del cubo filtrando solo sus filas
+"""
+
+import os
+import sys
+import json
+from itertools import combinations
+
+import pandas as pd
+
+from almacen_historico import preparar_corte_historico
+from compensacion_anticipos import grupo_moneda, rango_vencimiento
+from bitacora import obtener_logger
+
+log = obtener_logger(__name__)
+
+# Dimensiones del cubo y etiqueta de las filas de subtotal
+DIMENSIONES_CUBO = ['EMPRESA', 'ACTIVIDAD', 'MONEDA', 'RANGO', 'CODIGO AGENTE']
+ETIQUETA_TOTAL = 'TOTAL'
+
+# Rango de las facturas sin DIAS VENCIDO (distinto del subtotal para no confundirlas con él)
+ETIQUETA_SIN_RANGO = 'SIN RANGO'
+
+# Medidas sumadas en cada celda del cubo
+MEDIDAS_CUBO = ['SALDO', 'SALDO VENCIDO', 'VALOR DOTACION']
+
+SUFIJO_CUBO = '_cubo.parquet'
+
+def construir_cubo(df, dimensiones=None, conjuntos=None):
+    """
+    Construye el cubo a partir del resultado tipado de procesar_cartera o de la provisión
+    del formato de deuda. conjuntos limita las combinaciones de dimensiones a calcular
+    (por defecto todas, incluido el total general); en cada fila, las dimensiones que
+    no forman parte de la combinación valen ETIQUETA_TOTAL.
+    """
+    log.info("Construyendo cubo de vencimientos...")
+
+    dimensiones = dimensiones or DIMENSIONES_CUBO
+    corte = preparar_corte_historico(df)
+    corte['MONEDA'] = grupo_moneda(corte)
+    if 'DIAS VENCIDO' in corte.columns:
+        dias = corte['DIAS VENCIDO']
+        corte['RANGO'] = rango_vencimiento(dias.clip(lower=0)).where(dias.notna(), ETIQUETA_SIN_RANGO)
+    else:
+        corte['RANGO'] = ETIQUETA_SIN_RANGO
+    for dimension in dimensiones:
+        if dimension not in corte.columns:
+            corte[dimension] = ''
+    medidas = [m for m in MEDIDAS_CUBO if m in corte.columns]
+
+    # Única pasada sobre las facturas: nivel más detallado
+    corte['FACTURAS'] = 1
+    base = corte.groupby(dimensiones, sort=False)[medidas + ['FACTURAS']].sum()
+
+    if conjuntos is None:
+        conjuntos = [c for n in range(len(dimensiones), -1, -1) for c in combinations(dimensiones, n)]
+
+    # Subtotales: se agregan sobre la base ya agrupada, no sobre las facturas
+    partes = []
+    for conjunto in conjuntos:
+        conjunto = list(conjunto)
+        if conjunto:
+            parte = base.groupby(level=conjunto, sort=False).sum().reset_index()
+        else:
+            parte = base.sum().to_frame().T
+        for dimension in dimensiones:
+            if dimension not in conjunto:
+                parte[dimension] = ETIQUETA_TOTAL
+        partes.append(parte[dimensiones + medidas + ['FACTURAS']])
+
+    cubo = pd.concat(partes, ignore_index=True)
+    for dimension in dimensiones:
+        cubo[dimension] = cubo[dimension].astype(str).astype('category')
+    cubo['FACTURAS'] = cubo['FACTURAS'].astype('int64')
+
+    log.info(f"Cubo construido: {len(cubo)} celdas a partir de {len(corte)} registros")
+    return cubo
+
+def guardar_cubo(cubo, output_path):
+    """Guarda el cubo junto al archivo de salida y devuelve su ruta"""
+    ruta = os.path.splitext(output_path)[0] + SUFIJO_CUBO
+    cubo.to_parquet(ruta, index=False, compression='zstd')
+    log.info(f"Cubo de vencimientos guardado: {ruta}")
+    return ruta
+
+def generar_cubo(df, output_path):
+    """Construye y guarda el cubo; un fallo no detiene el procesamiento"""
+    try:
+        return guardar_cubo(construir_cubo(df), output_path)
+    except Exception as e:
+        log.warning(f"No se pudo generar el cubo de vencimientos: {e}")
+        return None
+
+def cargar_cubo(ruta):
+    """Carga un cubo guardado"""
+    return pd.read_parquet(ruta)
+
+def consultar_cubo(cubo, filtros=None):
+    """
+    Devuelve un corte del cubo. filtros es un diccionario dimensión -> valor:
+    - dimensión ausente: subtotal (filas con ETIQUETA_TOTAL)
+    - valor concreto: solo ese valor
+    - '*': desglose por todos los valores de la dimensión
+    Ejemplo: consultar_cubo(cubo, {'EMPRESA': 'PL', 'RANGO': '*'}) -> saldo de PL por rango
+    """
+    filtros = filtros or {}
+    dimensiones = [c for c in cubo.columns if isinstance(cubo[c].dtype, pd.CategoricalDtype)]
+    desconocidas = [d for d in filtros if d not in dimensiones]
+    if desconocidas:
+        raise ValueError(f"Dimensiones desconocidas: {', '.join(desconocidas)}. Dimensiones: {', '.join(dimensiones)}")
+
+    mascara = pd.Series(True, index=cubo.index)
+    for dimension in dimensiones:
+        valor = filtros.get(dimension, ETIQUETA_TOTAL)
+        if valor == '*':
+            mascara &= cubo[dimension] != ETIQUETA_TOTAL
+        else:
+            mascara &= cubo[dimension] == str(valor)
+
+    resultado = cubo[mascara]
+    desglose = [d for d in dimensiones if filtros.get(d) == '*']
+    if desglose:
+        resultado = resultado.sort_values(desglose)
+    return resultado.reset_index(drop=True)
+
+if __name__ == "__main__":
+    # python cubo_vencimientos.py <archivo_cubo> [DIMENSION=VALOR ...]   (VALOR '*' para desglosar)
+    if len(sys.argv) > 1:
+        filtros = dict(arg.split('=', 1) for arg in sys.argv[2:])
+        try:
+            resultado = consultar_cubo(cargar_cubo(sys.argv[1]), filtros)
+        except ValueError as e:
+            print(f"ERROR: {e}")
+            sys.exit(1)
+        for dimension in resultado.columns:
+            if isinstance(resultado[dimension].dtype, pd.CategoricalDtype):
+                resultado[dimension] = resultado[dimension].astype(str)
+        print(json.dumps(resultado.to_dict(orient='records'), indent=2, ensure_ascii=False))
+    else:
+        print("Uso: python cubo_vencimientos.py <archivo_cubo> [DIMENSION=VALOR ...]")
+        print(f"Dimensiones: {', '.join(DIMENSIONES_CUBO)}")
+        print('Ejemplo: python cubo_vencimientos.py CARTERA_PROCESADA_cubo.parquet EMPRESA=PL "RANGO=*"')
@@ -0,0 +1,319 @@
+# -*- coding: utf-8 -*-
+"""
+ESCRITURA DE EXCEL EN STREAMING - GRUPO PLANETA
+
+Funciones para generar libros Excel con memoria acotada:
+1. Libros de solo escritura (openpyxl write_only) que se vuelcan fila a fila
+2. Escritura de DataFrames en hojas de solo escritura
+3. Copia directa de hojas de un libro origen leído en modo de solo lectura,
+   sin pasar por pandas, con filtro opcional de filas
+4. Salida dividida: una hoja que supera el límite de filas de Excel continúa en hojas
+   PESOS_1, PESOS_2, ... con el encabezado repetido, y con un tamaño máximo de archivo
+   las filas siguientes pasan a <salida>_parte2.xlsx, <salida>_parte3.xlsx, ... Si hay
+   división, el primer archivo lleva una hoja TOTALES con las filas y los importes de
+   cada parte.
+
+ESTRUCTURA (salida dividida):
+    abrir_salida_dividida(ruta, max_mb)     estado de la salida (libros, partes, tamaño)
+    iniciar_hoja / escribir_filas           hoja lógica escrita por bloques de filas
+    escribir_dataframe_dividido             hoja lógica completa desde un DataFrame
+    cerrar_salida_dividida                  hoja TOTALES y guardado de todos los archivos
+"""
+
+import io
+import os
+import pandas as pd
+from openpyxl import Workbook, load_workbook
+
+from bitacora import obtener_logger
+
+log = obtener_logger('escritura_excel')
+
+# Extensiones que openpyxl puede abrir en modo de solo lectura
+EXTENSIONES_OPENPYXL = ('.xlsx', '.xlsm', '.xltx', '.xltm')
+
+# Filas de una hoja de Excel (encabezado incluido) y longitud máxima de su nombre
+MAX_FILAS_HOJA = 1048576
+MAX_NOMBRE_HOJA = 31
+
+NOMBRE_HOJA_TOTALES = 'TOTALES'
+
+# Filas con que se mide el tamaño en disco de cada fila de una hoja
+FILAS_MUESTRA_TAMANO = 1000
+
+# Filas leídas del origen por cada escritura al copiar una hoja
+FILAS_BLOQUE_COPIA = 10000
+
+# Fracción de max_mb que se llena: margen para la parte fija del libro y el error de la
+# estimación por muestra
+FRACCION_TAMANO_UTIL = 0.95
+
+MB = 1024 * 1024
+
+def crear_libro_streaming():
+    """Crea un libro de solo escritura: las filas se vuelcan al disco al añadirse"""
+    return Workbook(write_only=True)
+
+def _normalizar_filtro(valor):
+    """Normaliza un valor de celda para compararlo con los valores del filtro"""
+    if valor is None:
+        return ''
+    return str(valor).strip()
+
+def _filas_valores(df):
+    """Filas de df como tuplas, con NaN/NaT convertidos a celdas vacías sin recorrer valor a valor"""
+    return df.astype(object).where(df.notna(), None).itertuples(index=False, name=None)
+
+def ruta_parte(output_path, numero):
+    """Ruta del archivo número (1 = el propio output_path) de una salida dividida"""
+    if numero <= 1:
+        return output_path
+    base, extension = os.path.splitext(output_path)
+    return f"{base}_parte{numero}{extension}"
+
+def nombre_hoja_parte(nombre_hoja, numero):
+    """Nombre de la parte número (0 = la hoja original) de una hoja: PESOS, PESOS_1, PESOS_2, ..."""
+    if numero == 0:
+        return nombre_hoja[:MAX_NOMBRE_HOJA]
+    sufijo = f'_{numero}'
+    return nombre_hoja[:MAX_NOMBRE_HOJA - len(sufijo)] + sufijo
+
+def _bytes_libro(df, celdas=None):
+    """Tamaño del libro guardado en memoria con las filas de df en una hoja"""
+    libro = crear_libro_streaming()
+    hoja = libro.create_sheet(title='MUESTRA')
+    for fila in _filas_valores(df):
+        hoja.append(celdas(hoja, fila) if celdas else fila)
+    destino = io.BytesIO()
+    libro.save(destino)
+    return destino.tell()
+
+def estimar_bytes_fila(df, celdas=None):
+    """
+    Bytes por fila en el archivo guardado (comprimido), medidos escribiendo en memoria una
+    muestra de df y descontando la parte fija del libro. Con más filas la compresión mejora,
+    así que el tamaño real queda por debajo de la estimación.
+    """
+    muestra = df.head(FILAS_MUESTRA_TAMANO)
+    if muestra.empty:
+        return 0.0
+    return max(_bytes_libro(muestra, celdas) - _bytes_libro(muestra.head(0), celdas), 1) / len(muestra)
+
+def requiere_division(df, max_mb=None, max_filas=MAX_FILAS_HOJA):
+    """Indica si df no cabe en una sola hoja o, estimado por muestra, supera max_mb"""
+    if len(df) > max_filas - 1:
+        return True
+    return bool(max_mb) and estimar_bytes_fila(df) * len(df) > max_mb * MB * FRACCION_TAMANO_UTIL
+
+def abrir_salida_dividida(output_path, max_mb=None, max_filas=MAX_FILAS_HOJA):
+    """
+    Estado de una salida que se reparte en hojas de a lo sumo max_filas filas y, con max_mb,
+    en archivos de a lo sumo ese tamaño estimado. Los libros son de solo escritura: mantener
+    varios abiertos no retiene sus filas en memoria.
+    """
+    return {
+        'ruta': output_path,
+        'max_filas': max_filas,
+        'max_bytes': max_mb * MB * FRACCION_TAMANO_UTIL if max_mb else None,
+        'libros': [crear_libro_streaming()],
+        'bytes': 0.0,
+        'hoja': None,
+        'partes': []
+    }
+
+def iniciar_hoja(salida, nombre_hoja, encabezado, celdas=None):
+    """
+    Empieza una hoja lógica de la salida; sus filas se añaden con escribir_filas.
+    celdas(hoja, valores) construye las celdas de una fila (p. ej. con alineación).
+    """
+    _terminar_hoja(salida)
+    salida['hoja'] = {
+        'nombre': nombre_hoja,
+        'encabezado': list(encabezado),
+        'celdas': celdas,
+        'bytes_fila': None,
+        'numero': 0,
+        'destino': None,
+        'filas': 0
+    }
+
+def _abrir_parte(salida):
+    """Crea la hoja de la siguiente parte de la hoja lógica en el último archivo, con su encabezado"""
+    hoja = salida['hoja']
+    nombre = nombre_hoja_parte(hoja['nombre'], hoja['numero'])
+    destino = salida['libros'][-1].create_sheet(title=nombre)
+    if hoja['encabezado']:
+        destino.append(hoja['celdas'](destino, hoja['encabezado']) if hoja['celdas'] else hoja['encabezado'])
+    hoja.update(destino=destino, filas=0, numero=hoja['numero'] + 1)
+    salida['partes'].append({
+        'hoja_origen': hoja['nombre'],
+        'archivo': ruta_parte(salida['ruta'], len(salida['libros'])),
+        'hoja': nombre,
+        'filas': 0,
+        'totales': None
+    })
+
+def _siguiente_parte(salida):
+    """Nueva parte de la hoja lógica; en un archivo nuevo si en el actual no cabe otra fila"""
+    bytes_fila = salida['hoja']['bytes_fila'] or 0
+    if salida['max_bytes'] and salida['bytes'] > 0 and salida['bytes'] + bytes_fila > salida['max_bytes']:
+        salida['libros'].append(crear_libro_streaming())
+        salida['bytes'] = 0.0
+    _abrir_parte(salida)
+
+def _capacidad(salida):
+    """Filas que caben en la parte actual (al menos una en una parte vacía)"""
+    hoja = salida['hoja']
+    capacidad = salida['max_filas'] - 1 - hoja['filas']
+    if salida['max_bytes'] and hoja['bytes_fila']:
+        capacidad = min(capacidad, int((salida['max_bytes'] - salida['bytes']) // hoja['bytes_fila']))
+    return max(capacidad, 1) if hoja['filas'] == 0 else capacidad
+
+def escribir_filas(salida, df, importes=None):
+    """
+    Añade las filas de df a la hoja lógica actual, abriendo hojas o archivos de continuación
+    cuando se alcanza el límite de filas o de tamaño. importes (mismas filas que df) son los
+    valores numéricos que se suman por parte en la hoja TOTALES.
+    """
+    hoja = salida['hoja']
+    if salida['max_bytes'] and hoja['bytes_fila'] is None and len(df):
+        hoja['bytes_fila'] = estimar_bytes_fila(df, hoja['celdas'])
+
+    inicio = 0
+    while inicio < len(df):
+        if hoja['destino'] is None or _capacidad(salida) <= 0:
+            _siguiente_parte(salida)
+        fin = min(len(df), inicio + _capacidad(salida))
+        destino = hoja['destino']
+        for fila in _filas_valores(df.iloc[inicio:fin]):
+            destino.append(hoja['celdas'](destino, fila) if hoja['celdas'] else fila)
+
+        parte = salida['partes'][-1]
+        parte['filas'] += fin - inicio
+        hoja['filas'] += fin - inicio
+        salida['bytes'] += (fin - inicio) * (hoja['bytes_fila'] or 0)
+        if importes is not None:
+            suma = importes.iloc[inicio:fin].sum()
+            parte['totales'] = suma if parte['totales'] is None else parte['totales'].add(suma, fill_value=0)
+        inicio = fin
+
+def _terminar_hoja(salida):
+    """Cierra la hoja lógica actual; si no tuvo filas se crea solo con su encabezado"""
+    if salida['hoja'] is not None and salida['hoja']['destino'] is None:
+        _abrir_parte(salida)
+    salida['hoja'] = None
+
+def escribir_dataframe_dividido(salida, nombre_hoja, df, importes=None, celdas=None):
+    """Escribe df (encabezado + filas) como hoja lógica de la salida. Devuelve las filas escritas"""
+    iniciar_hoja(salida, nombre_hoja, [str(col) for col in df.columns], celdas)
+    escribir_filas(salida, df, importes)
+    _terminar_hoja(salida)
+    return len(df)
+
+def _escribir_totales(salida):
+    """Hoja TOTALES del primer archivo: filas e importes de cada parte y total de cada hoja"""
+    partes = salida['partes']
+    columnas = list(dict.fromkeys(col for p in partes if p['totales'] is not None for col in p['totales'].index))
+    hoja = salida['libros'][0].create_sheet(title=NOMBRE_HOJA_TOTALES)
+    hoja.append(['HOJA ORIGEN', 'ARCHIVO', 'HOJA', 'FILAS'] + [str(col) for col in columnas])
+
+    def importes(totales):
+        return [None if totales is None or col not in totales.index else round(float(totales[col]), 2)
+                for col in columnas]
+
+    for origen in dict.fromkeys(p['hoja_origen'] for p in partes):
+        propias = [p for p in partes if p['hoja_origen'] == origen]
+        for parte in propias:
+            hoja.append([origen, os.path.basename(parte['archivo']), parte['hoja'], parte['filas']]
+                        + importes(parte['totales']))
+        sumas = [p['totales'] for p in propias if p['totales'] is not None]
+        total = pd.concat(sumas, axis=1).sum(axis=1) if sumas else None
+        hoja.append([origen, 'TOTAL', None, sum(p['filas'] for p in propias)] + importes(total))
+
+def cerrar_salida_dividida(salida):
+    """
+    Termina la salida: si alguna hoja se dividió o hay más de un archivo, añade la hoja
+    TOTALES al primero. Guarda todos los archivos y devuelve sus rutas.
+    """
+    _terminar_hoja(salida)
+    origenes = [p['hoja_origen'] for p in salida['partes']]
+    if len(salida['libros']) > 1 or len(origenes) > len(set(origenes)):
+        _escribir_totales(salida)
+
+    rutas = [guardar_libro_streaming(libro, ruta_parte(salida['ruta'], numero))
+             for numero, libro in enumerate(salida['libros'], start=1)]
+    for parte in salida['partes']:
+        if parte['hoja'] != nombre_hoja_parte(parte['hoja_origen'], 0) or parte['archivo'] != salida['ruta']:
+            log.info(f"Continuación de {parte['hoja_origen']}: hoja {parte['hoja']} de "
+                     f"{os.path.basename(parte['archivo'])} ({parte['filas']} filas)")
+    return rutas
+
+def copiar_hoja_streaming(ruta_origen, salida, nombre_hoja, hoja_origen=None,
+                          columna_filtro=None, valores_filtro=None):
+    """
+    Copia una hoja del libro origen como hoja lógica de la salida dividida, por bloques de filas.
+    El libro origen se abre en modo de solo lectura y el destino es de solo escritura,
+    por lo que la memoria usada no depende del tamaño de la hoja.
+    Si se indican columna_filtro y valores_filtro, solo se copian el encabezado y las
+    filas cuyo valor en esa columna esté en valores_filtro.
+    Devuelve el número de filas de datos copiadas.
+    """
+    filtro = {_normalizar_filtro(v) for v in valores_filtro} if valores_filtro else None
+
+    if not ruta_origen.lower().endswith(EXTENSIONES_OPENPYXL):
+        # Formatos antiguos (.xls) no admiten lectura en streaming: copiar vía pandas
+        df = pd.read_excel(ruta_origen, sheet_name=hoja_origen or 0, header=None)
+        return _copiar_filas(_filas_valores(df), salida, nombre_hoja, columna_filtro, filtro)
+
+    libro_origen = load_workbook(ruta_origen, read_only=True, data_only=True)
+    try:
+        hoja = libro_origen[hoja_origen] if hoja_origen else libro_origen.worksheets[0]
+        return _copiar_filas(hoja.iter_rows(values_only=True), salida, nombre_hoja, columna_filtro, filtro)
+    finally:
+        libro_origen.close()
+
+def _copiar_filas(filas, salida, nombre_hoja, columna_filtro, filtro):
+    """Vuelca las filas en la hoja lógica nombre_hoja aplicando el filtro sobre la columna indicada"""
+    copiadas = 0
+    indice_filtro = None
+    bloque = []
+
+    def volcar():
+        # dtype object: los valores se copian tal cual, sin inferir tipos por columna
+        escribir_filas(salida, pd.DataFrame(bloque, dtype=object))
+        bloque.clear()
+
+    for numero, fila in enumerate(filas):
+        if numero == 0:
+            iniciar_hoja(salida, nombre_hoja, fila)
+            if filtro is not None and columna_filtro is not None:
+                encabezado = [_normalizar_filtro(v) for v in fila]
+                if columna_filtro not in encabezado:
+                    raise ValueError(f"No se encontró la columna '{columna_filtro}' en el encabezado")
+                indice_filtro = encabezado.index(columna_filtro)
+            continue
+
+        if indice_filtro is not None:
+            if indice_filtro >= len(fila) or _normalizar_filtro(fila[indice_filtro]) not in filtro:
+                continue
+
+        bloque.append(fila)
+        copiadas += 1
+        if len(bloque) >= FILAS_BLOQUE_COPIA:
+            volcar()
+
+    if salida['hoja'] is None:
+        # Hoja origen vacía: hoja destino vacía, como la original
+        iniciar_hoja(salida, nombre_hoja, [])
+    if bloque:
+        volcar()
+    _terminar_hoja(salida)
+    return copiadas
+
+def guardar_libro_streaming(libro, output_path):
+    """Guarda el libro de solo escritura creando el directorio de salida si no existe"""
+    directorio = os.path.dirname(output_path)
+    if directorio:
+        os.makedirs(directorio, exist_ok=True)
+    libro.save(output_path)
+    return output_path
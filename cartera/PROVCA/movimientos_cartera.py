@@ -0,0 +1,221 @@
+# -*- coding: utf-8 -*-
+"""
+MOVIMIENTOS MENSUALES DE CARTERA - GRUPO PLANETA
+
+Calcula los movimientos reales del mes (cobros, facturación, +/- vencidos, dotaciones y
+desdotaciones) comparando dos cortes consecutivos de PROVCA factura a factura.
+
+PROCESO:
+1. Leer de cada corte solo EMPRESA, NUMERO FACTURA, FECHA VTO y SALDO
+2. Cruzar ambos cortes por EMPRESA + NUMERO FACTURA (cruce por hash, tiempo lineal)
+3. Clasificar cada factura: cobrada (desaparece o baja), facturada (nueva o sube) y
+   nueva vencida (pasa de no vencida a vencida en el mes)
+4. Repartir cada movimiento entre deuda vencida y no vencida
+5. Calcular dotaciones y desdotaciones por la variación de la provisión de cada factura
+
+CONCILIACIÓN:
+Deuda final = deuda inicial + cobros + facturación + vencidos, por separado para la
+parte vencida y la no vencida. Los cobros y las desdotaciones se expresan en negativo.
+"""
+
+import sys
+import json
+
+import numpy as np
+import pandas as pd
+
+from utilidades_cartera import leer_archivo_tabular, convertir_valores_serie, convertir_fechas_serie
+from registro_esquemas import validar_archivo_entrada, normalizar_columna
+from procesador_cartera import MAPEO_PROVISION
+from bitacora import obtener_logger
+
+log = obtener_logger(__name__)
+
+# Clave de cruce entre cortes
+CLAVE_FACTURA = ['EMPRESA', 'NUMERO FACTURA']
+
+# Columnas necesarias de cada corte, con su nombre en la exportación PROVCA
+COLUMNAS_CORTE = CLAVE_FACTURA + ['FECHA VTO', 'SALDO']
+COLUMNAS_ORIGEN = {origen for origen, destino in MAPEO_PROVISION.items() if destino in COLUMNAS_CORTE}
+
+# Días vencidos a partir de los cuales la factura se dota al 100% (como en procesador_cartera)
+DIAS_DOTACION = 180
+
+def fin_mes_anterior(fecha):
+    """Último día del mes anterior a la fecha indicada"""
+    return pd.Timestamp(fecha).replace(day=1) - pd.Timedelta(days=1)
+
+def cargar_corte(ruta_archivo):
+    """
+    Lee un corte de PROVCA con solo las columnas del cruce y lo deja en una fila por
+    factura (EMPRESA + NUMERO FACTURA): SALDO sumado y FECHA VTO más antigua.
+    """
+    entrada = validar_archivo_entrada(ruta_archivo, ['PROVCA', 'CARTERA_NOMBRES'])
+    necesarias = COLUMNAS_ORIGEN | set(COLUMNAS_CORTE)
+    df = leer_archivo_tabular(ruta_archivo, formato=entrada['formato'],
+                              usecols=lambda c: normalizar_columna(c) in necesarias)
+    return preparar_corte(df, ruta_archivo)
+
+def preparar_corte(df, nombre):
+    """
+    Deja un corte de PROVCA ya leído (columnas de la exportación) en una fila por factura,
+    como cargar_corte. Permite cruzar el archivo que otro proceso ya tiene en memoria.
+    """
+    necesarias = COLUMNAS_ORIGEN | set(COLUMNAS_CORTE)
+    df = df[[c for c in df.columns if normalizar_columna(c) in necesarias]].copy()
+    df.columns = [normalizar_columna(c) for c in df.columns]
+    df = df.rename(columns=MAPEO_PROVISION)
+    df = df.loc[:, ~df.columns.duplicated()]
+
+    faltantes = [c for c in COLUMNAS_CORTE if c not in df.columns]
+    if faltantes:
+        raise ValueError(f"Faltan columnas en el corte {nombre}: {', '.join(faltantes)}")
+
+    corte = pd.DataFrame({
+        'EMPRESA': df['EMPRESA'].fillna('').astype(str).str.strip(),
+        'NUMERO FACTURA': df['NUMERO FACTURA'].fillna('').astype(str).str.strip().str.replace(r'\.0+$', '', regex=True),
+        'FECHA VTO': convertir_fechas_serie(df['FECHA VTO']),
+        'SALDO': convertir_valores_serie(df['SALDO'])
+    })
+    corte = corte.groupby(CLAVE_FACTURA, sort=False).agg({'FECHA VTO': 'min', 'SALDO': 'sum'}).reset_index()
+    log.info(f"Corte {nombre}: {len(corte)} facturas")
+    return corte
+
+def _estado_corte(fecha_vto, saldo, fecha_cierre, dias_dotacion):
+    """Indicador de vencida y provisión de cada factura en la fecha de cierre de un corte"""
+    dias_vencido = (pd.Timestamp(fecha_cierre) - fecha_vto).dt.days.fillna(0)
+    vencida = (dias_vencido > 0).to_numpy()
+    provision = np.where(dias_vencido >= dias_dotacion, saldo, 0.0)
+    return vencida, provision
+
+def calcular_movimientos(corte_anterior, corte_actual, fecha_cierre_anterior, fecha_cierre_actual,
+                         dias_dotacion=DIAS_DOTACION):
+    """
+    Calcula los movimientos del mes entre dos cortes (DataFrames de cargar_corte).
+    Devuelve un diccionario con 'resumen_calculos' y 'provision_dotacion' (misma estructura
+    que realizar_calculos_financieros), 'deuda' (inicial y final), 'conteos' y 'detalle'
+    (una fila por factura con su clasificación).
+    """
+    log.info("Calculando movimientos del mes entre cortes...")
+
+    # Cruce por hash sobre la clave de factura: O(n + m)
+    cruce = corte_anterior.merge(corte_actual, on=CLAVE_FACTURA, how='outer',
+                                 suffixes=(' ANTERIOR', ' ACTUAL'), indicator=True, sort=False)
+    saldo_anterior = cruce['SALDO ANTERIOR'].fillna(0.0).to_numpy()
+    saldo_actual = cruce['SALDO ACTUAL'].fillna(0.0).to_numpy()
+
+    vencida_anterior, provision_anterior = _estado_corte(
+        cruce['FECHA VTO ANTERIOR'], saldo_anterior, fecha_cierre_anterior, dias_dotacion)
+    vencida_actual, provision_actual = _estado_corte(
+        cruce['FECHA VTO ACTUAL'], saldo_actual, fecha_cierre_actual, dias_dotacion)
+
+    # Cobros (baja del saldo, según el estado al cierre anterior) y facturación
+    # (alta del saldo, según el estado al cierre actual)
+    variacion = saldo_actual - saldo_anterior
+    cobro = np.minimum(variacion, 0.0)
+    facturacion = np.maximum(variacion, 0.0)
+
+    # El saldo que permanece cambia de columna si la factura vence en el mes
+    permanece = saldo_anterior + cobro
+    paso_a_vencida = vencida_actual.astype(float) - vencida_anterior.astype(float)
+    vencidos = permanece * paso_a_vencida
+
+    variacion_provision = provision_actual - provision_anterior
+
+    def repartir(valores, vencida):
+        return float(valores[vencida].sum()), float(valores[~vencida].sum())
+
+    cobro_vencida, cobro_no_vencida = repartir(cobro, vencida_anterior)
+    facturacion_vencida, facturacion_no_vencida = repartir(facturacion, vencida_actual)
+    vencidos_vencida = float(vencidos.sum())
+    inicial_vencida, inicial_no_vencida = repartir(saldo_anterior, vencida_anterior)
+    final_vencida, final_no_vencida = repartir(saldo_actual, vencida_actual)
+
+    dotaciones = float(variacion_provision[variacion_provision > 0].sum())
+    desdotaciones = float(variacion_provision[variacion_provision < 0].sum())
+
+    # Clasificación de cada factura
+    movimiento = np.select(
+        [cruce['_merge'].eq('left_only'), cruce['_merge'].eq('right_only'),
+         variacion < 0, variacion > 0],
+        ['COBRADA', 'NUEVA', 'COBRO PARCIAL', 'AUMENTO'],
+        default='SIN CAMBIO'
+    )
+    nueva_vencida = (paso_a_vencida > 0) & cruce['_merge'].eq('both').to_numpy()
+
+    detalle = cruce[CLAVE_FACTURA].copy()
+    detalle['SALDO ANTERIOR'] = saldo_anterior
+    detalle['SALDO ACTUAL'] = saldo_actual
+    detalle['MOVIMIENTO'] = movimiento
+    detalle['NUEVA VENCIDA'] = nueva_vencida
+    detalle['COBRO'] = cobro
+    detalle['FACTURACION'] = facturacion
+    detalle['VENCIDOS'] = vencidos
+    detalle['VARIACION PROVISION'] = variacion_provision
+
+    conteos = pd.Series(movimiento).value_counts().to_dict()
+    conteos['NUEVA VENCIDA'] = int(nueva_vencida.sum())
+
+    resumen_calculos = {
+        'cobros': {'vencida': cobro_vencida, 'no_vencida': cobro_no_vencida,
+                   'total': cobro_vencida + cobro_no_vencida},
+        'facturacion': {'vencida': facturacion_vencida, 'no_vencida': facturacion_no_vencida,
+                        'total': facturacion_vencida + facturacion_no_vencida},
+        'vencidos': {'vencido': vencidos_vencida, 'no_vencido': -vencidos_vencida, 'total': 0.0},
+    }
+    resumen_calculos['subtotal'] = {
+        'vencida': cobro_vencida + facturacion_vencida + vencidos_vencida,
+        'no_vencida': cobro_no_vencida + facturacion_no_vencida - vencidos_vencida,
+        'total': resumen_calculos['cobros']['total'] + resumen_calculos['facturacion']['total']
+    }
+
+    log.info(f"Facturas cruzadas: {len(cruce)}. Cobros: {resumen_calculos['cobros']['total']:,.2f}. "
+             f"Facturación: {resumen_calculos['facturacion']['total']:,.2f}")
+
+    return {
+        'resumen_calculos': resumen_calculos,
+        'provision_dotacion': {
+            'provision': float(provision_actual.sum()),
+            'provision_inicial': float(provision_anterior.sum()),
+            'dotacion': dotaciones + desdotaciones,
+            'dotaciones': dotaciones,
+            'desdotaciones': desdotaciones
+        },
+        'deuda': {
+            'inicial': {'vencida': inicial_vencida, 'no_vencida': inicial_no_vencida},
+            'final': {'vencida': final_vencida, 'no_vencida': final_no_vencida}
+        },
+        'conteos': {clave: int(valor) for clave, valor in conteos.items()},
+        'detalle': detalle
+    }
+
+def calcular_movimientos_cortes(corte_anterior, corte_actual, fecha_cierre_actual, fecha_cierre_anterior=None,
+                                dias_dotacion=DIAS_DOTACION):
+    """Movimientos entre dos cortes ya cargados, con sus fechas de cierre. Por defecto el cierre anterior es el fin del mes previo"""
+    fecha_cierre_actual = pd.Timestamp(fecha_cierre_actual)
+    if fecha_cierre_anterior is None:
+        fecha_cierre_anterior = fin_mes_anterior(fecha_cierre_actual)
+
+    movimientos = calcular_movimientos(corte_anterior, corte_actual,
+                                       fecha_cierre_anterior, fecha_cierre_actual, dias_dotacion)
+    movimientos['fechas_cierre'] = {
+        'anterior': pd.Timestamp(fecha_cierre_anterior).strftime('%Y-%m-%d'),
+        'actual': fecha_cierre_actual.strftime('%Y-%m-%d')
+    }
+    return movimientos
+
+def calcular_movimientos_archivos(ruta_anterior, ruta_actual, fecha_cierre_actual, fecha_cierre_anterior=None,
+                                  dias_dotacion=DIAS_DOTACION):
+    """Carga dos cortes de PROVCA y calcula sus movimientos (como calcular_movimientos_cortes)"""
+    return calcular_movimientos_cortes(cargar_corte(ruta_anterior), cargar_corte(ruta_actual),
+                                       fecha_cierre_actual, fecha_cierre_anterior, dias_dotacion)
+
+if __name__ == "__main__":
+    if len(sys.argv) >= 4:
+        resultado = calcular_movimientos_archivos(sys.argv[1], sys.argv[2], sys.argv[3],
+                                                  sys.argv[4] if len(sys.argv) > 4 else None)
+        resultado.pop('detalle')
+        print(json.dumps(resultado, indent=2, ensure_ascii=False))
+    else:
+        print("Uso: python movimientos_cartera.py <provca_anterior> <provca_actual> <fecha_cierre_actual> [fecha_cierre_anterior]")
+        print("Ejemplo: python movimientos_cartera.py PROVCA_202508.csv PROVCA_202509.csv 2025-09-30")
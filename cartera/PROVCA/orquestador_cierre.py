@@ -0,0 +1,284 @@
+# -*- coding: utf-8 -*-
+"""
+ORQUESTADOR DE CIERRE MENSUAL - GRUPO PLANETA
+
+Ejecuta en una sola llamada los procesos del cierre de mes (cartera, anticipos, formato
+de deuda y balance completo) como un grafo de dependencias. Cada archivo de entrada se
+lee una sola vez y los DataFrames leídos se entregan en memoria a los procesos que los
+usan, en lugar de que cada procesador vuelva a abrir y validar el mismo archivo.
+
+PROCESO:
+1. Nodos de lectura: PROVCA y ANTICI se validan y se leen como texto; BALANCE, SITUACIÓN
+   y FOCUS con los lectores de procesador_balance_completo; el corte anterior de PROVCA
+   (opcional) con movimientos_cartera.
+2. Nodos de proceso: cartera y anticipos reciben el archivo leído; formato de deuda lo
+   recibe con los tipos inferidos; los movimientos cruzan el corte anterior con la
+   provisión ya leída; balance completo recibe las lecturas y los movimientos.
+3. Cada nodo se ejecuta en cuanto terminan sus dependencias, en un pool de hilos (los
+   DataFrames se comparten sin copiarse entre procesos). Si un nodo falla, los que
+   dependen de él se omiten y el resto continúa.
+4. Resumen CIERRE_<fecha>_resumen.json con los entregables y el tiempo de cada nodo.
+
+Las hojas de BALANCE, SITUACIÓN y FOCUS del formato de deuda se copian fila a fila desde
+el libro de origen sin analizarlas, de modo que solo balance completo las lee.
+"""
+
+import os
+import sys
+import json
+import time
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+import pandas as pd
+
+from bitacora import errores_propios
+from utilidades_cartera import leer_archivo_tabular, inferir_tipos_columnas, extraer_opcion
+from registro_esquemas import validar_archivo_entrada
+
+# Carpeta de salida por defecto (la misma de los procesadores)
+DIRECTORIO_RESULTADOS = r'C:\wamp64\www\modelo-deuda-python\cartera\resultados'
+
+# Nodos que se ejecutan a la vez. Con hilos, las etapas de pandas que liberan el GIL
+# (lectura, agrupaciones, escritura comprimida) se solapan; el resto se alterna.
+NODOS_SIMULTANEOS = 4
+
+# Prefijo del archivo de salida de cada proceso
+PREFIJOS_SALIDA = {
+    'cartera': 'CARTERA_PROCESADA',
+    'anticipos': 'ANTICIPOS_PROCESADOS',
+    'formato_deuda': 'FORMATO_DEUDA',
+    'balance': 'BALANCE_COMPLETO'
+}
+
+def leer_entrada(ruta, esquemas):
+    """Valida y lee un archivo tabular como texto: {'entrada': validación, 'df': DataFrame}"""
+    entrada = validar_archivo_entrada(ruta, esquemas)
+    df = leer_archivo_tabular(ruta, formato=entrada['formato'])
+    print(f"Archivo leído una vez para el cierre: {ruta} ({len(df)} registros)")
+    return {'entrada': entrada, 'df': df}
+
+def construir_grafo(archivo_provision, archivo_anticipos, fecha_cierre, directorio,
+                    archivo_balance=None, archivo_situacion=None, archivo_focus=None,
+                    corte_anterior=None, guardar_historico=True, jobs=None):
+    """
+    Nodos del cierre: nombre -> {'dependencias': [...], 'funcion': f(resultados)}, donde
+    resultados tiene el resultado de cada dependencia. Los nodos de balance completo solo
+    se incluyen con los tres archivos de balance.
+    """
+    # Importaciones locales: el orquestador carga los procesadores solo al construir el grafo
+    from procesador_cartera import procesar_cartera
+    from procesador_anticipos import procesar_anticipos
+    from procesador_formato_deuda import procesar_formato_deuda_completo
+
+    salidas = {clave: os.path.join(directorio, f'{prefijo}_{fecha_cierre}.xlsx')
+               for clave, prefijo in PREFIJOS_SALIDA.items()}
+
+    def cartera(resultados):
+        lectura = resultados['leer_provision']
+        salida = procesar_cartera(archivo_provision, salidas['cartera'], fecha_cierre,
+                                  guardar_historico=guardar_historico, jobs=jobs,
+                                  entrada=lectura['entrada'], df_entrada=lectura['df'])
+        if not salida:
+            raise RuntimeError("El procesador de cartera no generó salida")
+        return salida
+
+    def anticipos(resultados):
+        lectura = resultados['leer_anticipos']
+        salida = procesar_anticipos(archivo_anticipos, salidas['anticipos'], fecha_cierre,
+                                    entrada=lectura['entrada'], df_entrada=lectura['df'])
+        if not salida:
+            raise RuntimeError("El procesador de anticipos no generó salida")
+        return salida
+
+    def formato_deuda(resultados):
+        entradas = {
+            'provision': inferir_tipos_columnas(resultados['leer_provision']['df']),
+            'anticipos': inferir_tipos_columnas(resultados['leer_anticipos']['df'])
+        }
+        resumen = procesar_formato_deuda_completo(
+            archivo_provision, archivo_anticipos, archivo_balance, archivo_situacion, archivo_focus,
+            fecha_cierre, salidas['formato_deuda'], guardar_historico=guardar_historico, entradas=entradas
+        )
+        return resumen['archivo_generado']
+
+    grafo = {
+        'leer_provision': {'dependencias': [],
+                           'funcion': lambda r: leer_entrada(archivo_provision, ['PROVCA', 'CARTERA_NOMBRES'])},
+        'leer_anticipos': {'dependencias': [],
+                           'funcion': lambda r: leer_entrada(archivo_anticipos, ['ANTICI'])},
+        'cartera': {'dependencias': ['leer_provision'], 'funcion': cartera},
+        'anticipos': {'dependencias': ['leer_anticipos'], 'funcion': anticipos},
+        'formato_deuda': {'dependencias': ['leer_provision', 'leer_anticipos'], 'funcion': formato_deuda}
+    }
+
+    if not (archivo_balance and archivo_situacion and archivo_focus):
+        print("ADVERTENCIA: Sin BALANCE, SITUACIÓN y FOCUS no se ejecuta balance completo")
+        return grafo
+
+    from procesador_balance_completo import (procesar_balance_completo, leer_archivo_balance,
+                                             leer_archivo_situacion, leer_archivo_focus)
+    from movimientos_cartera import cargar_corte, preparar_corte, calcular_movimientos_cortes
+
+    def movimientos(resultados):
+        corte_actual = preparar_corte(resultados['leer_provision']['df'], archivo_provision)
+        calculados = calcular_movimientos_cortes(resultados['leer_corte_anterior'], corte_actual, fecha_cierre)
+        calculados.pop('detalle')
+        return calculados
+
+    def balance(resultados):
+        resultado = procesar_balance_completo(
+            archivo_balance, archivo_situacion, archivo_focus, salidas['balance'],
+            fecha_cierre_str=fecha_cierre,
+            lecturas={clave: resultados[f'leer_{clave}'] for clave in ('balance', 'situacion', 'focus')},
+            movimientos=resultados.get('movimientos')
+        )
+        if not resultado['success']:
+            raise RuntimeError(resultado['error'])
+        return resultado['excel_path'] or resultado['json_path']
+
+    grafo['leer_balance'] = {'dependencias': [], 'funcion': lambda r: leer_archivo_balance(archivo_balance)}
+    grafo['leer_situacion'] = {'dependencias': [], 'funcion': lambda r: leer_archivo_situacion(archivo_situacion)}
+    grafo['leer_focus'] = {'dependencias': [], 'funcion': lambda r: leer_archivo_focus(archivo_focus)}
+    grafo['balance'] = {'dependencias': ['leer_balance', 'leer_situacion', 'leer_focus'], 'funcion': balance}
+    if corte_anterior:
+        grafo['leer_corte_anterior'] = {'dependencias': [], 'funcion': lambda r: cargar_corte(corte_anterior)}
+        grafo['movimientos'] = {'dependencias': ['leer_corte_anterior', 'leer_provision'], 'funcion': movimientos}
+        grafo['balance']['dependencias'].append('movimientos')
+    return grafo
+
+def ejecutar_grafo(grafo, simultaneos=NODOS_SIMULTANEOS):
+    """
+    Ejecuta los nodos del grafo en cuanto sus dependencias terminan. Devuelve
+    (resultados por nodo, estado de cada nodo con inicio, fin, segundos y error).
+    """
+    inicio = time.perf_counter()
+    resultados = {}
+    estados = {nombre: {'estado': 'pendiente'} for nombre in grafo}
+
+    def ejecutar(nombre):
+        estados[nombre]['inicio'] = round(time.perf_counter() - inicio, 3)
+        dependencias = {dep: resultados[dep] for dep in grafo[nombre]['dependencias']}
+        # Cada nodo cuenta sus propios errores de conversión (su resumen no incluye los de
+        # los nodos que se ejecutan a la vez en otros hilos)
+        with errores_propios():
+            return grafo[nombre]['funcion'](dependencias)
+
+    with ThreadPoolExecutor(max_workers=max(1, int(simultaneos))) as executor:
+        en_curso = {}
+        while True:
+            # Nodos omitidos: alguna dependencia falló o se omitió
+            for nombre, estado in estados.items():
+                if estado['estado'] == 'pendiente' and any(
+                        estados[dep]['estado'] in ('error', 'omitido') for dep in grafo[nombre]['dependencias']):
+                    estado['estado'] = 'omitido'
+                    print(f"Nodo omitido por fallo de una dependencia: {nombre}")
+            # Nodos listos: todas sus dependencias completadas
+            for nombre, estado in estados.items():
+                if estado['estado'] == 'pendiente' and all(
+                        estados[dep]['estado'] == 'completado' for dep in grafo[nombre]['dependencias']):
+                    estado['estado'] = 'en_curso'
+                    en_curso[executor.submit(ejecutar, nombre)] = nombre
+            if not en_curso:
+                break
+
+            terminados, _ = wait(en_curso, return_when=FIRST_COMPLETED)
+            for futuro in terminados:
+                nombre = en_curso.pop(futuro)
+                estado = estados[nombre]
+                estado['fin'] = round(time.perf_counter() - inicio, 3)
+                estado['segundos'] = round(estado['fin'] - estado['inicio'], 3)
+                try:
+                    resultados[nombre] = futuro.result()
+                    estado['estado'] = 'completado'
+                    print(f"Nodo completado ({estado['segundos']:.1f} s): {nombre}")
+                except Exception as e:
+                    estado['estado'] = 'error'
+                    estado['error'] = str(e)
+                    print(f"ERROR en el nodo {nombre}: {e}")
+    return resultados, estados
+
+def procesar_cierre(archivo_provision, archivo_anticipos, archivo_balance=None, archivo_situacion=None,
+                    archivo_focus=None, fecha_cierre_str=None, directorio=None, corte_anterior=None,
+                    guardar_historico=True, jobs=None, simultaneos=NODOS_SIMULTANEOS):
+    """
+    Ejecuta el cierre mensual completo y guarda su resumen. Devuelve el resumen con los
+    entregables de cada proceso y el estado y tiempo de cada nodo.
+    """
+    inicio = time.perf_counter()
+    directorio = directorio or DIRECTORIO_RESULTADOS
+    os.makedirs(directorio, exist_ok=True)
+    fecha_cierre = (pd.Timestamp(fecha_cierre_str) if fecha_cierre_str
+                    else pd.Timestamp.now().normalize() + pd.offsets.MonthEnd(0)).strftime('%Y-%m-%d')
+
+    print("=" * 80)
+    print(f"ORQUESTADOR DE CIERRE MENSUAL - {fecha_cierre}")
+    print("=" * 80)
+
+    grafo = construir_grafo(archivo_provision, archivo_anticipos, fecha_cierre, directorio,
+                            archivo_balance, archivo_situacion, archivo_focus,
+                            corte_anterior, guardar_historico, jobs)
+    resultados, estados = ejecutar_grafo(grafo, simultaneos)
+
+    entregables = {nombre: resultados.get(nombre) for nombre in PREFIJOS_SALIDA if nombre in grafo}
+    errores = [nombre for nombre, estado in estados.items() if estado['estado'] == 'error']
+    resumen = {
+        'fecha_procesamiento': datetime.now().isoformat(),
+        'fecha_cierre': fecha_cierre,
+        'archivos': {
+            'provision': archivo_provision,
+            'anticipos': archivo_anticipos,
+            'balance': archivo_balance,
+            'situacion': archivo_situacion,
+            'focus': archivo_focus,
+            'corte_anterior': corte_anterior
+        },
+        'entregables': entregables,
+        'errores': len(errores),
+        'nodos': {nombre: {'dependencias': grafo[nombre]['dependencias'], **estados[nombre]} for nombre in grafo},
+        'segundos_nodos': round(sum(e.get('segundos', 0.0) for e in estados.values()), 3),
+        'segundos_total': round(time.perf_counter() - inicio, 3)
+    }
+
+    ruta_resumen = os.path.join(directorio, f'CIERRE_{fecha_cierre}_resumen.json')
+    with open(ruta_resumen, 'w', encoding='utf-8') as f:
+        json.dump(resumen, f, indent=2, ensure_ascii=False, default=str)
+    resumen['resumen'] = ruta_resumen
+
+    print("\n" + "=" * 80)
+    print(f"CIERRE TERMINADO en {resumen['segundos_total']:.1f} s "
+          f"(suma de nodos {resumen['segundos_nodos']:.1f} s)")
+    for nombre, ruta in entregables.items():
+        print(f"  - {nombre}: {ruta or estados[nombre]['estado'].upper()}")
+    if errores:
+        print(f"Nodos con error: {', '.join(errores)}")
+    print(f"Resumen: {ruta_resumen}")
+    return resumen
+
+if __name__ == "__main__":
+    directorio, argumentos = extraer_opcion(sys.argv[1:], '--salida')
+    corte_anterior, argumentos = extraer_opcion(argumentos, '--corte-anterior')
+    jobs, argumentos = extraer_opcion(argumentos, '--jobs')
+    simultaneos, argumentos = extraer_opcion(argumentos, '--nodos')
+    sin_historico, argumentos = extraer_opcion(argumentos, '--sin-historico', es_bandera=True)
+
+    if len(argumentos) >= 2:
+        try:
+            resumen = procesar_cierre(
+                argumentos[0], argumentos[1],
+                argumentos[2] if len(argumentos) > 2 else None,
+                argumentos[3] if len(argumentos) > 3 else None,
+                argumentos[4] if len(argumentos) > 4 else None,
+                argumentos[5] if len(argumentos) > 5 else None,
+                directorio, corte_anterior, not sin_historico, jobs,
+                simultaneos or NODOS_SIMULTANEOS
+            )
+        except Exception as e:
+            print(f"ERROR: {e}")
+            sys.exit(1)
+        sys.exit(1 if resumen['errores'] else 0)
+    else:
+        print("Uso: python orquestador_cierre.py <provision> <anticipos> [balance] [situacion] [focus] [fecha_cierre] "
+              "[--salida DIRECTORIO] [--corte-anterior PROVCA_ANTERIOR] [--jobs N] [--nodos N] [--sin-historico]")
+        print("Ejemplo: python orquestador_cierre.py PROVCA.csv ANTICI.csv BALANCE.xlsx SITUACION.xlsx FOCUS.xlsx "
+              "2025-09-30 --corte-anterior PROVCA_202508.csv")
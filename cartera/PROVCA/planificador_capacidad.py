@@ -0,0 +1,262 @@
+# -*- coding: utf-8 -*-
+"""
+PLANIFICADOR DE CAPACIDAD - GRUPO PLANETA
+
+Decide, antes de leer el archivo completo, cómo ejecutar procesar_cartera según la
+memoria y los núcleos del equipo, en lugar de descubrir con un MemoryError a mitad del
+proceso que el archivo no cabe:
+- memoria: todo el archivo en memoria en un solo proceso (el camino habitual)
+- particionado: vencimientos en paralelo por particiones EMPRESA/ACTIVIDAD
+- bloques: lectura, preparación, vencimientos y escritura del Excel por bloques de filas
+
+PROCESO:
+1. Registros estimados con la lectura acotada de la vista previa (bloques de líneas
+   repartidos por el archivo de texto, o la dimensión de la hoja de Excel).
+2. Sobre una muestra de esas filas se ejecutan las etapas de procesar_cartera y se mide
+   la memoria por registro del texto leído, del resultado tipado y del formateado.
+3. Con esas medidas se proyecta el pico de memoria de cada estrategia (el libro de
+   openpyxl completo en memoria suele ser lo dominante) y se compara con la memoria
+   disponible y los núcleos: se elige la más rápida que cabe.
+4. Al terminar, el plan se completa con los registros y el pico de memoria reales del
+   proceso y el error relativo de la estimación; procesar_cartera lo guarda en el resumen
+   de la ejecución para calibrar los factores de este módulo.
+"""
+
+import io
+import os
+import sys
+import time
+import contextlib
+import ctypes
+import logging
+
+from bitacora import obtener_logger, nivel_temporal, errores_aparte
+from resolucion_clientes import resolver_clientes
+from procesador_cartera import (obtener_fecha_cierre, preparar_registros, calcular_vencimientos,
+                                aplicar_formato_final)
+from procesamiento_particionado import (MINIMO_REGISTROS_PARALELO, FILAS_POR_BLOQUE,
+                                        ESTRATEGIA_MEMORIA, ESTRATEGIA_PARTICIONADO, ESTRATEGIA_BLOQUES)
+from utilidades_cartera import calcular_trabajadores
+from vista_previa import leer_muestra_archivo
+
+log = obtener_logger('planificador_capacidad')
+
+# Filas de la muestra sobre las que se miden las etapas
+FILAS_MEDICION = 2000
+
+# Bytes por celda del libro de openpyxl completo en memoria (to_excel y ajuste de la
+# alineación), medido con archivos PROVCA reales
+BYTES_CELDA_EXCEL = 450
+
+# Copias intermedias de pandas sobre el resultado tipado y el formateado
+FACTOR_TEMPORALES = 1.4
+
+# Memoria adicional del particionado respecto al resultado tipado: partición de entrada
+# en los trabajadores y columnas devueltas al proceso principal
+FACTOR_PARTICIONES = 2.0
+
+# Fracción de la memoria disponible que se planifica usar (margen para el sistema y PHP)
+FRACCION_MEMORIA_UTIL = 0.8
+
+MB = 1024 * 1024
+
+class _EstadoMemoria(ctypes.Structure):
+    """MEMORYSTATUSEX de la API de Windows"""
+    _fields_ = [('dwLength', ctypes.c_ulong), ('dwMemoryLoad', ctypes.c_ulong),
+                ('ullTotalPhys', ctypes.c_ulonglong), ('ullAvailPhys', ctypes.c_ulonglong),
+                ('ullTotalPageFile', ctypes.c_ulonglong), ('ullAvailPageFile', ctypes.c_ulonglong),
+                ('ullTotalVirtual', ctypes.c_ulonglong), ('ullAvailVirtual', ctypes.c_ulonglong),
+                ('ullAvailExtendedVirtual', ctypes.c_ulonglong)]
+
+class _ContadoresProceso(ctypes.Structure):
+    """PROCESS_MEMORY_COUNTERS de la API de Windows"""
+    _fields_ = [('cb', ctypes.c_ulong), ('PageFaultCount', ctypes.c_ulong),
+                ('PeakWorkingSetSize', ctypes.c_size_t), ('WorkingSetSize', ctypes.c_size_t),
+                ('QuotaPeakPagedPoolUsage', ctypes.c_size_t), ('QuotaPagedPoolUsage', ctypes.c_size_t),
+                ('QuotaPeakNonPagedPoolUsage', ctypes.c_size_t), ('QuotaNonPagedPoolUsage', ctypes.c_size_t),
+                ('PagefileUsage', ctypes.c_size_t), ('PeakPagefileUsage', ctypes.c_size_t)]
+
+def _contadores_windows():
+    """Contadores de memoria del proceso actual en Windows"""
+    contadores = _ContadoresProceso()
+    contadores.cb = ctypes.sizeof(contadores)
+    proceso = ctypes.windll.kernel32.GetCurrentProcess()
+    if not ctypes.windll.psapi.GetProcessMemoryInfo(proceso, ctypes.byref(contadores), contadores.cb):
+        raise OSError("GetProcessMemoryInfo falló")
+    return contadores
+
+def memoria_disponible():
+    """Bytes de memoria física disponibles (limitados por el cgroup en contenedores) o None"""
+    try:
+        if sys.platform == 'win32':
+            estado = _EstadoMemoria()
+            estado.dwLength = ctypes.sizeof(estado)
+            if ctypes.windll.kernel32.GlobalMemoryStatusEx(ctypes.byref(estado)):
+                return int(estado.ullAvailPhys)
+            return None
+        disponible = None
+        if os.path.exists('/proc/meminfo'):
+            with open('/proc/meminfo', 'r') as f:
+                for linea in f:
+                    if linea.startswith('MemAvailable:'):
+                        disponible = int(linea.split()[1]) * 1024
+                        break
+        if disponible is None:
+            disponible = os.sysconf('SC_AVPHYS_PAGES') * os.sysconf('SC_PAGE_SIZE')
+        # Límite de memoria del contenedor (cgroup v2), si lo hay
+        if os.path.exists('/sys/fs/cgroup/memory.max'):
+            with open('/sys/fs/cgroup/memory.max', 'r') as f:
+                limite = f.read().strip()
+            if limite.isdigit():
+                with open('/sys/fs/cgroup/memory.current', 'r') as f:
+                    disponible = min(disponible, int(limite) - int(f.read().strip()))
+        return disponible
+    except (OSError, ValueError, AttributeError):
+        return None
+
+def memoria_proceso():
+    """Bytes de memoria residente del proceso actual o None"""
+    try:
+        if sys.platform == 'win32':
+            return int(_contadores_windows().WorkingSetSize)
+        with open('/proc/self/statm', 'r') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        return None
+
+def memoria_pico_proceso():
+    """Pico de memoria residente del proceso desde su inicio (bytes) o None"""
+    try:
+        if sys.platform == 'win32':
+            return int(_contadores_windows().PeakWorkingSetSize)
+        import resource
+        pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux informa en KB y macOS en bytes
+        return int(pico) if sys.platform == 'darwin' else int(pico) * 1024
+    except (OSError, ValueError, AttributeError, ImportError):
+        return None
+
+def medir_registros(muestra, fecha_cierre_str=None):
+    """
+    Ejecuta las etapas de procesar_cartera sobre la muestra (leída como texto) y devuelve
+    los bytes por registro del texto, del resultado tipado y del formateado, y las
+    columnas del Excel de salida
+    """
+    muestra = muestra.head(FILAS_MEDICION)
+    fecha = obtener_fecha_cierre(fecha_cierre_str).strftime('%Y-%m-%d')
+    # Sin mensajes de progreso (también los de módulos que usan print) y sin sumar a los
+    # errores de conversión del procesamiento real
+    with nivel_temporal(logging.ERROR), errores_aparte(), contextlib.redirect_stdout(io.StringIO()):
+        texto = muestra.memory_usage(deep=True).sum()
+        tipado = preparar_registros(muestra.copy())
+        resolver_clientes([tipado])
+        tipado = calcular_vencimientos(tipado, fecha)
+        formateado = aplicar_formato_final(tipado)
+    registros = max(len(muestra), 1)
+    return {
+        'texto': round(texto / registros),
+        'tipado': round(tipado.memory_usage(deep=True).sum() / max(len(tipado), 1)),
+        'formato': round(formateado.memory_usage(deep=True).sum() / max(len(formateado), 1)),
+        'columnas_salida': len(formateado.columns)
+    }
+
+def proyectar_memoria(registros, medidas, filas_bloque=FILAS_POR_BLOQUE):
+    """Pico de memoria (bytes, sobre la del proceso al empezar) de cada estrategia"""
+    resultado = registros * (medidas['tipado'] + medidas['formato']) * FACTOR_TEMPORALES
+    lectura = registros * (medidas['texto'] + medidas['tipado']) * FACTOR_TEMPORALES
+    libro = registros * medidas['columnas_salida'] * BYTES_CELDA_EXCEL
+    memoria = max(lectura, resultado + libro)
+    bloque = min(registros, filas_bloque) * (medidas['texto'] + medidas['tipado']) * FACTOR_TEMPORALES
+    return {
+        ESTRATEGIA_MEMORIA: round(memoria),
+        ESTRATEGIA_PARTICIONADO: round(max(memoria, registros * medidas['tipado'] * (1 + FACTOR_PARTICIONES))),
+        ESTRATEGIA_BLOQUES: round(resultado + bloque)
+    }
+
+def elegir_estrategia(proyeccion, disponible, registros, trabajadores):
+    """
+    Estrategia más rápida cuyo pico proyectado cabe en la memoria útil: particionado si hay
+    varios núcleos y registros suficientes, si no memoria; bloques si ninguna de las dos
+    cabe. Devuelve (estrategia, trabajadores, motivo).
+    """
+    util = disponible * FRACCION_MEMORIA_UTIL if disponible else None
+
+    def cabe(estrategia):
+        return util is None or proyeccion[estrategia] <= util
+
+    if not cabe(ESTRATEGIA_MEMORIA):
+        if not cabe(ESTRATEGIA_BLOQUES):
+            return ESTRATEGIA_BLOQUES, 1, 'ni siquiera por bloques cabe en la memoria disponible'
+        return ESTRATEGIA_BLOQUES, 1, 'el archivo completo no cabe en la memoria disponible'
+    if trabajadores > 1 and registros >= MINIMO_REGISTROS_PARALELO and cabe(ESTRATEGIA_PARTICIONADO):
+        return ESTRATEGIA_PARTICIONADO, trabajadores, f'cabe en memoria y hay {trabajadores} núcleos'
+    if util is None:
+        return ESTRATEGIA_MEMORIA, 1, 'memoria disponible desconocida'
+    return ESTRATEGIA_MEMORIA, 1, 'cabe en memoria'
+
+def planificar_ejecucion(ruta, formato, jobs=None, df=None, fecha_cierre_str=None):
+    """
+    Plan de ejecución de procesar_cartera para el archivo: estrategia, procesos, registros
+    estimados, medidas por registro y pico de memoria proyectado de cada estrategia.
+    Con df (el archivo ya leído como texto) los registros son exactos. jobs limita los
+    procesos del particionado (sin jobs, todos los núcleos).
+    """
+    inicio = time.perf_counter()
+    memoria_inicial = memoria_proceso()
+    if df is not None:
+        muestra, registros, metodo = df, len(df), 'leido'
+    else:
+        lectura = leer_muestra_archivo(ruta, formato)
+        muestra, registros, metodo = lectura['df'], lectura['registros_estimados'], lectura['metodo']
+
+    medidas = medir_registros(muestra, fecha_cierre_str)
+    proyeccion = proyectar_memoria(registros, medidas)
+    disponible = memoria_disponible()
+    nucleos = os.cpu_count() or 1
+    trabajadores = calcular_trabajadores(jobs, por_defecto=nucleos)
+    estrategia, trabajadores, motivo = elegir_estrategia(proyeccion, disponible, registros, trabajadores)
+
+    plan = {
+        'estrategia': estrategia,
+        'trabajadores': trabajadores,
+        'motivo': motivo,
+        'registros_estimados': registros,
+        'metodo_lectura': metodo,
+        'bytes_por_registro': medidas,
+        'memoria_estimada': proyeccion,
+        'memoria_disponible': disponible,
+        'memoria_proceso_inicial': memoria_inicial,
+        'nucleos': nucleos,
+        'segundos': round(time.perf_counter() - inicio, 3)
+    }
+    disponible_texto = f"{disponible / MB:.0f} MB" if disponible else "desconocida"
+    log.info(f"Planificación: {registros} registros estimados, pico estimado en memoria "
+             f"{proyeccion[ESTRATEGIA_MEMORIA] / MB:.0f} MB, disponible {disponible_texto}, {nucleos} núcleos "
+             f"-> estrategia {estrategia} ({motivo})", extra={'datos': plan})
+    if motivo.startswith('ni siquiera'):
+        log.warning(f"El pico estimado por bloques ({proyeccion[ESTRATEGIA_BLOQUES] / MB:.0f} MB) supera "
+                    f"la memoria disponible; el procesamiento puede fallar")
+    return plan
+
+def _error_relativo(estimado, real):
+    """(estimado - real) / real, o None si falta alguno de los dos"""
+    if estimado is None or not real:
+        return None
+    return round((estimado - real) / real, 4)
+
+def cerrar_plan(plan, registros):
+    """
+    Completa el plan con los registros leídos y el pico de memoria real del proceso
+    (sobre la memoria al planificar) y el error relativo de cada estimación. El pico es el
+    del proceso completo: en un trabajador que procesa varios archivos es una cota superior.
+    """
+    pico = memoria_pico_proceso()
+    inicial = plan.get('memoria_proceso_inicial')
+    memoria_real = pico - inicial if pico is not None and inicial is not None else None
+    plan['real'] = {'registros': registros, 'memoria_pico': memoria_real}
+    plan['error_registros'] = _error_relativo(plan['registros_estimados'], registros)
+    plan['error_memoria'] = _error_relativo(plan['memoria_estimada'][plan['estrategia']], memoria_real)
+    log.info(f"Planificación frente a lo real: registros {plan['registros_estimados']} / {registros}, "
+             f"memoria {plan['memoria_estimada'][plan['estrategia']] / MB:.0f} MB / "
+             f"{(memoria_real or 0) / MB:.0f} MB", extra={'datos': plan})
+    return plan
@@ -28,6 +28,15 @@ import sys
 import warnings
 warnings.filterwarnings('ignore')
 
+from utilidades_cartera import leer_archivo_tabular, convertir_valores_serie, convertir_fechas_serie, descomponer_fechas
+from utilidades_cartera import extraer_opcion
+from registro_esquemas import validar_archivo_entrada
+from resumen_ejecucion import iniciar_cronometro, marcar_etapa, generar_resumen
+from resolucion_clientes import resolver_clientes
+from escritura_excel import requiere_division, abrir_salida_dividida, escribir_dataframe_dividido, cerrar_salida_dividida
+from bitacora import (obtener_logger, configurar_bitacora, salida_silenciosa, registrar_resumen_errores,
+                      resumen_errores, emitir_resultado)
+
 # Importar utilidades
 try:
     from utilidades_cartera import convertir_fecha, convertir_valor, aplicar_formato_colombiano_dataframe
@@ -56,6 +65,8 @@ except ImportError:
     def aplicar_formato_colombiano_dataframe(df, columnas_numericas=None):
         return df
 
+log = obtener_logger('procesador_anticipos')
+
 # Mapeo oficial de columnas para anticipos
 MAPEO_ANTICIPOS = {
     'PCCDEM': 'EMPRESA',
@@ -80,13 +91,72 @@ MAPEO_ANTICIPOS = {
     'PCSALD': 'SALDO'
 }
 
+# Mapeo de columnas de la exportación de anticipos ANTICI (NC*/WW*)
+MAPEO_ANTICIPOS_ANTICI = {
+    'NCCDEM': 'EMPRESA',
+    'NCCDAC': 'ACTIVIDAD',
+    'NCCDCL': 'CODIGO CLIENTE',
+    'WWNIT': 'NIT/CEDULA',
+    'WWNMCL': 'NOMBRE COMERCIAL',
+    'WWNMDO': 'DIRECCION',
+    'WWTLF1': 'TELEFONO',
+    'WWNMPO': 'POBLACION',
+    'CCCDFB': 'CODIGO AGENTE',
+    'BDNMNM': 'NOMBRE AGENTE',
+    'BDNMPA': 'APELLIDO AGENTE',
+    'NCMOMO': 'TIPO ANTICIPO',
+    'NCCDR3': 'NRO ANTICIPO',
+    'NCIMAN': 'VALOR ANTICIPO',
+    'NCFEGR': 'FECHA ANTICIPO'
+}
+
+# Columnas compatibles con provisión que se crean a partir de las de ANTICI
+ALIAS_ANTICIPOS_PROVISION = {
+    'IDENTIFICACION': 'NIT/CEDULA',
+    'NOMBRE': 'NOMBRE COMERCIAL',
+    'DENOMINACION COMERCIAL': 'NOMBRE COMERCIAL',
+    'CIUDAD': 'POBLACION',
+    'NUMERO FACTURA': 'NRO ANTICIPO',
+    'TIPO': 'TIPO ANTICIPO',
+    'FECHA': 'FECHA ANTICIPO',
+    'FECHA VTO': 'FECHA ANTICIPO',  # Para anticipos, fecha de vencimiento = fecha de anticipo
+    'VALOR': 'VALOR ANTICIPO',
+    'SALDO': 'VALOR ANTICIPO'
+}
+
+# Columnas de texto que se rellenan con cadena vacía tras el alineamiento
+COLUMNAS_TEXTO_ANTICIPOS = ['EMPRESA', 'ACTIVIDAD', 'CODIGO CLIENTE', 'IDENTIFICACION', 'NOMBRE',
+                            'DENOMINACION COMERCIAL', 'DIRECCION', 'TELEFONO', 'CIUDAD',
+                            'NUMERO FACTURA', 'TIPO']
+
+def alinear_anticipos_antici(df):
+    """
+    Alinea una exportación ANTICI con las columnas de provisión: renombra NC*/WW*,
+    convierte el valor del anticipo en bloque y lo invierte de signo (los anticipos
+    son saldos negativos) y crea los alias compatibles con provisión.
+    """
+    df = df.rename(columns=MAPEO_ANTICIPOS_ANTICI)
+    
+    # Multiplicar valor de anticipo por -1 (deben ser negativos)
+    df['VALOR ANTICIPO'] = -convertir_valores_serie(df['VALOR ANTICIPO'])
+    
+    for destino, origen in ALIAS_ANTICIPOS_PROVISION.items():
+        if origen in df.columns:
+            df[destino] = df[origen]
+    
+    for col in COLUMNAS_TEXTO_ANTICIPOS:
+        if col in df.columns:
+            df[col] = df[col].fillna('')
+    
+    return df
+
 def obtener_fecha_cierre(fecha_cierre_str=None):
     """Obtiene la fecha de cierre. Si se proporciona fecha_cierre_str, la usa; si no, usa el último día del mes actual"""
     if fecha_cierre_str:
         try:
             return datetime.strptime(fecha_cierre_str, '%Y-%m-%d')
         except ValueError:
-            print(f"ADVERTENCIA: Formato de fecha incorrecto '{fecha_cierre_str}'. Usando fecha por defecto.")
+            log.warning(f"Formato de fecha incorrecto '{fecha_cierre_str}'. Usando fecha por defecto.")
     
     # Fecha por defecto: último día del mes actual
     hoy = datetime.now()
@@ -98,7 +168,7 @@ def obtener_fecha_cierre(fecha_cierre_str=None):
 
 def limpiar_y_validar_datos(df):
     """Limpia y valida los datos del DataFrame de anticipos"""
-    print("Iniciando limpieza y validación de datos de anticipos...")
+    log.info("Iniciando limpieza y validación de datos de anticipos...")
     
     # Limpiar nombres de columnas
     df.columns = df.columns.str.strip()
@@ -110,139 +180,99 @@ def limpiar_y_validar_datos(df):
             columnas_renombradas[col_original] = col_nueva
     
     df = df.rename(columns=columnas_renombradas)
-    print(f"Columnas renombradas: {len(columnas_renombradas)}")
+    log.info(f"Columnas renombradas: {len(columnas_renombradas)}")
     
     # Eliminar filas con valores nulos en campos críticos
     registros_antes = len(df)
     df = df.dropna(subset=['SALDO', 'FECHA VTO'], how='all')
     registros_eliminados = registros_antes - len(df)
     if registros_eliminados > 0:
-        print(f"Eliminados {registros_eliminados} registros con datos críticos nulos")
+        log.info(f"Eliminados {registros_eliminados} registros con datos críticos nulos")
     
     return df
 
 def procesar_fechas(df, fecha_cierre_str=None):
     """Procesa las fechas y crea columnas separadas"""
-    print("Procesando fechas de anticipos...")
-    
-    fecha_cierre = obtener_fecha_cierre(fecha_cierre_str)
+    log.info("Procesando fechas de anticipos...")
     
     for col_fecha in ['FECHA', 'FECHA VTO']:
         if col_fecha in df.columns:
-            # Convertir fechas
-            fechas_convertidas = df[col_fecha].apply(convertir_fecha)
-            
-            # Formatear fechas en formato dd/mm/yyyy
-            fechas_formateadas = []
-            dias = []
-            meses = []
-            años = []
-            fechas_datetime = []
+            # Decodificar toda la columna en bloque
+            fechas = convertir_fechas_serie(df[col_fecha])
+            texto, dias, meses, anios = descomponer_fechas(fechas)
             
-            for fecha_conv in fechas_convertidas:
-                if fecha_conv[0]:  # Si la conversión fue exitosa
-                    _, dia, mes, anio, fecha_dt = fecha_conv
-                    fechas_formateadas.append(f"{dia:02d}/{mes:02d}/{anio}")
-                    dias.append(dia)
-                    meses.append(mes)
-                    años.append(anio)
-                    fechas_datetime.append(fecha_dt)
-                else:
-                    fechas_formateadas.append("")
-                    dias.append("")
-                    meses.append("")
-                    años.append("")
-                    fechas_datetime.append(None)
-            
-            # Actualizar columna original
-            df[col_fecha] = fechas_formateadas
+            # Actualizar columna original en formato dd/mm/yyyy
+            df[col_fecha] = texto
             
             # Crear columnas separadas
             df[f'DIA {col_fecha}'] = dias
             df[f'MES {col_fecha}'] = meses
-            df[f'AÑO {col_fecha}'] = años
+            df[f'AÑO {col_fecha}'] = anios
             
             # Guardar fechas como datetime para cálculos
-            df[f'{col_fecha}_DT'] = fechas_datetime
+            df[f'{col_fecha}_DT'] = fechas
     
-    print("Fechas procesadas correctamente")
+    log.info("Fechas procesadas correctamente")
     return df
 
 def calcular_dias_vencidos(df, fecha_cierre_str=None):
     """Calcula días vencidos y días por vencer para anticipos"""
-    print("Calculando días vencidos de anticipos...")
+    log.info("Calculando días vencidos de anticipos...")
     
     fecha_cierre = obtener_fecha_cierre(fecha_cierre_str)
     
     if 'FECHA VTO_DT' in df.columns and 'SALDO' in df.columns:
-        dias_vencidos = []
-        dias_por_vencer = []
-        
-        for fecha_vto in df['FECHA VTO_DT']:
-            if fecha_vto and pd.notna(fecha_vto):
-                dias_diff = (fecha_vto - fecha_cierre).days
-                if dias_diff < 0:
-                    # Vencido
-                    dias_vencidos.append(abs(dias_diff))
-                    dias_por_vencer.append(0)
-                else:
-                    # Por vencer
-                    dias_vencidos.append(0)
-                    dias_por_vencer.append(dias_diff)
-            else:
-                dias_vencidos.append(0)
-                dias_por_vencer.append(0)
+        # Diferencia en días respecto al cierre; fechas no válidas cuentan como 0
+        dias_diff = (pd.to_datetime(df['FECHA VTO_DT']) - fecha_cierre).dt.days.fillna(0).astype(int)
         
-        df['DIAS VENCIDO'] = dias_vencidos
-        df['DIAS POR VENCER'] = dias_por_vencer
+        df['DIAS VENCIDO'] = np.where(dias_diff < 0, -dias_diff, 0)
+        df['DIAS POR VENCER'] = np.where(dias_diff >= 0, dias_diff, 0)
         
-        print("Días vencidos y por vencer calculados correctamente")
+        log.info("Días vencidos y por vencer calculados correctamente")
     
     return df
 
 def calcular_saldos_anticipos(df):
     """Calcula saldos específicos para anticipos"""
-    print("Calculando saldos de anticipos...")
+    log.info("Calculando saldos de anticipos...")
     
     if 'SALDO' in df.columns and 'DIAS VENCIDO' in df.columns:
+        # Convertir el saldo una sola vez; las columnas derivadas se calculan con máscaras
+        saldo = convertir_valores_serie(df['SALDO'])
+        df['SALDO'] = saldo
+        vencido = df['DIAS VENCIDO'] > 0
+        dotado = df['DIAS VENCIDO'] >= 90
+        
         # Saldo vencido
-        df['SALDO VENCIDO'] = df.apply(
-            lambda row: convertir_valor(str(row['SALDO'])) if row['DIAS VENCIDO'] > 0 else 0, axis=1
-        )
+        df['SALDO VENCIDO'] = saldo.where(vencido, 0)
         
         # Saldo por vencer
-        df['SALDO POR VENCER'] = df.apply(
-            lambda row: convertir_valor(str(row['SALDO'])) if row['DIAS VENCIDO'] <= 0 else 0, axis=1
-        )
+        df['SALDO POR VENCER'] = saldo.where(~vencido, 0)
         
         # % Dotación (específico para anticipos)
-        df['% Dotación'] = df['DIAS VENCIDO'].apply(lambda x: '100%' if x >= 90 else '0%')
+        df['% Dotación'] = np.where(dotado, '100%', '0%')
         
         # Valor Dotación
-        df['Valor Dotación'] = df.apply(
-            lambda row: convertir_valor(str(row['SALDO'])) if row['DIAS VENCIDO'] >= 90 else 0, axis=1
-        )
+        df['Valor Dotación'] = saldo.where(dotado, 0)
         
-        print("Saldos de anticipos calculados correctamente")
+        log.info("Saldos de anticipos calculados correctamente")
     
     return df
 
+# Columnas numéricas que requieren formato colombiano (y se suman en la hoja TOTALES)
+COLUMNAS_IMPORTE = ['SALDO', 'SALDO VENCIDO', 'SALDO POR VENCER', 'Valor Dotación']
+
 def aplicar_formato_final(df):
     """Aplica el formato final al DataFrame de anticipos"""
-    print("Aplicando formato final a anticipos...")
+    log.info("Aplicando formato final a anticipos...")
     
     # Eliminar columnas de datetime
     columnas_a_eliminar = [col for col in df.columns if col.endswith('_DT')]
     if columnas_a_eliminar:
         df = df.drop(columns=columnas_a_eliminar)
     
-    # Columnas numéricas que requieren formato colombiano
-    columnas_numericas = [
-        'SALDO', 'SALDO VENCIDO', 'SALDO POR VENCER', 'Valor Dotación'
-    ]
-    
     # Filtrar solo las columnas que existen en el DataFrame
-    columnas_existentes = [col for col in columnas_numericas if col in df.columns]
+    columnas_existentes = [col for col in COLUMNAS_IMPORTE if col in df.columns]
     
     # Aplicar formato colombiano
     df = aplicar_formato_colombiano_dataframe(df, columnas_existentes)
@@ -252,41 +282,62 @@ def aplicar_formato_final(df):
         if '%' not in col:
             df[col] = df[col].replace(['0', '0,00', '0.00', '0,0', '0.0'], '-')
     
-    print("Formato final aplicado correctamente")
+    log.info("Formato final aplicado correctamente")
     return df
 
-def procesar_anticipos(input_path, output_path=None, fecha_cierre_str=None):
+def procesar_anticipos(input_path, output_path=None, fecha_cierre_str=None, entrada=None, df_entrada=None,
+                       max_mb=None):
     """
-    Procesa el archivo de anticipos según las especificaciones
+    Procesa el archivo de anticipos según las especificaciones.
+    Con df_entrada (el archivo ya leído como texto) y entrada (su validación) no se vuelve
+    a leer input_path; el DataFrame recibido no se modifica.
+    Si el resultado supera el límite de filas de una hoja o max_mb, el Excel se divide en
+    hojas Sheet1_1, ... o archivos <salida>_parteN.xlsx con una hoja TOTALES.
+    Junto al Excel se guarda el resumen de la ejecución (<salida>_resumen.json).
     """
-    print("=" * 80)
-    print("PROCESADOR DE ANTICIPOS - GRUPO PLANETA")
-    print("=" * 80)
+    cronometro = iniciar_cronometro()
+    log.info("=" * 80)
+    log.info("PROCESADOR DE ANTICIPOS - GRUPO PLANETA")
+    log.info("=" * 80)
     
     if fecha_cierre_str:
-        print(f"Fecha de cierre especificada: {fecha_cierre_str}")
+        log.info(f"Fecha de cierre especificada: {fecha_cierre_str}")
     else:
-        print("Usando fecha de cierre por defecto (último día del mes actual)")
+        log.info("Usando fecha de cierre por defecto (último día del mes actual)")
     
     try:
         # Leer archivo
-        print(f"Leyendo archivo: {input_path}")
+        log.info(f"Leyendo archivo: {input_path}")
         
-        # Intentar leer como Excel primero
-        try:
-            df = pd.read_excel(input_path, dtype=str)
-        except:
-            # Si falla, intentar como CSV
-            df = pd.read_csv(input_path, sep=';', encoding='latin1', dtype=str)
+        # Validación previa: formato, esquema y tipos a partir del encabezado y una muestra
+        # (salvo que quien llama ya haya validado y leído el archivo)
+        if df_entrada is None:
+            entrada = validar_archivo_entrada(input_path, ['PROVCA', 'CARTERA_NOMBRES', 'ANTICI'])
+        formato = entrada['formato']
+        log.info(f"Formato detectado: {formato['tipo']}"
+              + (f" (codificación {formato['encoding']}, separador '{formato['separador']}')" if formato['tipo'] == 'texto' else ''))
+        log.info(f"Esquema detectado: {entrada['esquema']}")
+        df = leer_archivo_tabular(input_path, formato=formato) if df_entrada is None else df_entrada.copy()
+        
+        log.info(f"Archivo leído correctamente. Registros: {len(df)}")
+        registros_leidos = len(df)
+        marcar_etapa(cronometro, 'lectura')
         
-        print(f"Archivo leído correctamente. Registros: {len(df)}")
+        # Exportación ANTICI (NC*/WW*): alinear con las columnas de provisión
+        if entrada['esquema'] == 'ANTICI':
+            df = alinear_anticipos_antici(df)
         
         # Procesar datos
         df = limpiar_y_validar_datos(df)
+        resolver_clientes([df])
         df = procesar_fechas(df, fecha_cierre_str)
         df = calcular_dias_vencidos(df, fecha_cierre_str)
         df = calcular_saldos_anticipos(df)
+        marcar_etapa(cronometro, 'calculos')
+        
+        df_tipado = df
         df = aplicar_formato_final(df)
+        marcar_etapa(cronometro, 'formato')
         
         # Definir carpeta de salida
         output_dir = r'C:\wamp64\www\modelo-deuda-python\cartera\resultados'
@@ -298,31 +349,49 @@ def procesar_anticipos(input_path, output_path=None, fecha_cierre_str=None):
         
         # Verificar que el DataFrame no esté vacío
         if df.empty:
-            print("ERROR: El DataFrame está vacío. No se puede generar archivo.")
+            log.error("El DataFrame está vacío. No se puede generar archivo.")
             return None
         
-        # Guardar archivo Excel
-        print(f"Guardando archivo: {output_path}")
-        df.to_excel(output_path, index=False)
+        # Guardar archivo Excel (dividido en hojas o archivos si no cabe en una hoja o en max_mb)
+        log.info(f"Guardando archivo: {output_path}")
+        partes = [output_path]
+        if requiere_division(df, max_mb):
+            salida = abrir_salida_dividida(output_path, max_mb)
+            columnas = [col for col in COLUMNAS_IMPORTE if col in df.columns]
+            escribir_dataframe_dividido(salida, 'Sheet1', df, df_tipado[columnas].apply(convertir_valores_serie))
+            partes = cerrar_salida_dividida(salida)
+        else:
+            df.to_excel(output_path, index=False)
         
         # Verificar que el archivo se creó correctamente
         if not os.path.exists(output_path):
-            print("ERROR: No se pudo crear el archivo Excel.")
+            log.error("No se pudo crear el archivo Excel.")
             return None
         
         if os.path.getsize(output_path) == 0:
-            print("ERROR: El archivo Excel está vacío.")
+            log.error("El archivo Excel está vacío.")
             os.remove(output_path)
             return None
+        marcar_etapa(cronometro, 'escritura')
+        
+        # Resumen estructurado de la ejecución para las páginas PHP
+        generar_resumen('anticipos', df_tipado, output_path, {
+            'entrada': input_path,
+            'excel': output_path,
+            'partes': partes if len(partes) > 1 else None
+        }, cronometro, obtener_fecha_cierre(fecha_cierre_str), esquema=entrada['esquema'],
+            registros_leidos=registros_leidos, registros_descartados=registros_leidos - len(df_tipado))
         
         # Resumen final
-        print("\n" + "=" * 80)
-        print("PROCESAMIENTO DE ANTICIPOS COMPLETADO EXITOSAMENTE")
-        print("=" * 80)
-        print(f"Archivo procesado: {input_path}")
-        print(f"Archivo generado: {output_path}")
-        print(f"Registros procesados: {len(df)}")
-        print(f"Columnas generadas: {len(df.columns)}")
+        log.info("\n" + "=" * 80)
+        log.info("PROCESAMIENTO DE ANTICIPOS COMPLETADO EXITOSAMENTE")
+        log.info("=" * 80)
+        log.info(f"Archivo procesado: {input_path}")
+        log.info(f"Archivo generado: {output_path}")
+        for parte in partes[1:]:
+            log.info(f"Parte adicional generada: {parte}")
+        log.info(f"Registros procesados: {len(df)}")
+        log.info(f"Columnas generadas: {len(df.columns)}")
         
         # Mostrar columnas principales
         columnas_principales = [
@@ -330,21 +399,35 @@ def procesar_anticipos(input_path, output_path=None, fecha_cierre_str=None):
             'NUMERO FACTURA', 'FECHA VTO', 'SALDO', 'DIAS VENCIDO',
             'SALDO VENCIDO', 'SALDO POR VENCER', '% Dotación', 'Valor Dotación'
         ]
-        print(f"\nColumnas principales: {[col for col in columnas_principales if col in df.columns]}")
+        log.info(f"\nColumnas principales: {[col for col in columnas_principales if col in df.columns]}")
         
         return output_path
         
     except Exception as e:
-        print(f"ERROR durante el procesamiento: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        log.exception(f"Falló el procesamiento: {str(e)}")
         return None
 
 if __name__ == "__main__":
-    if len(sys.argv) > 1:
-        input_file = sys.argv[1]
-        fecha_cierre = sys.argv[2] if len(sys.argv) > 2 else None
-        output_file = sys.argv[3] if len(sys.argv) > 3 else None
-        procesar_anticipos(input_file, output_file, fecha_cierre)
+    # Modo silencioso: la única salida estándar es el resultado final en JSON
+    silencioso, argumentos = extraer_opcion(sys.argv[1:], '--silencioso', es_bandera=True)
+    quiet, argumentos = extraer_opcion(argumentos, '--quiet', es_bandera=True)
+    nivel_log, argumentos = extraer_opcion(argumentos, '--nivel-log', 'INFO')
+    # Tamaño máximo de cada archivo generado (MB); el resto pasa a <salida>_parteN.xlsx
+    max_mb, argumentos = extraer_opcion(argumentos, '--max-mb')
+    silencioso = silencioso or quiet
+    
+    if len(argumentos) > 0:
+        input_file = argumentos[0]
+        fecha_cierre = argumentos[1] if len(argumentos) > 1 else None
+        output_file = argumentos[2] if len(argumentos) > 2 else None
+        ruta_log = configurar_bitacora('anticipos', silencioso, nivel_log)
+        with salida_silenciosa(silencioso):
+            salida = procesar_anticipos(input_file, output_file, fecha_cierre,
+                                        max_mb=float(max_mb) if max_mb else None)
+        registrar_resumen_errores(log)
+        if silencioso:
+            emitir_resultado({'success': salida is not None, 'archivo_generado': salida,
+                              'errores_conversion': resumen_errores(), 'log': ruta_log})
+        sys.exit(0 if salida else 1)
     else:
-        print("Uso: python procesador_anticipos.py <ruta_entrada> [<fecha_cierre_YYYY-MM-DD>] [<ruta_salida_excel>]") 
\ No newline at end of file
+        print("Uso: python procesador_anticipos.py <ruta_entrada> [<fecha_cierre_YYYY-MM-DD>] [<ruta_salida_excel>] [--max-mb MB] [--silencioso] [--nivel-log NIVEL]") 
\ No newline at end of file
@@ -29,6 +29,12 @@ import json
 import warnings
 warnings.filterwarnings('ignore')
 
+from utilidades_cartera import leer_excel_columnas, buscar_fila_excel, convertir_valores_serie, extraer_opcion
+from movimientos_cartera import calcular_movimientos_archivos
+from resumen_ejecucion import iniciar_cronometro, marcar_etapa, tiempos_etapas
+from bitacora import (obtener_logger, configurar_bitacora, salida_silenciosa, registrar_resumen_errores,
+                      resumen_errores, emitir_resultado)
+
 # Importar utilidades
 try:
     from utilidades_cartera import convertir_fecha, convertir_valor, aplicar_formato_colombiano_dataframe
@@ -63,7 +69,7 @@ def obtener_fecha_cierre(fecha_cierre_str=None):
         try:
             return datetime.strptime(fecha_cierre_str, '%Y-%m-%d')
         except ValueError:
-            print(f"ADVERTENCIA: Formato de fecha incorrecto '{fecha_cierre_str}'. Usando fecha por defecto.")
+            log.warning(f"Formato de fecha incorrecto '{fecha_cierre_str}'. Usando fecha por defecto.")
     
     # Fecha por defecto: último día del mes actual
     hoy = datetime.now()
@@ -73,98 +79,137 @@ def obtener_fecha_cierre(fecha_cierre_str=None):
         cierre = datetime(hoy.year, hoy.month + 1, 1) - pd.Timedelta(days=1)
     return cierre
 
-def leer_archivo_balance(ruta_archivo):
-    """Lee y procesa el archivo BALANCE"""
-    print("Leyendo archivo BALANCE...")
+log = obtener_logger('procesador_balance_completo')
+
+# Cuentas del BALANCE que se totalizan por defecto: cuentas objeto (5 dígitos)
+# y subcuentas completas (prefijo.objeto.subcuenta)
+CUENTAS_OBJETO_BALANCE = ['43001', '43008', '43042']
+SUBCUENTAS_BALANCE = ['0080.43002.20', '0080.43002.21', '0080.43002.15', 
+                      '0080.43002.28', '0080.43002.31', '0080.43002.63']
+
+# Jerarquía de un código de cuenta: [prefijo.]objeto[.subcuenta]
+PATRON_CUENTA = r'^(?:(?P<PREFIJO>\d+)\.)?(?P<OBJETO>\d{5})(?:\.(?P<SUBCUENTA>.+))?$'
+
+def normalizar_codigos_cuenta(serie):
+    """Normaliza códigos de cuenta: sin espacios ni sufijo decimal de Excel"""
+    return (serie.astype(str).str.replace(r'\s+', '', regex=True)
+            .str.replace(r'\.0$', '', regex=True))
+
+def construir_indice_cuentas(df, columna_cuenta, columna_saldo):
+    """
+    Construye el índice de cuentas del BALANCE: normaliza los códigos una sola vez,
+    extrae su jerarquía (prefijo, objeto, subcuenta) y convierte los saldos en bloque.
+    """
+    codigos = normalizar_codigos_cuenta(df[columna_cuenta])
+    indice = codigos.str.extract(PATRON_CUENTA)
+    indice['CUENTA'] = codigos
+    indice['SALDO'] = convertir_valores_serie(df[columna_saldo])
+    # Filas sin código de cuenta válido (títulos, totales, vacías) no forman parte del índice
+    return indice[indice['OBJETO'].notna()]
+
+def totalizar_cuentas(indice, cuentas):
+    """
+    Calcula el saldo total de cada cuenta solicitada con una única agrupación.
+    Un código de 5 dígitos se totaliza por cuenta objeto; un código completo, por
+    coincidencia exacta de cuenta. Solo se devuelven las cuentas presentes en el índice.
+    """
+    totales_cuenta = indice.groupby(['OBJETO', 'CUENTA'])['SALDO'].sum()
+    totales_objeto = totales_cuenta.groupby(level='OBJETO').sum()
+    totales_cuenta = totales_cuenta.droplevel('OBJETO')
+    
+    cuentas = list(cuentas)
+    normalizadas = normalizar_codigos_cuenta(pd.Series(cuentas, dtype=str))
+    
+    resultados = {}
+    for cuenta, codigo in zip(cuentas, normalizadas):
+        if len(codigo) == 5 and codigo in totales_objeto.index:
+            resultados[cuenta] = float(totales_objeto[codigo])
+        elif codigo in totales_cuenta.index:
+            resultados[cuenta] = float(totales_cuenta[codigo])
+    return resultados
+
+def leer_archivo_balance(ruta_archivo, cuentas_objeto=None, subcuentas=None):
+    """
+    Lee y procesa el archivo BALANCE.
+    cuentas_objeto y subcuentas permiten configurar las cuentas a totalizar
+    (por defecto CUENTAS_OBJETO_BALANCE y SUBCUENTAS_BALANCE).
+    """
+    log.info("Leyendo archivo BALANCE...")
+    
+    cuentas_objeto = cuentas_objeto or CUENTAS_OBJETO_BALANCE
+    subcuentas = subcuentas or SUBCUENTAS_BALANCE
     
     try:
-        # Leer archivo Excel
-        df = pd.read_excel(ruta_archivo, dtype=str)
-        print(f"Archivo BALANCE leído. Registros: {len(df)}")
-        
-        # Buscar columnas relevantes
+        # Leer solo las columnas relevantes del archivo Excel
         columnas_buscar = ['Cuenta Objeto', 'Saldo AAF variación', 'Saldo AAF']
+        df = leer_excel_columnas(ruta_archivo, columnas_buscar)
+        log.info(f"Archivo BALANCE leído. Registros: {len(df)}")
+        
         columnas_encontradas = [col for col in columnas_buscar if col in df.columns]
         
         if not columnas_encontradas:
-            print("ADVERTENCIA: No se encontraron columnas esperadas en BALANCE")
+            log.warning("No se encontraron columnas esperadas en BALANCE")
+            return {}
+        
+        # Usar 'Saldo AAF variación' si existe, sino 'Saldo AAF'
+        columna_saldo = 'Saldo AAF variación' if 'Saldo AAF variación' in df.columns else 'Saldo AAF'
+        if 'Cuenta Objeto' not in df.columns or columna_saldo not in df.columns:
             return {}
         
-        # Extraer datos de cuentas objeto específicas
-        cuentas_objeto = ['43001', '43008', '43042']
-        subcuentas = ['0080.43002.20', '0080.43002.21', '0080.43002.15', 
-                     '0080.43002.28', '0080.43002.31', '0080.43002.63']
+        # Índice de cuentas y totales de todas las cuentas solicitadas en una pasada
+        indice = construir_indice_cuentas(df, 'Cuenta Objeto', columna_saldo)
+        totales = totalizar_cuentas(indice, list(cuentas_objeto) + list(subcuentas))
         
         resultados = {}
         
-        # Procesar cuentas objeto principales
         for cuenta in cuentas_objeto:
-            if 'Cuenta Objeto' in df.columns:
-                filtro = df['Cuenta Objeto'].astype(str).str.contains(cuenta, na=False)
-                datos_cuenta = df[filtro]
-                
-                if not datos_cuenta.empty:
-                    # Usar 'Saldo AAF variación' si existe, sino 'Saldo AAF'
-                    columna_saldo = 'Saldo AAF variación' if 'Saldo AAF variación' in df.columns else 'Saldo AAF'
-                    if columna_saldo in datos_cuenta.columns:
-                        saldo_total = sum(datos_cuenta[columna_saldo].apply(convertir_valor))
-                        resultados[f'Total cuenta objeto {cuenta}'] = saldo_total
-                        print(f"Total cuenta objeto {cuenta}: {saldo_total:,.2f}")
-        
-        # Procesar subcuentas específicas
+            if cuenta in totales:
+                resultados[f'Total cuenta objeto {cuenta}'] = totales[cuenta]
+                log.info(f"Total cuenta objeto {cuenta}: {totales[cuenta]:,.2f}")
+        
         for subcuenta in subcuentas:
-            if 'Cuenta Objeto' in df.columns:
-                filtro = df['Cuenta Objeto'].astype(str).str.contains(subcuenta, na=False)
-                datos_subcuenta = df[filtro]
-                
-                if not datos_subcuenta.empty:
-                    columna_saldo = 'Saldo AAF variación' if 'Saldo AAF variación' in df.columns else 'Saldo AAF'
-                    if columna_saldo in datos_subcuenta.columns:
-                        saldo_total = sum(datos_subcuenta[columna_saldo].apply(convertir_valor))
-                        resultados[f'Subcuenta {subcuenta}'] = saldo_total
-                        print(f"Subcuenta {subcuenta}: {saldo_total:,.2f}")
+            if subcuenta in totales:
+                resultados[f'Subcuenta {subcuenta}'] = totales[subcuenta]
+                log.info(f"Subcuenta {subcuenta}: {totales[subcuenta]:,.2f}")
         
         return resultados
         
     except Exception as e:
-        print(f"ERROR leyendo archivo BALANCE: {str(e)}")
+        log.error(f"No se pudo leer el archivo BALANCE: {str(e)}")
         return {}
 
 def leer_archivo_situacion(ruta_archivo):
     """Lee y procesa el archivo SITUACIÓN"""
-    print("Leyendo archivo SITUACIÓN...")
+    log.info("Leyendo archivo SITUACIÓN...")
     
     try:
-        # Leer archivo Excel
-        df = pd.read_excel(ruta_archivo, dtype=str)
-        print(f"Archivo SITUACIÓN leído. Registros: {len(df)}")
-        
-        # Buscar TOTAL 01010 en columna SALDOS MES
-        if 'SALDOS MES' in df.columns:
-            # Buscar fila con TOTAL 01010
-            filtro_total = df.iloc[:, 0].astype(str).str.contains('TOTAL 01010', na=False, case=False)
-            datos_total = df[filtro_total]
-            
-            if not datos_total.empty:
-                valor_total = convertir_valor(datos_total.iloc[0]['SALDOS MES'])
-                print(f"TOTAL 01010 (SALDOS MES): {valor_total:,.2f}")
-                return {'TOTAL 01010': valor_total}
-        
-        print("ADVERTENCIA: No se encontró TOTAL 01010 en archivo SITUACIÓN")
+        # Buscar TOTAL 01010 en columna SALDOS MES: la lectura se detiene en esa fila
+        fila_total = buscar_fila_excel(ruta_archivo, 'TOTAL 01010', ['SALDOS MES'])
+        
+        if fila_total and 'SALDOS MES' in fila_total:
+            valor_total = convertir_valor(fila_total['SALDOS MES'])
+            log.info(f"TOTAL 01010 (SALDOS MES): {valor_total:,.2f}")
+            return {'TOTAL 01010': valor_total}
+        
+        log.warning("No se encontró TOTAL 01010 en archivo SITUACIÓN")
         return {}
         
     except Exception as e:
-        print(f"ERROR leyendo archivo SITUACIÓN: {str(e)}")
+        log.error(f"No se pudo leer el archivo SITUACIÓN: {str(e)}")
         return {}
 
 def leer_archivo_focus(ruta_archivo):
     """Lee y procesa el archivo FOCUS"""
-    print("Leyendo archivo FOCUS...")
+    log.info("Leyendo archivo FOCUS...")
     
     try:
-        # Leer archivo Excel (formato España - archivo número 2)
-        df = pd.read_excel(ruta_archivo, sheet_name=1, dtype=str)  # Segunda hoja
-        print(f"Archivo FOCUS leído. Registros: {len(df)}")
+        # Leer archivo Excel (formato España - archivo número 2), segunda hoja,
+        # cargando solo las columnas de vencimientos y dotaciones
+        palabras_clave = ['vencido', 'vencimiento', 'dotación', 'dotacion']
+        df = leer_excel_columnas(
+            ruta_archivo, lambda col: any(p in col.lower() for p in palabras_clave), hoja=1
+        )
+        log.info(f"Archivo FOCUS leído. Registros: {len(df)}")
         
         # Buscar datos de vencimientos y dotaciones
         # Esto dependerá de la estructura específica del archivo
@@ -173,33 +218,33 @@ def leer_archivo_focus(ruta_archivo):
         # Buscar columnas relacionadas con vencimientos
         columnas_vencimiento = [col for col in df.columns if 'vencido' in col.lower() or 'vencimiento' in col.lower()]
         if columnas_vencimiento:
-            print(f"Columnas de vencimiento encontradas: {columnas_vencimiento}")
+            log.info(f"Columnas de vencimiento encontradas: {columnas_vencimiento}")
             for col in columnas_vencimiento:
                 # Sumar valores de la columna
                 valores = df[col].apply(convertir_valor)
                 total = valores.sum()
                 resultados[f'Total {col}'] = total
-                print(f"Total {col}: {total:,.2f}")
+                log.info(f"Total {col}: {total:,.2f}")
         
         # Buscar columnas relacionadas con dotaciones
         columnas_dotacion = [col for col in df.columns if 'dotación' in col.lower() or 'dotacion' in col.lower()]
         if columnas_dotacion:
-            print(f"Columnas de dotación encontradas: {columnas_dotacion}")
+            log.info(f"Columnas de dotación encontradas: {columnas_dotacion}")
             for col in columnas_dotacion:
                 valores = df[col].apply(convertir_valor)
                 total = valores.sum()
                 resultados[f'Total {col}'] = total
-                print(f"Total {col}: {total:,.2f}")
+                log.info(f"Total {col}: {total:,.2f}")
         
         return resultados
         
     except Exception as e:
-        print(f"ERROR leyendo archivo FOCUS: {str(e)}")
+        log.error(f"No se pudo leer el archivo FOCUS: {str(e)}")
         return {}
 
 def calcular_tipos_cambio():
     """Calcula tipos de cambio (placeholder para implementación futura)"""
-    print("Calculando tipos de cambio...")
+    log.info("Calculando tipos de cambio...")
     
     # Por ahora, usar valores de ejemplo
     # En una implementación real, estos vendrían de una API o base de datos
@@ -209,16 +254,22 @@ def calcular_tipos_cambio():
         'fecha_actualizacion': datetime.now().strftime('%Y-%m-%d')
     }
     
-    print(f"Tipos de cambio calculados: USD={tipos_cambio['USD_COP']}, EUR={tipos_cambio['EUR_COP']}")
+    log.info(f"Tipos de cambio calculados: USD={tipos_cambio['USD_COP']}, EUR={tipos_cambio['EUR_COP']}")
     return tipos_cambio
 
-def realizar_calculos_financieros(datos_balance, datos_situacion, datos_focus, tipos_cambio):
-    """Realiza los cálculos financieros complejos"""
-    print("Realizando cálculos financieros...")
+def realizar_calculos_financieros(datos_balance, datos_situacion, datos_focus, tipos_cambio, movimientos=None):
+    """
+    Realiza los cálculos financieros complejos.
+    Si se reciben movimientos (calculados entre dos cortes de PROVCA con movimientos_cartera),
+    cobros, facturación, vencidos y dotaciones son los reales; si no, se estiman con
+    porcentajes fijos sobre el balance y el resultado se marca como 'estimado'.
+    """
+    log.info("Realizando cálculos financieros...")
     
     resultados = {
         'fecha_procesamiento': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
         'tipos_cambio': tipos_cambio,
+        'origen_movimientos': 'cortes_provca' if movimientos else 'estimado',
         'resumen_calculos': {},
         'provision_dotacion': {},
         'detalles_por_archivo': {
@@ -228,6 +279,15 @@ def realizar_calculos_financieros(datos_balance, datos_situacion, datos_focus, t
         }
     }
     
+    if movimientos:
+        resultados['resumen_calculos'] = movimientos['resumen_calculos']
+        resultados['provision_dotacion'] = movimientos['provision_dotacion']
+        resultados['deuda_cartera'] = movimientos['deuda']
+        resultados['conteos_facturas'] = movimientos['conteos']
+        resultados['fechas_cierre'] = movimientos.get('fechas_cierre', {})
+        log.info("Cálculos financieros completados con movimientos reales entre cortes")
+        return resultados
+    
     # 1. Deuda Bruta NO Grupo
     deuda_bruta_inicial = datos_balance.get('Total cuenta objeto 43001', 0)
     deuda_bruta_final = datos_balance.get('Total cuenta objeto 43008', 0)
@@ -285,16 +345,18 @@ def realizar_calculos_financieros(datos_balance, datos_situacion, datos_focus, t
         'desdotaciones': dotacion_mes * 0.1  # Ejemplo: 10% de la dotación del mes
     }
     
-    print("Cálculos financieros completados")
+    log.info("Cálculos financieros completados")
     return resultados
 
 def generar_reporte_excel(resultados, output_path):
     """Genera reporte en formato Excel"""
-    print("Generando reporte Excel...")
+    log.info("Generando reporte Excel...")
     
     try:
         # Crear DataFrame para el reporte
         reporte_data = []
+        reporte_data.append(['ORIGEN MOVIMIENTOS', resultados.get('origen_movimientos', 'estimado'), ''])
+        reporte_data.append(['', '', ''])
         
         # Resumen de Cálculos
         resumen = resultados['resumen_calculos']
@@ -319,20 +381,29 @@ def generar_reporte_excel(resultados, output_path):
         # Guardar Excel
         df_reporte.to_excel(output_path, index=False)
         
-        print(f"Reporte Excel generado: {output_path}")
+        log.info(f"Reporte Excel generado: {output_path}")
         return True
         
     except Exception as e:
-        print(f"ERROR generando reporte Excel: {str(e)}")
+        log.error(f"No se pudo generar el reporte Excel: {str(e)}")
         return False
 
-def procesar_balance_completo(archivo_balance, archivo_situacion, archivo_focus, output_path=None):
+def procesar_balance_completo(archivo_balance, archivo_situacion, archivo_focus, output_path=None,
+                              cuentas_objeto=None, subcuentas=None, corte_anterior=None,
+                              corte_actual=None, fecha_cierre_str=None, lecturas=None, movimientos=None):
     """
-    Procesa los tres archivos de balance completo
+    Procesa los tres archivos de balance completo.
+    cuentas_objeto y subcuentas configuran las cuentas del BALANCE a totalizar.
+    corte_anterior y corte_actual son dos cortes consecutivos de PROVCA; si se indican,
+    los movimientos del mes se calculan factura a factura en lugar de estimarse.
+    lecturas ({'balance', 'situacion', 'focus'} con el resultado de leer_archivo_*) y
+    movimientos (de movimientos_cartera) evitan releer o recalcular lo que ya se tiene.
+    El JSON de resultados incluye las rutas generadas y los tiempos de cada etapa.
     """
-    print("=" * 80)
-    print("PROCESADOR COMPLETO DE BALANCE - GRUPO PLANETA")
-    print("=" * 80)
+    cronometro = iniciar_cronometro()
+    log.info("=" * 80)
+    log.info("PROCESADOR COMPLETO DE BALANCE - GRUPO PLANETA")
+    log.info("=" * 80)
     
     try:
         # Verificar que los archivos existen
@@ -341,16 +412,30 @@ def procesar_balance_completo(archivo_balance, archivo_situacion, archivo_focus,
             if not os.path.exists(archivo):
                 raise FileNotFoundError(f"Archivo no encontrado: {archivo}")
         
-        # Leer archivos
-        datos_balance = leer_archivo_balance(archivo_balance)
-        datos_situacion = leer_archivo_situacion(archivo_situacion)
-        datos_focus = leer_archivo_focus(archivo_focus)
+        # Leer archivos (salvo los ya leídos)
+        lecturas = lecturas or {}
+        datos_balance = (lecturas['balance'] if 'balance' in lecturas
+                         else leer_archivo_balance(archivo_balance, cuentas_objeto, subcuentas))
+        datos_situacion = (lecturas['situacion'] if 'situacion' in lecturas
+                           else leer_archivo_situacion(archivo_situacion))
+        datos_focus = lecturas['focus'] if 'focus' in lecturas else leer_archivo_focus(archivo_focus)
+        marcar_etapa(cronometro, 'lectura')
         
         # Calcular tipos de cambio
         tipos_cambio = calcular_tipos_cambio()
         
+        # Movimientos reales del mes entre dos cortes de PROVCA
+        if movimientos is None and corte_anterior and corte_actual:
+            movimientos = calcular_movimientos_archivos(
+                corte_anterior, corte_actual, obtener_fecha_cierre(fecha_cierre_str)
+            )
+            movimientos.pop('detalle')
+            marcar_etapa(cronometro, 'movimientos')
+        
         # Realizar cálculos financieros
-        resultados = realizar_calculos_financieros(datos_balance, datos_situacion, datos_focus, tipos_cambio)
+        resultados = realizar_calculos_financieros(datos_balance, datos_situacion, datos_focus, tipos_cambio,
+                                                   movimientos)
+        marcar_etapa(cronometro, 'calculos')
         
         # Definir carpeta de salida
         output_dir = r'C:\wamp64\www\modelo-deuda-python\cartera\resultados'
@@ -359,29 +444,38 @@ def procesar_balance_completo(archivo_balance, archivo_situacion, archivo_focus,
         # Generar archivos de salida
         timestamp = datetime.now().strftime('%Y-%m-%d_%H-%M-%S')
         
-        # Archivo JSON
-        json_path = os.path.join(output_dir, f'resultados_balance_completo.json')
-        with open(json_path, 'w', encoding='utf-8') as f:
-            json.dump(resultados, f, indent=2, ensure_ascii=False, default=str)
-        
         # Archivo Excel
         if not output_path:
             output_path = os.path.join(output_dir, f'BALANCE_COMPLETO_{timestamp}.xlsx')
         
         excel_generado = generar_reporte_excel(resultados, output_path)
+        marcar_etapa(cronometro, 'escritura')
+        
+        # Archivo JSON (con rutas y tiempos, para que PHP no tenga que abrir el Excel)
+        json_path = os.path.join(output_dir, f'resultados_balance_completo.json')
+        resultados['archivos'] = {
+            'balance': archivo_balance,
+            'situacion': archivo_situacion,
+            'focus': archivo_focus,
+            'excel': output_path if excel_generado else None,
+            'json': json_path
+        }
+        resultados['tiempos'] = tiempos_etapas(cronometro)
+        with open(json_path, 'w', encoding='utf-8') as f:
+            json.dump(resultados, f, indent=2, ensure_ascii=False, default=str)
         
         # Resumen final
-        print("\n" + "=" * 80)
-        print("PROCESAMIENTO COMPLETO DE BALANCE FINALIZADO")
-        print("=" * 80)
-        print(f"Archivos procesados:")
-        print(f"  - Balance: {archivo_balance}")
-        print(f"  - Situación: {archivo_situacion}")
-        print(f"  - Focus: {archivo_focus}")
-        print(f"Archivos generados:")
-        print(f"  - JSON: {json_path}")
+        log.info("\n" + "=" * 80)
+        log.info("PROCESAMIENTO COMPLETO DE BALANCE FINALIZADO")
+        log.info("=" * 80)
+        log.info(f"Archivos procesados:")
+        log.info(f"  - Balance: {archivo_balance}")
+        log.info(f"  - Situación: {archivo_situacion}")
+        log.info(f"  - Focus: {archivo_focus}")
+        log.info(f"Archivos generados:")
+        log.info(f"  - JSON: {json_path}")
         if excel_generado:
-            print(f"  - Excel: {output_path}")
+            log.info(f"  - Excel: {output_path}")
         
         return {
             'success': True,
@@ -391,29 +485,50 @@ def procesar_balance_completo(archivo_balance, archivo_situacion, archivo_focus,
         }
         
     except Exception as e:
-        print(f"ERROR durante el procesamiento: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        log.exception(f"Falló el procesamiento: {str(e)}")
         return {
             'success': False,
             'error': str(e)
         }
 
 if __name__ == "__main__":
-    if len(sys.argv) >= 4:
-        archivo_balance = sys.argv[1]
-        archivo_situacion = sys.argv[2]
-        archivo_focus = sys.argv[3]
-        output_path = sys.argv[4] if len(sys.argv) > 4 else None
-        
-        resultado = procesar_balance_completo(archivo_balance, archivo_situacion, archivo_focus, output_path)
+    # Cuentas a totalizar separadas por comas, p. ej. --cuentas-objeto 43001,43008
+    cuentas_objeto, argumentos = extraer_opcion(sys.argv[1:], '--cuentas-objeto')
+    subcuentas, argumentos = extraer_opcion(argumentos, '--subcuentas')
+    # Cortes de PROVCA del mes anterior y del actual para calcular los movimientos reales
+    corte_anterior, argumentos = extraer_opcion(argumentos, '--corte-anterior')
+    corte_actual, argumentos = extraer_opcion(argumentos, '--corte-actual')
+    fecha_cierre_str, argumentos = extraer_opcion(argumentos, '--fecha-cierre')
+    # Modo silencioso: la única salida estándar es el resultado final en JSON
+    silencioso, argumentos = extraer_opcion(argumentos, '--silencioso', es_bandera=True)
+    quiet, argumentos = extraer_opcion(argumentos, '--quiet', es_bandera=True)
+    nivel_log, argumentos = extraer_opcion(argumentos, '--nivel-log', 'INFO')
+    silencioso = silencioso or quiet
+    cuentas_objeto = [c.strip() for c in cuentas_objeto.split(',') if c.strip()] if cuentas_objeto else None
+    subcuentas = [c.strip() for c in subcuentas.split(',') if c.strip()] if subcuentas else None
+    
+    if len(argumentos) >= 3:
+        archivo_balance = argumentos[0]
+        archivo_situacion = argumentos[1]
+        archivo_focus = argumentos[2]
+        output_path = argumentos[3] if len(argumentos) > 3 else None
+        
+        ruta_log = configurar_bitacora('balance', silencioso, nivel_log)
+        with salida_silenciosa(silencioso):
+            resultado = procesar_balance_completo(archivo_balance, archivo_situacion, archivo_focus, output_path,
+                                                  cuentas_objeto, subcuentas, corte_anterior, corte_actual,
+                                                  fecha_cierre_str)
+        registrar_resumen_errores(log)
+        if silencioso:
+            emitir_resultado({**{clave: valor for clave, valor in resultado.items() if clave != 'resultados'},
+                              'errores_conversion': resumen_errores(), 'log': ruta_log})
         
         if resultado['success']:
-            print("Procesamiento completado exitosamente")
+            log.info("Procesamiento completado exitosamente")
             sys.exit(0)
         else:
-            print(f"Error en el procesamiento: {resultado['error']}")
+            log.error(f"Falló el procesamiento: {resultado['error']}")
             sys.exit(1)
     else:
-        print("Uso: python procesador_balance_completo.py <archivo_balance> <archivo_situacion> <archivo_focus> [<archivo_salida_excel>]")
+        print("Uso: python procesador_balance_completo.py <archivo_balance> <archivo_situacion> <archivo_focus> [<archivo_salida_excel>] [--cuentas-objeto C1,C2] [--subcuentas S1,S2] [--corte-anterior PROVCA_ANT --corte-actual PROVCA_ACT] [--fecha-cierre AAAA-MM-DD] [--silencioso] [--nivel-log NIVEL]")
         sys.exit(1) 
\ No newline at end of file
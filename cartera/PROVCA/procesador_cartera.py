@@ -28,13 +28,34 @@ Este script procesa únicamente el archivo de provisión de forma independiente.
 import pandas as pd
 import numpy as np
 from datetime import datetime, date
-from utilidades_cartera import convertir_fecha, convertir_valor, aplicar_formato_colombiano_dataframe
+from utilidades_cartera import aplicar_formato_colombiano_dataframe
+from utilidades_cartera import leer_archivo_tabular, extraer_opcion, calcular_trabajadores
+from utilidades_cartera import convertir_valores_serie, convertir_fechas_serie, descomponer_fechas
+from registro_esquemas import validar_archivo_entrada, huella_encabezado
+from almacen_historico import registrar_corte_historico
+from consulta_resultados import generar_consulta
+from resumen_ejecucion import iniciar_cronometro, marcar_etapa, generar_resumen
+from resolucion_clientes import resolver_clientes
+from procesamiento_particionado import procesar_particionado, MINIMO_REGISTROS_PARALELO
+from procesamiento_particionado import (procesar_por_bloques, FILAS_POR_BLOQUE, ESTRATEGIAS, ESTRATEGIA_AUTO,
+                                        ESTRATEGIA_MEMORIA, ESTRATEGIA_PARTICIONADO, ESTRATEGIA_BLOQUES)
+from escritura_excel import (requiere_division, abrir_salida_dividida, iniciar_hoja, escribir_filas,
+                             cerrar_salida_dividida)
+from bitacora import (obtener_logger, configurar_bitacora, salida_silenciosa, registrar_resumen_errores,
+                      resumen_errores, emitir_resultado, nivel_temporal)
 import os
 import sys
+import json
 import locale
+import logging
 import warnings
+from openpyxl import load_workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Alignment
 warnings.filterwarnings('ignore')
 
+log = obtener_logger('procesador_cartera')
+
 # Mapeo oficial de columnas según especificaciones
 MAPEO_PROVISION = {
     'PCCDEM': 'EMPRESA',
@@ -76,7 +97,7 @@ def obtener_fecha_cierre(fecha_cierre_str=None):
         try:
             return datetime.strptime(fecha_cierre_str, '%Y-%m-%d')
         except ValueError:
-            print(f"ADVERTENCIA: Formato de fecha incorrecto '{fecha_cierre_str}'. Usando fecha por defecto.")
+            log.warning(f"Formato de fecha incorrecto '{fecha_cierre_str}'. Usando fecha por defecto.")
     
     # Fecha por defecto: último día del mes actual
     hoy = datetime.now()
@@ -88,7 +109,7 @@ def obtener_fecha_cierre(fecha_cierre_str=None):
 
 def limpiar_y_validar_datos(df):
     """Limpia y valida los datos del DataFrame"""
-    print("Iniciando limpieza y validación de datos...")
+    log.info("Iniciando limpieza y validación de datos...")
     
     # Limpiar nombres de columnas
     df.columns = df.columns.str.strip()
@@ -104,37 +125,39 @@ def limpiar_y_validar_datos(df):
             columnas_renombradas[col_original] = col_nueva
     
     df = df.rename(columns=columnas_renombradas)
-    print(f"Columnas renombradas: {len(columnas_renombradas)}")
+    # PCCDEM y PCDEAC se mapean ambas a EMPRESA: conservar solo la primera (código de empresa)
+    df = df.loc[:, ~df.columns.duplicated()]
+    log.info(f"Columnas renombradas: {len(columnas_renombradas)}")
     
     # Eliminar columna PCIMCO si existe
     if 'PCIMCO' in df.columns:
         df = df.drop(columns=['PCIMCO'])
-        print("Columna PCIMCO eliminada")
+        log.info("Columna PCIMCO eliminada")
     
     # Eliminar fila de empresa PL30 (PCCDAC = 30 y valor -614.000)
     if 'ACTIVIDAD' in df.columns and 'SALDO' in df.columns:
         registros_antes = len(df)
         # Convertir valores de saldo para comparación
-        saldos_convertidos = df['SALDO'].apply(lambda x: convertir_valor(str(x)) if pd.notna(x) else 0)
+        saldos_convertidos = convertir_valores_serie(df['SALDO'])
         df = df[~((df['ACTIVIDAD'].astype(str).str.strip() == '30') & (saldos_convertidos == -614000))]
         registros_eliminados = registros_antes - len(df)
         if registros_eliminados > 0:
-            print(f"Eliminados {registros_eliminados} registros de empresa PL30")
+            log.info(f"Eliminados {registros_eliminados} registros de empresa PL30")
     
     # Validar y corregir valores negativos en saldos
     if 'SALDO' in df.columns:
-        saldos_convertidos = df['SALDO'].apply(lambda x: convertir_valor(str(x)) if pd.notna(x) else 0)
+        saldos_convertidos = convertir_valores_serie(df['SALDO'])
         valores_negativos = saldos_convertidos < 0
         if valores_negativos.any():
-            print(f"ADVERTENCIA: Se encontraron {valores_negativos.sum()} registros con valores negativos en SALDO")
-            print("Los valores negativos se convertirán a positivos para el procesamiento")
-            df['SALDO'] = df['SALDO'].apply(lambda x: str(abs(convertir_valor(str(x)))) if pd.notna(x) and convertir_valor(str(x)) < 0 else str(x))
+            log.warning(f"Se encontraron {valores_negativos.sum()} registros con valores negativos en SALDO")
+            log.info("Los valores negativos se convertirán a positivos para el procesamiento")
+            df['SALDO'] = df['SALDO'].astype(str).where(~valores_negativos, saldos_convertidos.abs().astype(str))
     
     return df
 
 def unificar_nombres_clientes(df):
     """Unifica los nombres de clientes en una sola columna"""
-    print("Unificando nombres de clientes...")
+    log.info("Unificando nombres de clientes...")
     
     if 'NOMBRE' in df.columns and 'DENOMINACION COMERCIAL' in df.columns:
         # Llenar valores vacíos en DENOMINACION COMERCIAL con NOMBRE
@@ -142,127 +165,124 @@ def unificar_nombres_clientes(df):
         df['NOMBRE'] = df['NOMBRE'].fillna('')
         
         # Unificar: si DENOMINACION COMERCIAL está vacía, usar NOMBRE
-        df['DENOMINACION COMERCIAL'] = df.apply(
-            lambda row: row['NOMBRE'] if pd.isna(row['DENOMINACION COMERCIAL']) or str(row['DENOMINACION COMERCIAL']).strip() == '' 
-            else row['DENOMINACION COMERCIAL'], axis=1
-        )
+        vacia = df['DENOMINACION COMERCIAL'].astype(str).str.strip() == ''
+        df['DENOMINACION COMERCIAL'] = df['DENOMINACION COMERCIAL'].where(~vacia, df['NOMBRE'])
         
-        print("Nombres de clientes unificados correctamente")
+        log.info("Nombres de clientes unificados correctamente")
     
     return df
 
+def parsear_registros(df):
+    """
+    Convierte las columnas de origen a tipos de trabajo: fechas a datetime (columnas _DT)
+    y SALDO a número (SALDO_NUM). No depende de la fecha de cierre.
+    """
+    log.info("Convirtiendo fechas y saldos...")
+    
+    for col_fecha in ['FECHA', 'FECHA VTO']:
+        if col_fecha in df.columns:
+            df[f'{col_fecha}_DT'] = convertir_fechas_serie(df[col_fecha])
+    
+    if 'SALDO' in df.columns:
+        df['SALDO_NUM'] = convertir_valores_serie(df['SALDO'])
+    
+    return df
+
+def preparar_registros(df):
+    """Limpieza, validación y conversión de tipos: todo lo que no depende de la fecha de cierre"""
+    df = limpiar_y_validar_datos(df)
+    df = unificar_nombres_clientes(df)
+    return parsear_registros(df)
+
+def preparar_registros_por_bloques(bloques):
+    """
+    preparar_registros aplicado a cada bloque de filas leídas como texto (p. ej. un lector
+    de read_csv con chunksize): el texto de cada bloque se libera al prepararlo.
+    Devuelve (registros preparados, registros leídos).
+    """
+    log.info("Preparando registros por bloques...")
+    partes = []
+    leidos = 0
+    for bloque in bloques:
+        leidos += len(bloque)
+        # Solo advertencias: el progreso de cada etapa se repetiría en cada bloque
+        with nivel_temporal(logging.WARNING):
+            partes.append(preparar_registros(bloque))
+    log.info(f"Registros preparados en {len(partes)} bloques: {sum(len(parte) for parte in partes)}")
+    return pd.concat(partes) if partes else pd.DataFrame(), leidos
+
+def _saldo_numerico(df):
+    """SALDO como número: la columna ya convertida si existe, si no se convierte en bloque"""
+    if 'SALDO_NUM' in df.columns:
+        return df['SALDO_NUM']
+    return convertir_valores_serie(df['SALDO'])
+
 def procesar_fechas(df, fecha_cierre_str=None):
     """Procesa las fechas y crea columnas separadas"""
-    print("Procesando fechas...")
-    
-    fecha_cierre = obtener_fecha_cierre(fecha_cierre_str)
+    log.info("Procesando fechas...")
     
     for col_fecha in ['FECHA', 'FECHA VTO']:
         if col_fecha in df.columns:
-            # Convertir fechas
-            fechas_convertidas = df[col_fecha].apply(convertir_fecha)
-            
-            # Formatear fechas en formato dd/mm/yyyy
-            fechas_formateadas = []
-            dias = []
-            meses = []
-            años = []
-            fechas_datetime = []
+            # Convertir fechas (si no vienen ya convertidas de preparar_registros)
+            if f'{col_fecha}_DT' not in df.columns:
+                df[f'{col_fecha}_DT'] = convertir_fechas_serie(df[col_fecha])
             
-            for fecha_conv in fechas_convertidas:
-                if fecha_conv[0]:  # Si la conversión fue exitosa
-                    _, dia, mes, anio, fecha_dt = fecha_conv
-                    fechas_formateadas.append(f"{dia:02d}/{mes:02d}/{anio}")
-                    dias.append(dia)
-                    meses.append(mes)
-                    años.append(anio)
-                    fechas_datetime.append(fecha_dt)
-                else:
-                    fechas_formateadas.append("")
-                    dias.append("")
-                    meses.append("")
-                    años.append("")
-                    fechas_datetime.append(None)
-            
-            # Actualizar columna original
-            df[col_fecha] = fechas_formateadas
-            
-            # Crear columnas separadas
-            df[f'DIA {col_fecha}'] = dias
-            df[f'MES {col_fecha}'] = meses
-            df[f'AÑO {col_fecha}'] = años
-            
-            # Guardar fechas como datetime para cálculos
-            df[f'{col_fecha}_DT'] = fechas_datetime
-    
-    print("Fechas procesadas correctamente")
+            # Fecha en formato dd/mm/yyyy y columnas separadas ('' si la fecha no es válida)
+            texto, dia, mes, anio = descomponer_fechas(df[f'{col_fecha}_DT'], '%d/%m/%Y')
+            df[col_fecha] = texto
+            df[f'DIA {col_fecha}'] = dia
+            df[f'MES {col_fecha}'] = mes
+            df[f'AÑO {col_fecha}'] = anio
+    
+    log.info("Fechas procesadas correctamente")
     return df
 
 def calcular_dias_vencidos(df, fecha_cierre_str=None):
     """Calcula días vencidos y días por vencer"""
-    print("Calculando días vencidos...")
+    log.info("Calculando días vencidos...")
     
     fecha_cierre = obtener_fecha_cierre(fecha_cierre_str)
     
     if 'FECHA VTO_DT' in df.columns and 'SALDO' in df.columns:
-        dias_vencidos = []
-        dias_por_vencer = []
-        
-        for fecha_vto in df['FECHA VTO_DT']:
-            if fecha_vto and pd.notna(fecha_vto):
-                dias_diff = (fecha_vto - fecha_cierre).days
-                if dias_diff < 0:
-                    # Vencido
-                    dias_vencidos.append(abs(dias_diff))
-                    dias_por_vencer.append(0)
-                else:
-                    # Por vencer
-                    dias_vencidos.append(0)
-                    dias_por_vencer.append(dias_diff)
-            else:
-                dias_vencidos.append(0)
-                dias_por_vencer.append(0)
-        
-        df['DIAS VENCIDO'] = dias_vencidos
-        df['DIAS POR VENCER'] = dias_por_vencer
+        # Diferencia en días respecto al cierre: negativa si está vencido; 0 sin fecha
+        dias_diff = (df['FECHA VTO_DT'] - pd.Timestamp(fecha_cierre)).dt.days.fillna(0).astype(int)
+        df['DIAS VENCIDO'] = (-dias_diff).clip(lower=0)
+        df['DIAS POR VENCER'] = dias_diff.clip(lower=0)
         
-        print("Días vencidos y por vencer calculados correctamente")
+        log.info("Días vencidos y por vencer calculados correctamente")
     
     return df
 
 def calcular_saldos_y_dotacion(df):
     """Calcula saldo vencido, dotación y mora total"""
-    print("Calculando saldos y dotación...")
+    log.info("Calculando saldos y dotación...")
     
     if 'SALDO' in df.columns and 'DIAS VENCIDO' in df.columns:
+        saldo = _saldo_numerico(df)
+        dias = df['DIAS VENCIDO']
+        
         # Saldo vencido
-        df['SALDO VENCIDO'] = df.apply(
-            lambda row: convertir_valor(str(row['SALDO'])) if row['DIAS VENCIDO'] > 0 else 0, axis=1
-        )
+        df['SALDO VENCIDO'] = saldo.where(dias > 0, 0)
         
         # % Dotación (100% si días vencidos >= 180)
-        df['% Dotación'] = df['DIAS VENCIDO'].apply(lambda x: '100%' if x >= 180 else '0%')
+        df['% Dotación'] = np.where(dias >= 180, '100%', '0%')
         
         # Valor Dotación (saldo si días vencidos >= 180)
-        df['  Valor Dotación  '] = df.apply(
-            lambda row: convertir_valor(str(row['SALDO'])) if row['DIAS VENCIDO'] >= 180 else 0, axis=1
-        )
+        df['  Valor Dotación  '] = saldo.where(dias >= 180, 0)
         
         # Mora Total (igual al saldo vencido)
         df['Mora Total'] = df['SALDO VENCIDO']
         
         # Valor Total Por Vencer
-        df['Valor Total Por Vencer'] = df.apply(
-            lambda row: convertir_valor(str(row['SALDO'])) if row['DIAS VENCIDO'] <= 0 else 0, axis=1
-        )
+        df['Valor Total Por Vencer'] = saldo.where(dias <= 0, 0)
         
-        print("Saldos y dotación calculados correctamente")
+        log.info("Saldos y dotación calculados correctamente")
     
     return df
 
 def calcular_vencimientos_historicos(df, fecha_cierre_str=None):
     """Calcula vencimientos históricos de los últimos 6 meses"""
-    print("Calculando vencimientos históricos...")
+    log.info("Calculando vencimientos históricos...")
     
     fecha_cierre = obtener_fecha_cierre(fecha_cierre_str)
     
@@ -276,6 +296,9 @@ def calcular_vencimientos_historicos(df, fecha_cierre_str=None):
             except:
                 locale.setlocale(locale.LC_TIME, '')
         
+        saldo = _saldo_numerico(df).astype(object)
+        fecha_vto = df['FECHA VTO_DT']
+        
         # Calcular vencimientos de los últimos 6 meses
         for i in range(1, 7):
             inicio_mes = fecha_cierre - pd.DateOffset(months=i)
@@ -284,120 +307,111 @@ def calcular_vencimientos_historicos(df, fecha_cierre_str=None):
             # Nombre del mes en formato abreviado
             nombre_mes = inicio_mes.strftime('%b-%y').lower()
             
-            df[nombre_mes] = df.apply(
-                lambda row: convertir_valor(str(row['SALDO'])) 
-                if (row['FECHA VTO_DT'] and inicio_mes <= row['FECHA VTO_DT'] < fin_mes) 
-                else '-', axis=1
-            )
+            df[nombre_mes] = saldo.where((fecha_vto >= inicio_mes) & (fecha_vto < fin_mes), '-')
         
-        print("Vencimientos históricos calculados correctamente")
+        log.info("Vencimientos históricos calculados correctamente")
     
     return df
 
 def calcular_vencimientos_por_rango(df):
     """Calcula vencimientos por rango de días según especificaciones"""
-    print("Calculando vencimientos por rango...")
+    log.info("Calculando vencimientos por rango...")
     
     if 'SALDO' in df.columns and 'DIAS VENCIDO' in df.columns:
+        saldo = _saldo_numerico(df)
         for nombre_col, min_dias, max_dias in VENCIMIENTOS_RANGOS:
-            df[nombre_col] = df.apply(
-                lambda row: convertir_valor(str(row['SALDO'])) 
-                if min_dias <= row['DIAS VENCIDO'] <= max_dias 
-                else 0, axis=1
-            )
+            df[nombre_col] = saldo.where(df['DIAS VENCIDO'].between(min_dias, max_dias), 0)
         
-        print("Vencimientos por rango calculados correctamente")
+        log.info("Vencimientos por rango calculados correctamente")
     
     return df
 
 def calcular_por_vencer(df, fecha_cierre_str=None):
     """Calcula valores por vencer de los próximos 3 meses"""
-    print("Calculando valores por vencer...")
+    log.info("Calculando valores por vencer...")
     
     fecha_cierre = obtener_fecha_cierre(fecha_cierre_str)
     
     if 'FECHA VTO_DT' in df.columns and 'SALDO' in df.columns:
+        saldo = _saldo_numerico(df)
+        fecha_vto = df['FECHA VTO_DT']
+        
         # Por vencer próximos 3 meses
         for i in range(1, 4):
             inicio_mes = fecha_cierre + pd.DateOffset(months=i-1)
             fin_mes = fecha_cierre + pd.DateOffset(months=i)
             
-            df[f'Por_Vencer_{i}_meses'] = df.apply(
-                lambda row: convertir_valor(str(row['SALDO'])) 
-                if (row['FECHA VTO_DT'] and inicio_mes <= row['FECHA VTO_DT'] < fin_mes) 
-                else 0, axis=1
-            )
+            df[f'Por_Vencer_{i}_meses'] = saldo.where((fecha_vto >= inicio_mes) & (fecha_vto < fin_mes), 0)
         
         # Mayor a 90 días
         fecha_90_dias = fecha_cierre + pd.DateOffset(days=90)
-        df['Por_Vencer_+90_dias'] = df.apply(
-            lambda row: convertir_valor(str(row['SALDO'])) 
-            if (row['FECHA VTO_DT'] and row['FECHA VTO_DT'] >= fecha_90_dias) 
-            else 0, axis=1
-        )
+        df['Por_Vencer_+90_dias'] = saldo.where(fecha_vto >= fecha_90_dias, 0)
         
-        print("Valores por vencer calculados correctamente")
+        log.info("Valores por vencer calculados correctamente")
     
     return df
 
 def validar_saldos(df):
     """Valida que las sumas de saldos sean correctas"""
-    print("Validando saldos...")
+    log.info("Validando saldos...")
     
     errores = []
     
     # Validar que Mora Total + Valor Total Por Vencer = Saldo
     if all(col in df.columns for col in ['Mora Total', 'Valor Total Por Vencer', 'SALDO']):
-        df['Verificación Suma Saldos'] = df.apply(
-            lambda row: 'OK' if abs(row['Mora Total'] + row['Valor Total Por Vencer'] - convertir_valor(str(row['SALDO']))) < 0.01 
-            else 'ERROR', axis=1
-        )
+        diferencia = df['Mora Total'] + df['Valor Total Por Vencer'] - _saldo_numerico(df)
+        df['Verificación Suma Saldos'] = np.where(diferencia.abs() < 0.01, 'OK', 'ERROR')
         
         errores_suma = (df['Verificación Suma Saldos'] == 'ERROR').sum()
         if errores_suma > 0:
-            print(f"ADVERTENCIA: {errores_suma} registros con error en suma de saldos")
+            log.warning(f"{errores_suma} registros con error en suma de saldos")
             errores.append(f"Suma saldos: {errores_suma} errores")
     
     # Validar que suma de vencimientos = saldo
     columnas_vencimiento = [col for col, _, _ in VENCIMIENTOS_RANGOS]
     if all(col in df.columns for col in columnas_vencimiento) and 'SALDO' in df.columns:
-        df['Validación Vencimientos'] = df.apply(
-            lambda row: 'OK' if abs(sum([row[col] for col in columnas_vencimiento]) - convertir_valor(str(row['SALDO']))) < 0.01 
-            else 'ERROR', axis=1
-        )
+        diferencia = df[columnas_vencimiento].sum(axis=1) - _saldo_numerico(df)
+        df['Validación Vencimientos'] = np.where(diferencia.abs() < 0.01, 'OK', 'ERROR')
         
         errores_venc = (df['Validación Vencimientos'] == 'ERROR').sum()
         if errores_venc > 0:
-            print(f"ADVERTENCIA: {errores_venc} registros con error en suma de vencimientos")
+            log.warning(f"{errores_venc} registros con error en suma de vencimientos")
             errores.append(f"Vencimientos: {errores_venc} errores")
     
     if errores:
-        print(f"Errores encontrados: {', '.join(errores)}")
+        log.warning(f"Errores encontrados: {', '.join(errores)}")
     else:
-        print("Todas las validaciones de saldos son correctas")
+        log.info("Todas las validaciones de saldos son correctas")
     
     return df
 
 def crear_deuda_incobrable(df):
     """Crea la columna de deuda incobrable"""
-    print("Creando columna de deuda incobrable...")
+    log.info("Creando columna de deuda incobrable...")
     
     if '  Valor Dotación  ' in df.columns:
         df['  DEUDA INCOBRABLE  '] = df['  Valor Dotación  ']
-        print("Columna de deuda incobrable creada correctamente")
+        log.info("Columna de deuda incobrable creada correctamente")
     
     return df
 
-def aplicar_formato_final(df):
-    """Aplica el formato final al DataFrame"""
-    print("Aplicando formato final...")
-    
-    # Eliminar columnas de datetime que contienen información de tiempo
-    columnas_a_eliminar = [col for col in df.columns if col.endswith('_DT')]
-    if columnas_a_eliminar:
-        print(f"Eliminando columnas de datetime: {columnas_a_eliminar}")
-        df = df.drop(columns=columnas_a_eliminar)
-    
+def calcular_vencimientos(df, fecha_cierre_str=None):
+    """
+    Etapas de vencimiento con la fecha de cierre: fechas, días vencidos, dotación, rangos,
+    por vencer y validaciones. Cada factura se calcula de forma independiente, por lo que
+    la función puede aplicarse a particiones del DataFrame en procesos distintos.
+    """
+    df = procesar_fechas(df, fecha_cierre_str)
+    df = calcular_dias_vencidos(df, fecha_cierre_str)
+    df = calcular_saldos_y_dotacion(df)
+    df = calcular_vencimientos_historicos(df, fecha_cierre_str)
+    df = calcular_vencimientos_por_rango(df)
+    df = calcular_por_vencer(df, fecha_cierre_str)
+    df = validar_saldos(df)
+    return crear_deuda_incobrable(df)
+
+def columnas_formato_numerico(df):
+    """Columnas de df que llevan formato colombiano (importes, rangos, meses y por vencer)"""
     # Columnas numéricas que requieren formato colombiano
     columnas_numericas = [
         'SALDO', 'SALDO VENCIDO', '  Valor Dotación  ', 'Mora Total', 
@@ -420,7 +434,19 @@ def aplicar_formato_final(df):
     columnas_numericas.append('Por_Vencer_+90_dias')
     
     # Filtrar solo las columnas que existen en el DataFrame
-    columnas_existentes = [col for col in columnas_numericas if col in df.columns]
+    return [col for col in columnas_numericas if col in df.columns]
+
+def aplicar_formato_final(df):
+    """Aplica el formato final al DataFrame"""
+    log.info("Aplicando formato final...")
+    
+    # Eliminar columnas de trabajo (datetime y saldo numérico)
+    columnas_a_eliminar = [col for col in df.columns if col.endswith('_DT') or col == 'SALDO_NUM']
+    if columnas_a_eliminar:
+        log.info(f"Eliminando columnas de datetime: {columnas_a_eliminar}")
+        df = df.drop(columns=columnas_a_eliminar)
+    
+    columnas_existentes = columnas_formato_numerico(df)
     
     # Aplicar formato colombiano
     df = aplicar_formato_colombiano_dataframe(df, columnas_existentes)
@@ -430,106 +456,364 @@ def aplicar_formato_final(df):
         if '%' not in col:
             df[col] = df[col].replace(['0', '0,00', '0.00', '0,0', '0.0'], '-')
     
-    print("Formato final aplicado correctamente")
+    log.info("Formato final aplicado correctamente")
     return df
 
-def procesar_cartera(input_path, output_path=None, fecha_cierre_str=None):
+ALINEACION_NUMERO = Alignment(horizontal='right', vertical='center')
+ALINEACION_TEXTO = Alignment(horizontal='center', vertical='center')
+
+def es_numero_celda(valor):
+    """Indica si el valor de una celda se alinea como número (admite separadores y %)"""
+    try:
+        float(str(valor).replace('.','').replace(',','').replace('%',''))
+        return True
+    except (TypeError, ValueError):
+        return False
+
+def celdas_alineadas(hoja, valores, fuente=None):
+    """Celdas de una fila de solo escritura con la alineación de ajustar_alineacion_excel"""
+    celdas = []
+    for valor in valores:
+        celda = WriteOnlyCell(hoja, value=valor)
+        celda.alignment = ALINEACION_NUMERO if valor is not None and es_numero_celda(valor) else ALINEACION_TEXTO
+        if fuente is not None:
+            celda.font = fuente
+        celdas.append(celda)
+    return celdas
+
+def ajustar_alineacion_excel(output_path):
+    """Ajusta la alineación del Excel generado: números a la derecha, texto al centro"""
+    wb = load_workbook(output_path)
+    ws = wb.active
+    
+    for row in ws.iter_rows(min_row=2):  # Saltar encabezados
+        for cell in row:
+            if cell.value is not None and es_numero_celda(cell.value):
+                cell.alignment = ALINEACION_NUMERO
+            else:
+                cell.alignment = ALINEACION_TEXTO
+    
+    # Encabezados al centro
+    for cell in ws[1]:
+        cell.alignment = ALINEACION_TEXTO
+    
+    wb.save(output_path)
+
+def escribir_excel_por_bloques(df, output_path, filas=FILAS_POR_BLOQUE, max_mb=None):
     """
-    Procesa el archivo de cartera según las especificaciones del formato de deuda
+    Aplica el formato final y escribe el Excel por bloques de filas en un libro de solo
+    escritura, con la misma hoja, encabezado y alineación que to_excel más
+    ajustar_alineacion_excel pero sin tener todo el libro en memoria.
+    Pasado el límite de filas de Excel sigue en las hojas Sheet1_1, Sheet1_2, ... y con
+    max_mb en archivos <salida>_parteN.xlsx; si se divide, el primer archivo lleva la hoja
+    TOTALES con los importes de cada parte.
+    Devuelve (DataFrame formateado completo, rutas de los archivos generados).
     """
-    print("=" * 80)
-    print("PROCESADOR DE CARTERA - FORMATO DEUDA")
-    print("=" * 80)
+    salida = abrir_salida_dividida(output_path, max_mb)
+    partes = []
+    for inicio in range(0, len(df), filas):
+        tipado = df.iloc[inicio:inicio + filas]
+        with nivel_temporal(logging.WARNING):
+            bloque = aplicar_formato_final(tipado.copy())
+        columnas = columnas_formato_numerico(bloque)
+        if not partes:
+            iniciar_hoja(salida, 'Sheet1', [str(col) for col in bloque.columns], celdas_alineadas)
+        escribir_filas(salida, bloque, tipado[columnas].apply(convertir_valores_serie))
+        partes.append(bloque)
+    return pd.concat(partes), cerrar_salida_dividida(salida)
+
+# Modo incremental: los registros preparados de la ejecución anterior se guardan en
+# Parquet identificados por un resumen (hash) de sus campos de origen
+VERSION_ESTADO_INCREMENTAL = 1
+COLUMNA_RESUMEN = '_RESUMEN_ORIGEN'
+NOMBRE_ESTADO_INCREMENTAL = 'estado_incremental_cartera.parquet'
+
+def calcular_resumen_filas(df):
+    """Resumen de 64 bits de los campos de origen de cada fila, estable entre ejecuciones"""
+    return pd.util.hash_pandas_object(df.astype(str), index=False).to_numpy()
+
+def cargar_estado_incremental(ruta_estado, huella):
+    """Carga los registros preparados de la ejecución anterior si corresponden a la misma estructura"""
+    ruta_meta = ruta_estado + '.json'
+    if not (os.path.exists(ruta_estado) and os.path.exists(ruta_meta)):
+        log.info("No hay estado incremental previo: se procesarán todos los registros")
+        return None
+    
+    with open(ruta_meta, 'r', encoding='utf-8') as f:
+        meta = json.load(f)
+    if meta.get('version') != VERSION_ESTADO_INCREMENTAL or meta.get('huella') != huella:
+        log.warning("El estado incremental corresponde a otra estructura de archivo; se procesarán todos los registros")
+        return None
+    
+    return pd.read_parquet(ruta_estado)
+
+def guardar_estado_incremental(df_preparado, ruta_estado, huella):
+    """Guarda los registros preparados (uno por resumen) y sus metadatos para la siguiente ejecución"""
+    estado = df_preparado.drop_duplicates(COLUMNA_RESUMEN).copy()
+    estado[COLUMNA_RESUMEN] = estado[COLUMNA_RESUMEN].astype('uint64')
+    
+    # Columnas de texto como cadenas para que el esquema Parquet sea estable
+    for col in estado.columns:
+        if estado[col].dtype == 'object':
+            estado[col] = estado[col].astype('string')
+    
+    directorio = os.path.dirname(ruta_estado)
+    if directorio:
+        os.makedirs(directorio, exist_ok=True)
+    estado.to_parquet(ruta_estado, index=False)
+    with open(ruta_estado + '.json', 'w', encoding='utf-8') as f:
+        json.dump({
+            'version': VERSION_ESTADO_INCREMENTAL,
+            'huella': huella,
+            'registros': len(estado),
+            'fecha': datetime.now().isoformat()
+        }, f, indent=2, ensure_ascii=False)
+
+def preparar_registros_incremental(df, ruta_estado):
+    """
+    Igual que preparar_registros, pero solo limpia, valida y convierte las filas nuevas o
+    modificadas desde la ejecución anterior; las demás se toman del estado guardado.
+    Devuelve el DataFrame preparado (en el orden de entrada) y las estadísticas del delta.
+    """
+    log.info("Preparando registros en modo incremental...")
+    
+    huella = huella_encabezado(df.columns)
+    df[COLUMNA_RESUMEN] = calcular_resumen_filas(df)
+    
+    estado = cargar_estado_incremental(ruta_estado, huella)
+    if estado is None:
+        estado = pd.DataFrame({COLUMNA_RESUMEN: pd.Series(dtype='uint64')})
+    
+    nuevos = ~df[COLUMNA_RESUMEN].isin(estado[COLUMNA_RESUMEN])
+    reutilizados = estado[estado[COLUMNA_RESUMEN].isin(df[COLUMNA_RESUMEN])]
+    
+    partes = [reutilizados]
+    if nuevos.any():
+        partes.append(preparar_registros(df[nuevos].copy()))
+    preparados = pd.concat(partes, ignore_index=True).drop_duplicates(COLUMNA_RESUMEN)
+    
+    # Una fila por fila de origen y en el orden de entrada (las filas descartadas en la limpieza no están)
+    resultado = df[[COLUMNA_RESUMEN]].merge(preparados, on=COLUMNA_RESUMEN, how='inner')
+    
+    guardar_estado_incremental(preparados, ruta_estado, huella)
+    
+    estadisticas = {
+        'registros': len(df),
+        'nuevos_o_modificados': int(nuevos.sum()),
+        'reutilizados': int((~nuevos).sum()),
+        'eliminados': int(len(estado) - len(reutilizados))
+    }
+    log.info(f"Registros nuevos o modificados: {estadisticas['nuevos_o_modificados']}. "
+          f"Reutilizados: {estadisticas['reutilizados']}. Eliminados desde la ejecución anterior: {estadisticas['eliminados']}")
+    
+    return resultado.drop(columns=[COLUMNA_RESUMEN]), estadisticas
+
+def procesar_cartera(input_path, output_path=None, fecha_cierre_str=None, incremental=False, ruta_estado=None,
+                     guardar_historico=True, jobs=None, entrada=None, df_entrada=None, estrategia=None,
+                     fragmentar=None, max_mb=None):
+    """
+    Procesa el archivo de cartera según las especificaciones del formato de deuda.
+    Con incremental, la limpieza, validación y conversión solo se aplican a las facturas
+    nuevas o modificadas desde la ejecución anterior (estado en ruta_estado); el
+    vencimiento se recalcula para todas con la fecha de cierre actual.
+    Con guardar_historico el resultado tipado se anexa al almacén histórico.
+    Con jobs > 1 (0 = todos los núcleos) las etapas de vencimiento se ejecutan en paralelo
+    sobre particiones por EMPRESA/ACTIVIDAD si el archivo es suficientemente grande.
+    Con df_entrada (el archivo ya leído como texto) y entrada (su validación) no se vuelve
+    a leer input_path; el DataFrame recibido no se modifica.
+    estrategia fija la ejecución ('memoria', 'particionado' o 'bloques' por filas para
+    archivos que no caben en memoria); con 'auto' la elige planificador_capacidad y el
+    plan, con su error frente a lo real, se guarda en el resumen. Sin estrategia decide jobs.
+    Con fragmentar ('cobrador' o 'agente') se genera además un libro por cobrador o agente
+    con subtotales por cliente, escritos en paralelo (jobs procesos, por defecto todos).
+    Si el resultado supera el límite de filas de una hoja o max_mb, el Excel se escribe por
+    bloques dividido en hojas Sheet1_1, ... o archivos <salida>_parteN.xlsx con hoja TOTALES.
+    Junto al Excel se guarda el resumen de la ejecución (<salida>_resumen.json).
+    """
+    cronometro = iniciar_cronometro()
+    log.info("=" * 80)
+    log.info("PROCESADOR DE CARTERA - FORMATO DEUDA")
+    log.info("=" * 80)
     
     if fecha_cierre_str:
-        print(f"Fecha de cierre especificada: {fecha_cierre_str}")
+        log.info(f"Fecha de cierre especificada: {fecha_cierre_str}")
     else:
-        print("Usando fecha de cierre por defecto (último día del mes actual)")
+        log.info("Usando fecha de cierre por defecto (último día del mes actual)")
     
     try:
-        # Leer archivo CSV
-        print(f"Leyendo archivo: {input_path}")
-        df = pd.read_csv(input_path, sep=';', encoding='latin1', dtype=str)
-        print(f"Archivo leído correctamente. Registros: {len(df)}")
-        
-        # Procesar datos
-        df = limpiar_y_validar_datos(df)
-        df = unificar_nombres_clientes(df)
-        df = procesar_fechas(df, fecha_cierre_str)
-        df = calcular_dias_vencidos(df, fecha_cierre_str)
-        df = calcular_saldos_y_dotacion(df)
-        df = calcular_vencimientos_historicos(df, fecha_cierre_str)
-        df = calcular_vencimientos_por_rango(df)
-        df = calcular_por_vencer(df, fecha_cierre_str)
-        df = validar_saldos(df)
-        df = crear_deuda_incobrable(df)
-        df = aplicar_formato_final(df)
+        if df_entrada is None:
+            # Validación previa: esquema y tipos a partir del encabezado y una muestra
+            entrada = validar_archivo_entrada(input_path, ['PROVCA', 'CARTERA_NOMBRES'])
+        
+        # Estrategia según los registros, la memoria por registro y los recursos disponibles
+        plan = None
+        jobs_fragmentos = jobs
+        if estrategia == ESTRATEGIA_AUTO:
+            # Importación local: el planificador usa las etapas de este módulo
+            from planificador_capacidad import planificar_ejecucion, cerrar_plan
+            plan = planificar_ejecucion(input_path, entrada['formato'], jobs, df_entrada, fecha_cierre_str)
+            estrategia, jobs = plan['estrategia'], plan['trabajadores']
+            marcar_etapa(cronometro, 'planificacion')
+        elif estrategia == ESTRATEGIA_PARTICIONADO and not jobs:
+            jobs = 0
+        por_bloques = estrategia == ESTRATEGIA_BLOQUES
+        
+        if df_entrada is not None:
+            # Archivo ya validado y leído por quien llama (p. ej. el orquestador de cierre)
+            log.info(f"Usando archivo ya leído: {input_path}")
+            df = df_entrada.copy()
+        elif por_bloques and not incremental and entrada['formato']['tipo'] == 'texto':
+            # Se lee por bloques junto con la preparación: el texto completo nunca está en memoria
+            log.info(f"Leyendo archivo por bloques de {FILAS_POR_BLOQUE} registros: {input_path}")
+            df = None
+        else:
+            # Leer archivo (formato, codificación y separador detectados a partir de la cabecera)
+            log.info(f"Leyendo archivo: {input_path}")
+            df = leer_archivo_tabular(input_path, formato=entrada['formato'])
+        log.info(f"Esquema detectado: {entrada['esquema']}")
+        if df is not None:
+            log.info(f"Archivo leído correctamente. Registros: {len(df)}")
+            registros_leidos = len(df)
+            marcar_etapa(cronometro, 'lectura')
         
         # Definir carpeta de salida
         output_dir = r'C:\wamp64\www\modelo-deuda-python\cartera\resultados'
         os.makedirs(output_dir, exist_ok=True)
         
+        # Limpieza, validación y conversión de tipos (solo el delta en modo incremental)
+        estadisticas_incremental = None
+        if df is None:
+            df, registros_leidos = preparar_registros_por_bloques(
+                leer_archivo_tabular(input_path, formato=entrada['formato'], chunksize=FILAS_POR_BLOQUE)
+            )
+            log.info(f"Archivo leído correctamente. Registros: {registros_leidos}")
+        elif incremental:
+            df, estadisticas_incremental = preparar_registros_incremental(
+                df, ruta_estado or os.path.join(output_dir, NOMBRE_ESTADO_INCREMENTAL)
+            )
+        elif por_bloques:
+            df, _ = preparar_registros_por_bloques(
+                df.iloc[inicio:inicio + FILAS_POR_BLOQUE].copy() for inicio in range(0, len(df), FILAS_POR_BLOQUE)
+            )
+        else:
+            df = preparar_registros(df)
+        marcar_etapa(cronometro, 'preparacion')
+        
+        # Clave canónica de cliente (variantes de nombre e identificación unificadas)
+        resolver_clientes([df])
+        marcar_etapa(cronometro, 'resolucion_clientes')
+        
+        # Vencimiento con la fecha de cierre actual, para todos los registros
+        # (en paralelo por particiones EMPRESA/ACTIVIDAD con --jobs)
+        trabajadores = calcular_trabajadores(jobs)
+        if por_bloques:
+            df, _ = procesar_por_bloques(df, calcular_vencimientos, (fecha_cierre_str,))
+        elif estrategia != ESTRATEGIA_MEMORIA and trabajadores > 1 and len(df) >= MINIMO_REGISTROS_PARALELO:
+            df, _ = procesar_particionado(df, calcular_vencimientos, (fecha_cierre_str,), trabajadores)
+        else:
+            df = calcular_vencimientos(df, fecha_cierre_str)
+        marcar_etapa(cronometro, 'vencimientos')
+        
+        # Resultado tipado (antes del formato colombiano) al almacén histórico
+        if guardar_historico:
+            registrar_corte_historico(df, obtener_fecha_cierre(fecha_cierre_str), 'cartera')
+            marcar_etapa(cronometro, 'historico')
+        
+        df_tipado = df
+        # Más filas de las que admite una hoja o más de max_mb: escritura por bloques dividida
+        escritura_bloques = por_bloques or requiere_division(df, max_mb)
+        if not escritura_bloques:
+            df = aplicar_formato_final(df)
+            marcar_etapa(cronometro, 'formato')
+        
         if not output_path:
             ahora = datetime.now().strftime('%Y-%m-%d_%H-%M-%S')
             output_path = os.path.join(output_dir, f'CARTERA_PROCESADA_{ahora}.xlsx')
         
         # Verificar que el DataFrame no esté vacío
         if df.empty:
-            print("ERROR: El DataFrame está vacío. No se puede generar archivo.")
+            log.error("El DataFrame está vacío. No se puede generar archivo.")
             return None
         
-        # Guardar archivo Excel
-        print(f"Guardando archivo: {output_path}")
-        df.to_excel(output_path, index=False)
+        # Guardar archivo Excel (por bloques: con el formato final y la alineación en la misma pasada)
+        log.info(f"Guardando archivo: {output_path}")
+        partes = [output_path]
+        if escritura_bloques:
+            df, partes = escribir_excel_por_bloques(df_tipado, output_path, max_mb=max_mb)
+        else:
+            df.to_excel(output_path, index=False)
         
         # Verificar que el archivo se creó correctamente
         if not os.path.exists(output_path):
-            print("ERROR: No se pudo crear el archivo Excel.")
+            log.error("No se pudo crear el archivo Excel.")
             return None
         
         if os.path.getsize(output_path) == 0:
-            print("ERROR: El archivo Excel está vacío.")
+            log.error("El archivo Excel está vacío.")
             os.remove(output_path)
             return None
         
         # Ajustar formato de Excel
         try:
-            from openpyxl import load_workbook
-            from openpyxl.styles import Alignment
-            wb = load_workbook(output_path)
-            ws = wb.active
-            
-            # Ajustar alineación: números a la derecha, texto al centro
-            for row in ws.iter_rows(min_row=2):  # Saltar encabezados
-                for cell in row:
-                    valor = cell.value
-                    if valor is None:
-                        cell.alignment = Alignment(horizontal='center', vertical='center')
-                    else:
-                        try:
-                            # Si es número
-                            float(str(valor).replace('.','').replace(',','').replace('%',''))
-                            cell.alignment = Alignment(horizontal='right', vertical='center')
-                        except:
-                            cell.alignment = Alignment(horizontal='center', vertical='center')
-            
-            # Encabezados al centro
-            for cell in ws[1]:
-                cell.alignment = Alignment(horizontal='center', vertical='center')
-            
-            wb.save(output_path)
-            print("Formato de Excel ajustado correctamente")
+            if not escritura_bloques:
+                ajustar_alineacion_excel(output_path)
+            log.info("Formato de Excel ajustado correctamente")
+        except Exception as e:
+            log.warning(f"No se pudo ajustar el formato de Excel: {e}")
+        marcar_etapa(cronometro, 'escritura')
+        
+        # Copia columnar e índices por cliente, agente y cobrador para consultas
+        directorio_consulta = None
+        try:
+            directorio_consulta = generar_consulta(df, output_path)
         except Exception as e:
-            print(f"Advertencia: No se pudo ajustar el formato de Excel: {e}")
+            log.warning(f"No se pudo generar el índice de consulta: {e}")
+        marcar_etapa(cronometro, 'consulta')
+        
+        # Un libro por cobrador o agente para los equipos de campo, con totales sobre los
+        # importes numéricos (importación local: salida_fragmentada usa la alineación de este módulo)
+        indice_fragmentos = None
+        if fragmentar:
+            from salida_fragmentada import generar_fragmentos
+            try:
+                importes = df_tipado[columnas_formato_numerico(df)].apply(convertir_valores_serie)
+                indice_fragmentos = generar_fragmentos(df, importes, output_path, fragmentar, jobs_fragmentos)
+            except Exception as e:
+                log.warning(f"No se pudieron generar los libros por {fragmentar}: {e}")
+            marcar_etapa(cronometro, 'fragmentos')
+        
+        # Cubo de vencimientos con subtotales para el dashboard
+        # (importación local: cubo_vencimientos usa los rangos de este módulo)
+        from cubo_vencimientos import generar_cubo
+        archivo_cubo = generar_cubo(df_tipado, output_path)
+        marcar_etapa(cronometro, 'cubo')
+        
+        # Estimación del planificador frente a los registros y la memoria reales
+        if plan is not None:
+            cerrar_plan(plan, registros_leidos)
+        
+        # Resumen estructurado de la ejecución para las páginas PHP
+        generar_resumen('cartera', df_tipado, output_path, {
+            'entrada': input_path,
+            'excel': output_path,
+            'partes': partes if len(partes) > 1 else None,
+            'consulta': directorio_consulta,
+            'cubo': archivo_cubo,
+            'fragmentos': indice_fragmentos
+        }, cronometro, obtener_fecha_cierre(fecha_cierre_str), esquema=entrada['esquema'],
+            registros_leidos=registros_leidos, registros_descartados=registros_leidos - len(df_tipado),
+            incremental=estadisticas_incremental, planificacion=plan)
         
         # Resumen final
-        print("\n" + "=" * 80)
-        print("PROCESAMIENTO COMPLETADO EXITOSAMENTE")
-        print("=" * 80)
-        print(f"Archivo procesado: {input_path}")
-        print(f"Archivo generado: {output_path}")
-        print(f"Registros procesados: {len(df)}")
-        print(f"Columnas generadas: {len(df.columns)}")
+        log.info("\n" + "=" * 80)
+        log.info("PROCESAMIENTO COMPLETADO EXITOSAMENTE")
+        log.info("=" * 80)
+        log.info(f"Archivo procesado: {input_path}")
+        log.info(f"Archivo generado: {output_path}")
+        for parte in partes[1:]:
+            log.info(f"Parte adicional generada: {parte}")
+        log.info(f"Registros procesados: {len(df)}")
+        log.info(f"Columnas generadas: {len(df.columns)}")
         
         # Mostrar columnas principales
         columnas_principales = [
@@ -537,24 +821,61 @@ def procesar_cartera(input_path, output_path=None, fecha_cierre_str=None):
             'NUMERO FACTURA', 'FECHA VTO', 'SALDO', 'DIAS VENCIDO',
             '% Dotación', '  Valor Dotación  ', 'Mora Total', 'Valor Total Por Vencer'
         ]
-        print(f"\nColumnas principales: {[col for col in columnas_principales if col in df.columns]}")
+        log.info(f"\nColumnas principales: {[col for col in columnas_principales if col in df.columns]}")
         
         return output_path
         
     except Exception as e:
-        print(f"ERROR durante el procesamiento: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        log.exception(f"Falló el procesamiento: {str(e)}")
         return None
 
 if __name__ == "__main__":
-    if len(sys.argv) > 1:
-        input_file = sys.argv[1]
-        fecha_cierre = sys.argv[2] if len(sys.argv) > 2 else None
-        output_file = sys.argv[3] if len(sys.argv) > 3 else None
-        procesar_cartera(input_file, output_file, fecha_cierre)
+    incremental, argumentos = extraer_opcion(sys.argv[1:], '--incremental', es_bandera=True)
+    ruta_estado, argumentos = extraer_opcion(argumentos, '--estado')
+    sin_historico, argumentos = extraer_opcion(argumentos, '--sin-historico', es_bandera=True)
+    jobs, argumentos = extraer_opcion(argumentos, '--jobs')
+    # Ejecución en memoria, particionada o por bloques (auto: según el planificador de capacidad)
+    estrategia, argumentos = extraer_opcion(argumentos, '--estrategia', ESTRATEGIA_AUTO)
+    # Vista previa sobre una muestra estratificada (JSON por la salida estándar, sin generar Excel)
+    previa, argumentos = extraer_opcion(argumentos, '--vista-previa', es_bandera=True)
+    # Modo silencioso: la única salida estándar es el resultado final en JSON
+    silencioso, argumentos = extraer_opcion(argumentos, '--silencioso', es_bandera=True)
+    quiet, argumentos = extraer_opcion(argumentos, '--quiet', es_bandera=True)
+    nivel_log, argumentos = extraer_opcion(argumentos, '--nivel-log', 'INFO')
+    # Un libro por cobrador o agente además del Excel completo
+    fragmentar, argumentos = extraer_opcion(argumentos, '--fragmentar')
+    # Tamaño máximo de cada archivo generado (MB); el resto pasa a <salida>_parteN.xlsx
+    max_mb, argumentos = extraer_opcion(argumentos, '--max-mb')
+    silencioso = silencioso or quiet
+    
+    if estrategia not in ESTRATEGIAS:
+        print(f"ERROR: Estrategia no válida '{estrategia}' (opciones: {', '.join(ESTRATEGIAS)})")
+        sys.exit(1)
+    if fragmentar and fragmentar not in ('cobrador', 'agente'):
+        print(f"ERROR: Fragmentación no válida '{fragmentar}' (opciones: cobrador, agente)")
+        sys.exit(1)
+    
+    if len(argumentos) > 0:
+        input_file = argumentos[0]
+        fecha_cierre = argumentos[1] if len(argumentos) > 1 else None
+        output_file = argumentos[2] if len(argumentos) > 2 else None
+        if previa:
+            # Importación local: vista_previa usa las etapas de este módulo
+            from vista_previa import vista_previa
+            print(json.dumps(vista_previa(input_file, fecha_cierre), indent=2, ensure_ascii=False, default=str))
+            sys.exit(0)
+        ruta_log = configurar_bitacora('cartera', silencioso, nivel_log)
+        with salida_silenciosa(silencioso):
+            salida = procesar_cartera(input_file, output_file, fecha_cierre, incremental, ruta_estado,
+                                      not sin_historico, jobs, estrategia=estrategia, fragmentar=fragmentar,
+                                      max_mb=float(max_mb) if max_mb else None)
+        registrar_resumen_errores(log)
+        if silencioso:
+            emitir_resultado({'success': salida is not None, 'archivo_generado': salida,
+                              'errores_conversion': resumen_errores(), 'log': ruta_log})
+        sys.exit(0 if salida else 1)
     else:
-        print("Uso: python procesador_cartera.py <ruta_entrada_csv> [<fecha_cierre_YYYY-MM-DD>] [<ruta_salida_excel>]")
+        print("Uso: python procesador_cartera.py <ruta_entrada_csv> [<fecha_cierre_YYYY-MM-DD>] [<ruta_salida_excel>] [--incremental] [--estado RUTA_ESTADO] [--sin-historico] [--jobs N] [--estrategia auto|memoria|particionado|bloques] [--fragmentar cobrador|agente] [--max-mb MB] [--vista-previa] [--silencioso] [--nivel-log NIVEL]")
 
 def procesar_archivo():
     return None
\ No newline at end of file
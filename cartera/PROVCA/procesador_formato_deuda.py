@@ -12,7 +12,7 @@ situación y focus, aplicando todas las transformaciones y cálculos especificad
 PROCESO:
 1. Procesar archivo de provisión (PROVCA)
 2. Procesar archivo de anticipos (ANTICI)
-3. Crear modelo de deuda con hojas de pesos y divisas
+3. Crear modelo de deuda con hojas de pesos y divisas y compensar anticipos por cliente
 4. Procesar archivos de balance, situación y focus
 5. Generar formato de deuda final
 """
@@ -22,10 +22,26 @@ import numpy as np
 from datetime import datetime, date
 import os
 import sys
-import json
 import warnings
+from concurrent.futures import ProcessPoolExecutor
 warnings.filterwarnings('ignore')
 
+from utilidades_cartera import serializar_dataframe, deserializar_dataframe, extraer_opcion, calcular_trabajadores
+from utilidades_cartera import leer_archivo_tabular
+from utilidades_cartera import convertir_fechas_serie
+from registro_esquemas import validar_archivo_entrada
+from procesador_anticipos import MAPEO_ANTICIPOS_ANTICI, alinear_anticipos_antici
+from escritura_excel import (abrir_salida_dividida, escribir_dataframe_dividido, copiar_hoja_streaming,
+                             cerrar_salida_dividida)
+from compensacion_anticipos import compensar_anticipos
+from almacen_historico import registrar_corte_historico
+from cubo_vencimientos import generar_cubo
+from resumen_ejecucion import iniciar_cronometro, marcar_etapa, construir_resumen, guardar_resumen
+from resolucion_clientes import resolver_clientes, COLUMNA_CLAVE, COLUMNA_CANONICO
+from puntos_control import CARPETA_PUNTOS_CONTROL, iniciar_puntos_control, recuperar_etapa, registrar_etapa
+from bitacora import (obtener_logger, configurar_bitacora, salida_silenciosa, registrar_resumen_errores,
+                      resumen_errores, emitir_resultado)
+
 # Importar utilidades
 try:
     from utilidades_cartera import convertir_fecha, convertir_valor, aplicar_formato_colombiano_dataframe
@@ -58,6 +74,8 @@ except ImportError:
     def aplicar_formato_colombiano_dataframe(df, columnas_numericas=None):
         return df
 
+log = obtener_logger('procesador_formato_deuda')
+
 # Mapeo oficial de columnas para provisión
 MAPEO_PROVISION = {
     'PCCDEM': 'EMPRESA',
@@ -82,24 +100,8 @@ MAPEO_PROVISION = {
     'PCSALD': 'SALDO'
 }
 
-# Mapeo oficial de columnas para anticipos
-MAPEO_ANTICIPOS = {
-    'NCCDEM': 'EMPRESA',
-    'NCCDAC': 'ACTIVIDAD',
-    'NCCDCL': 'CODIGO CLIENTE',
-    'WWNIT': 'NIT/CEDULA',
-    'WWNMCL': 'NOMBRE COMERCIAL',
-    'WWNMDO': 'DIRECCION',
-    'WWTLF1': 'TELEFONO',
-    'WWNMPO': 'POBLACION',
-    'CCCDFB': 'CODIGO AGENTE',
-    'BDNMNM': 'NOMBRE AGENTE',
-    'BDNMPA': 'APELLIDO AGENTE',
-    'NCMOMO': 'TIPO ANTICIPO',
-    'NCCDR3': 'NRO ANTICIPO',
-    'NCIMAN': 'VALOR ANTICIPO',
-    'NCFEGR': 'FECHA ANTICIPO'
-}
+# Mapeo oficial de columnas para anticipos (exportación ANTICI)
+MAPEO_ANTICIPOS = MAPEO_ANTICIPOS_ANTICI
 
 # Tabla de códigos de negocio-canal
 TABLA_NEGOCIO_CANAL = {
@@ -147,16 +149,24 @@ def obtener_fecha_cierre(fecha_cierre_str=None):
     ultimo_dia_mes_anterior = primer_dia_mes - pd.Timedelta(days=1)
     return datetime.combine(ultimo_dia_mes_anterior, datetime.min.time())
 
-def procesar_archivo_provision(ruta_archivo, fecha_cierre_str=None):
-    """Procesa el archivo de provisión según las especificaciones"""
-    print("Procesando archivo de provisión...")
-    
-    # Leer archivo
-    df = pd.read_csv(ruta_archivo, encoding='latin1')
+def procesar_archivo_provision(ruta_archivo, fecha_cierre_str=None, formatear=True, df=None):
+    """
+    Procesa el archivo de provisión según las especificaciones.
+    Con formatear=False devuelve los valores numéricos sin formato colombiano, para
+    compensar y agregar sobre números y formatear solo al escribir la salida.
+    Con df (el archivo ya leído, con tipos inferidos) no se vuelve a leer ruta_archivo.
+    """
+    log.info("Procesando archivo de provisión...")
+    
+    # Leer archivo (formato, codificación y separador detectados antes de leer)
+    df = leer_archivo_tabular(ruta_archivo, dtype=None) if df is None else df.copy()
     
     # Renombrar columnas
     df = df.rename(columns=MAPEO_PROVISION)
     
+    # PCCDEM y PCDEAC se mapean ambas a EMPRESA: conservar solo la primera (código de empresa)
+    df = df.loc[:, ~df.columns.duplicated()]
+    
     # Eliminar columna PCIMCO si existe
     if 'PCIMCO' in df.columns:
         df = df.drop('PCIMCO', axis=1)
@@ -167,9 +177,8 @@ def procesar_archivo_provision(ruta_archivo, fecha_cierre_str=None):
     # Unificar nombres de clientes
     df['DENOMINACION COMERCIAL'] = df['DENOMINACION COMERCIAL'].fillna('')
     df['NOMBRE'] = df['NOMBRE'].fillna('')
-    df['DENOMINACION COMERCIAL'] = df.apply(
-        lambda row: row['NOMBRE'] if row['DENOMINACION COMERCIAL'] == '' else row['DENOMINACION COMERCIAL'], 
-        axis=1
+    df['DENOMINACION COMERCIAL'] = df['DENOMINACION COMERCIAL'].where(
+        df['DENOMINACION COMERCIAL'] != '', df['NOMBRE']
     )
     
     # Procesar fechas
@@ -272,51 +281,40 @@ def procesar_archivo_provision(ruta_archivo, fecha_cierre_str=None):
     df['DEUDA_INCOBRABLE'] = df['VALOR_DOTACION']
     
     # Aplicar formato colombiano
-    df = aplicar_formato_colombiano_dataframe(df)
+    if formatear:
+        df = aplicar_formato_colombiano_dataframe(df)
     
     return df
 
-def procesar_archivo_anticipos(ruta_archivo, fecha_cierre_str=None):
-    """Procesa el archivo de anticipos según las especificaciones"""
-    print("Procesando archivo de anticipos...")
+def procesar_archivo_anticipos(ruta_archivo, fecha_cierre_str=None, formatear=True, df=None):
+    """Procesa el archivo de anticipos según las especificaciones (formatear y df como en provisión)"""
+    log.info("Procesando archivo de anticipos...")
     
-    # Leer archivo
-    df = pd.read_csv(ruta_archivo, encoding='latin1')
+    # Leer archivo (formato, codificación y separador detectados antes de leer)
+    df = leer_archivo_tabular(ruta_archivo, dtype=None) if df is None else df.copy()
     
-    # Renombrar columnas
-    df = df.rename(columns=MAPEO_ANTICIPOS)
-    
-    # Multiplicar valor de anticipo por -1 (deben ser negativos)
-    df['VALOR ANTICIPO'] = df['VALOR ANTICIPO'] * -1
+    # Renombrar columnas, invertir el signo del anticipo y crear las columnas
+    # compatibles con provisión (mismo camino que procesador_anticipos)
+    df = alinear_anticipos_antici(df)
     
     # Procesar fechas
-    df['FECHA_ANTICIPO_FORMATO'] = df['FECHA ANTICIPO'].apply(lambda x: convertir_fecha(x)[0])
-    
-    # Crear columnas compatibles con provisión
-    df['EMPRESA'] = df['EMPRESA'].fillna('')
-    df['ACTIVIDAD'] = df['ACTIVIDAD'].fillna('')
-    df['CODIGO_CLIENTE'] = df['CODIGO CLIENTE'].fillna('')
-    df['IDENTIFICACION'] = df['NIT/CEDULA'].fillna('')
-    df['NOMBRE'] = df['NOMBRE COMERCIAL'].fillna('')
-    df['DENOMINACION_COMERCIAL'] = df['NOMBRE COMERCIAL'].fillna('')
-    df['DIRECCION'] = df['DIRECCION'].fillna('')
-    df['TELEFONO'] = df['TELEFONO'].fillna('')
-    df['CIUDAD'] = df['POBLACION'].fillna('')
-    df['NUMERO_FACTURA'] = df['NRO ANTICIPO'].fillna('')
-    df['TIPO'] = df['TIPO ANTICIPO'].fillna('')
-    df['FECHA'] = df['FECHA ANTICIPO']
-    df['FECHA_VTO'] = df['FECHA ANTICIPO']  # Para anticipos, fecha de vencimiento = fecha de anticipo
-    df['VALOR'] = df['VALOR ANTICIPO']
-    df['SALDO'] = df['VALOR ANTICIPO']
+    df['FECHA_ANTICIPO_FORMATO'] = convertir_fechas_serie(df['FECHA ANTICIPO']).dt.strftime('%d-%m-%Y').fillna('')
     
     # Aplicar formato colombiano
-    df = aplicar_formato_colombiano_dataframe(df)
+    if formatear:
+        df = aplicar_formato_colombiano_dataframe(df)
     
     return df
 
 def crear_modelo_deuda(df_provision, df_anticipos, fecha_cierre_str=None):
-    """Crea el modelo de deuda con hojas de pesos y divisas"""
-    print("Creando modelo de deuda...")
+    """
+    Crea el modelo de deuda con hojas de pesos y divisas. Provisión y anticipos se
+    resuelven juntos para que un mismo cliente tenga la misma CLAVE CLIENTE en ambos.
+    """
+    log.info("Creando modelo de deuda...")
+    
+    # Clave canónica de cliente común a provisión y anticipos (columnas añadidas en ambos)
+    resolver_clientes([df_provision, df_anticipos])
     
     # Filtrar líneas en pesos (ACTIVIDAD != 11, 18, 41, 57)
     df_pesos = df_provision[~df_provision['ACTIVIDAD'].isin([11, 18, 41, 57])].copy()
@@ -331,21 +329,57 @@ def crear_modelo_deuda(df_provision, df_anticipos, fecha_cierre_str=None):
     # Crear hoja de vencimientos
     df_vencimientos = crear_hoja_vencimientos(df_pesos, df_divisas)
     
+    # Compensar anticipos contra facturas abiertas por cliente (más antiguas primero)
+    compensacion = compensar_anticipos(df_provision, df_anticipos, obtener_fecha_cierre(fecha_cierre_str))
+    
     return {
         'pesos': df_pesos,
         'divisas': df_divisas,
-        'vencimientos': df_vencimientos
+        'vencimientos': df_vencimientos,
+        'compensacion': compensacion['neto_clientes'],
+        'anticipos_no_aplicados': compensacion['anticipos_no_aplicados']
+    }
+
+def crear_modelo_deuda_etapa(puntos, df_provision, df_anticipos, fecha_cierre_str=None):
+    """
+    Modelo de deuda desde su punto de control o calculado con crear_modelo_deuda. El punto
+    incluye provisión y anticipos con la clave de cliente ya resuelta, que son los que
+    usan las etapas siguientes. Devuelve (modelo_deuda, df_provision, df_anticipos).
+    """
+    modelo = recuperar_etapa(puntos, 'modelo', dependencias=['provision', 'anticipos'])
+    if modelo is None:
+        modelo_deuda = crear_modelo_deuda(df_provision, df_anticipos, fecha_cierre_str)
+        registrar_etapa(puntos, 'modelo', {**modelo_deuda, 'provision': df_provision, 'anticipos': df_anticipos})
+        return modelo_deuda, df_provision, df_anticipos
+    df_provision = modelo.pop('provision')
+    df_anticipos = modelo.pop('anticipos')
+    return modelo, df_provision, df_anticipos
+
+def formatear_modelo_deuda(modelo_deuda):
+    """Aplica el formato colombiano a todas las hojas del modelo de deuda antes de escribirlas"""
+    return {hoja: aplicar_formato_colombiano_dataframe(df) for hoja, df in modelo_deuda.items()}
+
+# Columnas numéricas que no son importes (no se suman en la hoja TOTALES de una salida dividida)
+PREFIJOS_SIN_TOTAL = ('CODIGO', 'DIA', 'MES_', 'AÑO_', '%', 'VALIDACION')
+
+def importes_modelo_deuda(modelo_deuda):
+    """Columnas de importe de cada hoja del modelo de deuda, sin formato, para la hoja TOTALES"""
+    return {
+        hoja: df[[col for col in df.select_dtypes(include='float').columns
+                  if not str(col).startswith(PREFIJOS_SIN_TOTAL)]]
+        for hoja, df in modelo_deuda.items()
     }
 
 def crear_hoja_vencimientos(df_pesos, df_divisas):
     """Crea la hoja de vencimientos con totales por línea"""
-    print("Creando hoja de vencimientos...")
+    log.info("Creando hoja de vencimientos...")
     
     # Combinar datos de pesos y divisas
     df_combinado = pd.concat([df_pesos, df_divisas], ignore_index=True)
     
-    # Agrupar por cliente y calcular totales
-    df_vencimientos = df_combinado.groupby(['DENOMINACION COMERCIAL', 'ACTIVIDAD']).agg({
+    # Agrupar por cliente y calcular totales: por la clave canónica si los clientes están
+    # resueltos (el nombre es el canónico del grupo), si no por el nombre
+    agregados = {
         'SALDO': 'sum',
         'SALDO_NO_VENCIDO': 'sum',
         'VENCIDO_30': 'sum',
@@ -355,7 +389,13 @@ def crear_hoja_vencimientos(df_pesos, df_divisas):
         'VENCIDO_360': 'sum',
         'VENCIDO_+360': 'sum',
         'DEUDA_INCOBRABLE': 'sum'
-    }).reset_index()
+    }
+    if COLUMNA_CLAVE in df_combinado.columns:
+        df_vencimientos = df_combinado.groupby([COLUMNA_CLAVE, 'ACTIVIDAD']).agg(
+            {COLUMNA_CANONICO: 'first', **agregados}
+        ).reset_index().rename(columns={COLUMNA_CANONICO: 'DENOMINACION COMERCIAL'})
+    else:
+        df_vencimientos = df_combinado.groupby(['DENOMINACION COMERCIAL', 'ACTIVIDAD']).agg(agregados).reset_index()
     
     # Agregar información de negocio-canal
     df_vencimientos['CODIGO_NEGOCIO'] = df_vencimientos['ACTIVIDAD'].apply(
@@ -364,68 +404,146 @@ def crear_hoja_vencimientos(df_pesos, df_divisas):
     
     return df_vencimientos
 
-def procesar_archivos_adicionales(ruta_balance, ruta_situacion, ruta_focus):
-    """Procesa los archivos adicionales (balance, situación, focus)"""
-    print("Procesando archivos adicionales...")
+# Cuentas del archivo BALANCE que se incluyen en el formato de deuda
+CUENTAS_BALANCE_FORMATO = ['0080.43002.20', '0080.43002.21', '0080.43002.15', 
+                           '0080.43002.28', '0080.43002.31', '0080.43002.63']
+COLUMNA_CUENTA_BALANCE = 'Número cuenta'
+
+# Nombre de la hoja de salida para cada archivo adicional
+HOJAS_ADICIONALES = {
+    'balance': 'BALANCE',
+    'situacion': 'SITUACION',
+    'focus': 'FOCUS'
+}
+
+def leer_balance_adicional(ruta_balance):
+    """Lee el archivo BALANCE y conserva solo las cuentas del formato de deuda"""
+    df_balance = pd.read_excel(ruta_balance)
+    return df_balance[df_balance[COLUMNA_CUENTA_BALANCE].isin(CUENTAS_BALANCE_FORMATO)]
+
+def leer_situacion_adicional(ruta_situacion):
+    """Lee el archivo SITUACIÓN"""
+    # Extraer valor TOTAL 01010 Columna SALDOS MES
+    return pd.read_excel(ruta_situacion)
+
+def leer_focus_adicional(ruta_focus):
+    """Lee el archivo FOCUS"""
+    return pd.read_excel(ruta_focus)
+
+# Lectores de archivos adicionales por clave de resultado
+LECTORES_ADICIONALES = {
+    'balance': leer_balance_adicional,
+    'situacion': leer_situacion_adicional,
+    'focus': leer_focus_adicional
+}
+
+def describir_origen_adicional(clave, ruta):
+    """
+    Describe una hoja de paso: el archivo origen se copiará fila a fila en la salida
+    sin cargarlo en pandas. Del BALANCE solo se copian las cuentas del formato de deuda.
+    """
+    origen = {'ruta_origen': ruta}
+    if clave == 'balance':
+        origen['columna_filtro'] = COLUMNA_CUENTA_BALANCE
+        origen['valores_filtro'] = CUENTAS_BALANCE_FORMATO
+    return origen
+
+def procesar_archivos_adicionales(ruta_balance, ruta_situacion, ruta_focus, copia_directa=True):
+    """
+    Procesa los archivos adicionales (balance, situación, focus).
+    Con copia_directa devuelve la descripción de cada origen para copiarlo en streaming
+    al generar el formato final; si no, devuelve los DataFrames leídos con pandas.
+    """
+    log.info("Procesando archivos adicionales...")
     
     resultados = {}
+    rutas = {'balance': ruta_balance, 'situacion': ruta_situacion, 'focus': ruta_focus}
     
-    # Procesar archivo balance
-    if ruta_balance and os.path.exists(ruta_balance):
-        df_balance = pd.read_excel(ruta_balance)
-        # Extraer cuentas específicas según especificaciones
-        cuentas_balance = ['0080.43002.20', '0080.43002.21', '0080.43002.15', 
-                          '0080.43002.28', '0080.43002.31', '0080.43002.63']
-        df_balance_filtrado = df_balance[df_balance['Número cuenta'].isin(cuentas_balance)]
-        resultados['balance'] = df_balance_filtrado
-    
-    # Procesar archivo situación
-    if ruta_situacion and os.path.exists(ruta_situacion):
-        df_situacion = pd.read_excel(ruta_situacion)
-        # Extraer valor TOTAL 01010 Columna SALDOS MES
-        resultados['situacion'] = df_situacion
-    
-    # Procesar archivo focus
-    if ruta_focus and os.path.exists(ruta_focus):
-        df_focus = pd.read_excel(ruta_focus)
-        resultados['focus'] = df_focus
+    for clave, ruta in rutas.items():
+        if ruta and os.path.exists(ruta):
+            if copia_directa:
+                resultados[clave] = describir_origen_adicional(clave, ruta)
+            else:
+                resultados[clave] = LECTORES_ADICIONALES[clave](ruta)
     
     return resultados
 
-def generar_formato_deuda_final(modelo_deuda, archivos_adicionales, output_path=None):
-    """Genera el formato de deuda final en Excel"""
-    print("Generando formato de deuda final...")
+def _ejecutar_etapa_serializada(funcion, *args):
+    """Ejecuta una etapa de lectura en un proceso trabajador y devuelve el DataFrame serializado"""
+    return serializar_dataframe(funcion(*args))
+
+def lanzar_etapas_entrada(executor, archivo_provision, archivo_anticipos, archivo_balance=None,
+                          archivo_situacion=None, archivo_focus=None, fecha_cierre_str=None,
+                          copia_directa=True, omitir=()):
+    """
+    Lanza en paralelo las etapas de entrada independientes (provisión, anticipos y
+    archivos adicionales). Devuelve un diccionario clave -> futuro con el DataFrame serializado.
+    Con copia_directa los archivos adicionales no se leen aquí: se copian al escribir la salida.
+    Las etapas de omitir (ya recuperadas de su punto de control) no se lanzan.
+    """
+    etapas = {'provision': (procesar_archivo_provision, archivo_provision),
+              'anticipos': (procesar_archivo_anticipos, archivo_anticipos)}
+    futuros = {
+        clave: executor.submit(_ejecutar_etapa_serializada, funcion, ruta, fecha_cierre_str, False)
+        for clave, (funcion, ruta) in etapas.items() if clave not in omitir
+    }
+    if copia_directa:
+        return futuros
+    rutas = {'balance': archivo_balance, 'situacion': archivo_situacion, 'focus': archivo_focus}
+    for clave, ruta in rutas.items():
+        if ruta and os.path.exists(ruta):
+            futuros[clave] = executor.submit(_ejecutar_etapa_serializada,
+                                             LECTORES_ADICIONALES[clave], ruta)
+    return futuros
+
+def generar_formato_deuda_final(modelo_deuda, archivos_adicionales, output_path=None, max_mb=None,
+                                importes=None):
+    """
+    Genera el formato de deuda final en Excel.
+    El libro se escribe en modo de solo escritura; las hojas adicionales descritas por
+    su origen se copian fila a fila desde el libro fuente sin pasar por pandas.
+    Una hoja con más filas de las que admite Excel continúa en PESOS_1, PESOS_2, ... y con
+    max_mb las filas siguientes pasan a archivos <salida>_parteN.xlsx; importes (por hoja
+    del modelo, sin formato) son los valores de la hoja TOTALES que se añade en ese caso.
+    Devuelve las rutas generadas (la primera es output_path).
+    """
+    log.info("Generando formato de deuda final...")
     
     if output_path is None:
         timestamp = datetime.now().strftime('%Y-%m-%d_%H-%M-%S')
         output_path = f'../resultados/FORMATO_DEUDA_{timestamp}.xlsx'
     
-    # Crear directorio si no existe
-    os.makedirs(os.path.dirname(output_path), exist_ok=True)
-    
-    # Crear archivo Excel con múltiples hojas
-    with pd.ExcelWriter(output_path, engine='openpyxl') as writer:
-        # Hoja de pesos
-        modelo_deuda['pesos'].to_excel(writer, sheet_name='PESOS', index=False)
-        
-        # Hoja de divisas
-        modelo_deuda['divisas'].to_excel(writer, sheet_name='DIVISAS', index=False)
-        
-        # Hoja de vencimientos
-        modelo_deuda['vencimientos'].to_excel(writer, sheet_name='VENCIMIENTOS', index=False)
-        
-        # Hojas de archivos adicionales
-        if 'balance' in archivos_adicionales:
-            archivos_adicionales['balance'].to_excel(writer, sheet_name='BALANCE', index=False)
-        
-        if 'situacion' in archivos_adicionales:
-            archivos_adicionales['situacion'].to_excel(writer, sheet_name='SITUACION', index=False)
-        
-        if 'focus' in archivos_adicionales:
-            archivos_adicionales['focus'].to_excel(writer, sheet_name='FOCUS', index=False)
-    
-    print(f"Formato de deuda generado: {output_path}")
-    return output_path
+    # Crear archivo Excel con múltiples hojas (divididas en hojas o archivos si no caben)
+    salida = abrir_salida_dividida(output_path, max_mb)
+    importes = importes or {}
+    
+    # Hojas del modelo de deuda
+    escribir_dataframe_dividido(salida, 'PESOS', modelo_deuda['pesos'], importes.get('pesos'))
+    escribir_dataframe_dividido(salida, 'DIVISAS', modelo_deuda['divisas'], importes.get('divisas'))
+    escribir_dataframe_dividido(salida, 'VENCIMIENTOS', modelo_deuda['vencimientos'], importes.get('vencimientos'))
+    if 'compensacion' in modelo_deuda:
+        escribir_dataframe_dividido(salida, 'COMPENSACION', modelo_deuda['compensacion'],
+                                    importes.get('compensacion'))
+        escribir_dataframe_dividido(salida, 'ANTICIPOS NO APLICADOS', modelo_deuda['anticipos_no_aplicados'],
+                                    importes.get('anticipos_no_aplicados'))
+    
+    # Hojas de archivos adicionales
+    for clave, nombre_hoja in HOJAS_ADICIONALES.items():
+        if clave not in archivos_adicionales:
+            continue
+        adicional = archivos_adicionales[clave]
+        if isinstance(adicional, pd.DataFrame):
+            escribir_dataframe_dividido(salida, nombre_hoja, adicional)
+        else:
+            filas = copiar_hoja_streaming(salida=salida, nombre_hoja=nombre_hoja, **adicional)
+            log.info(f"Hoja {nombre_hoja} copiada desde el origen: {filas} filas")
+    
+    rutas = cerrar_salida_dividida(salida)
+    
+    log.info(f"Formato de deuda generado: {output_path}")
+    for ruta in rutas[1:]:
+        log.info(f"Parte adicional generada: {ruta}")
+    return rutas
 
 def procesar_formato_deuda_completo(
     archivo_provision, 
@@ -434,77 +552,199 @@ def procesar_formato_deuda_completo(
     archivo_situacion=None, 
     archivo_focus=None,
     fecha_cierre_str=None,
-    output_path=None
+    output_path=None,
+    jobs=None,
+    copia_directa=True,
+    guardar_historico=True,
+    entradas=None,
+    reanudar=False,
+    max_mb=None
 ):
-    """Procesa el formato de deuda completo"""
-    print("INICIANDO PROCESAMIENTO DE FORMATO DEUDA COMPLETO")
-    print("="*80)
+    """
+    Procesa el formato de deuda completo.
+    Las etapas de entrada (provisión, anticipos, balance, situación y focus) son
+    independientes y se ejecutan en paralelo en un pool de procesos limitado por jobs;
+    solo el modelo de deuda y la escritura final esperan sus resultados.
+    Con copia_directa las hojas de balance, situación y focus se copian en streaming
+    desde los libros origen en lugar de leerlas con pandas.
+    Con guardar_historico la provisión tipada se anexa al almacén histórico.
+    El resumen JSON incluye los agregados de la provisión y los tiempos de cada etapa.
+    Con entradas ({'provision': df, 'anticipos': df}, ya validados y leídos con tipos
+    inferidos) los archivos de provisión y anticipos no se vuelven a leer.
+    Provisión, anticipos y modelo de deuda se guardan como puntos de control junto a la
+    salida; con reanudar se recuperan las etapas cuyo punto sigue siendo válido.
+    Con max_mb el Excel se divide en archivos de a lo sumo ese tamaño (estimado).
+    """
+    cronometro = iniciar_cronometro()
+    log.info("INICIANDO PROCESAMIENTO DE FORMATO DEUDA COMPLETO")
+    log.info("="*80)
     
     try:
-        # 1. Procesar archivo de provisión
-        df_provision = procesar_archivo_provision(archivo_provision, fecha_cierre_str)
+        # Validación previa de esquemas antes de lanzar el procesamiento
+        if entradas is None:
+            validar_archivo_entrada(archivo_provision, ['PROVCA'])
+            validar_archivo_entrada(archivo_anticipos, ['ANTICI'])
+            # Sin --jobs, un proceso por etapa de entrada (provisión, anticipos, balance,
+            # situación y focus) según los núcleos disponibles
+            trabajadores = calcular_trabajadores(jobs, por_defecto=min(5, os.cpu_count() or 1))
+        else:
+            entradas = {'provision': None, 'anticipos': None, **entradas}
+            trabajadores = 1
         
-        # 2. Procesar archivo de anticipos
-        df_anticipos = procesar_archivo_anticipos(archivo_anticipos, fecha_cierre_str)
+        # Puntos de control de las etapas (clave: contenido de las entradas y fecha de cierre)
+        puntos = iniciar_puntos_control(
+            os.path.join(os.path.dirname(output_path) if output_path else '../resultados',
+                         CARPETA_PUNTOS_CONTROL, 'formato_deuda'),
+            {'provision': archivo_provision, 'anticipos': archivo_anticipos},
+            {'fecha_cierre': obtener_fecha_cierre(fecha_cierre_str).strftime('%Y-%m-%d')},
+            reanudar
+        )
+        df_provision = recuperar_etapa(puntos, 'provision', archivos=['provision'])
+        df_anticipos = recuperar_etapa(puntos, 'anticipos', archivos=['anticipos'])
         
-        # 3. Crear modelo de deuda
-        modelo_deuda = crear_modelo_deuda(df_provision, df_anticipos, fecha_cierre_str)
+        if trabajadores == 1:
+            # Sin paralelismo: ejecución secuencial en el proceso actual
+            # (con las entradas ya leídas si se recibieron)
+            if df_provision is None:
+                df_provision = registrar_etapa(puntos, 'provision', procesar_archivo_provision(
+                    archivo_provision, fecha_cierre_str, formatear=False, df=(entradas or {}).get('provision')
+                ))
+            if df_anticipos is None:
+                df_anticipos = registrar_etapa(puntos, 'anticipos', procesar_archivo_anticipos(
+                    archivo_anticipos, fecha_cierre_str, formatear=False, df=(entradas or {}).get('anticipos')
+                ))
+            modelo_deuda, df_provision, df_anticipos = crear_modelo_deuda_etapa(
+                puntos, df_provision, df_anticipos, fecha_cierre_str
+            )
+            archivos_adicionales = procesar_archivos_adicionales(
+                archivo_balance, archivo_situacion, archivo_focus, copia_directa
+            )
+        else:
+            log.info(f"Ejecutando etapas de entrada en paralelo con {trabajadores} procesos")
+            with ProcessPoolExecutor(max_workers=trabajadores) as executor:
+                # 1-2. Procesar provisión, anticipos y archivos adicionales en paralelo
+                recuperadas = [clave for clave, df in (('provision', df_provision), ('anticipos', df_anticipos))
+                               if df is not None]
+                futuros = lanzar_etapas_entrada(
+                    executor, archivo_provision, archivo_anticipos, archivo_balance,
+                    archivo_situacion, archivo_focus, fecha_cierre_str, copia_directa, recuperadas
+                )
+                if df_provision is None:
+                    df_provision = registrar_etapa(puntos, 'provision',
+                                                   deserializar_dataframe(futuros.pop('provision').result()))
+                if df_anticipos is None:
+                    df_anticipos = registrar_etapa(puntos, 'anticipos',
+                                                   deserializar_dataframe(futuros.pop('anticipos').result()))
+                
+                # 3. Crear modelo de deuda (mientras terminan los archivos adicionales)
+                modelo_deuda, df_provision, df_anticipos = crear_modelo_deuda_etapa(
+                    puntos, df_provision, df_anticipos, fecha_cierre_str
+                )
+                
+                # 4. Recoger archivos adicionales
+                if copia_directa:
+                    archivos_adicionales = procesar_archivos_adicionales(
+                        archivo_balance, archivo_situacion, archivo_focus
+                    )
+                else:
+                    archivos_adicionales = {
+                        clave: deserializar_dataframe(futuro.result())
+                        for clave, futuro in futuros.items()
+                    }
+        marcar_etapa(cronometro, 'entradas_y_modelo')
         
-        # 4. Procesar archivos adicionales
-        archivos_adicionales = procesar_archivos_adicionales(
-            archivo_balance, archivo_situacion, archivo_focus
-        )
+        # Provisión tipada al almacén histórico
+        if guardar_historico:
+            registrar_corte_historico(df_provision, obtener_fecha_cierre(fecha_cierre_str), 'formato_deuda')
+            marcar_etapa(cronometro, 'historico')
         
-        # 5. Generar formato de deuda final
-        output_file = generar_formato_deuda_final(
-            modelo_deuda, archivos_adicionales, output_path
+        # 5. Generar formato de deuda final (el formato colombiano se aplica solo al escribir)
+        partes = generar_formato_deuda_final(
+            formatear_modelo_deuda(modelo_deuda), archivos_adicionales, output_path, max_mb,
+            importes_modelo_deuda(modelo_deuda)
         )
+        output_file = partes[0]
+        marcar_etapa(cronometro, 'escritura')
+        
+        # Cubo de vencimientos de la provisión para el dashboard
+        archivo_cubo = generar_cubo(df_provision, output_file)
+        marcar_etapa(cronometro, 'cubo')
         
-        # 6. Generar resumen de resultados
-        resumen = {
-            'archivo_generado': output_file,
-            'registros_provision': len(df_provision),
-            'registros_anticipos': len(df_anticipos),
-            'registros_pesos': len(modelo_deuda['pesos']),
-            'registros_divisas': len(modelo_deuda['divisas']),
-            'registros_vencimientos': len(modelo_deuda['vencimientos']),
-            'fecha_procesamiento': datetime.now().isoformat(),
-            'fecha_cierre': fecha_cierre_str or obtener_fecha_cierre().strftime('%Y-%m-%d')
-        }
+        # 6. Generar resumen de resultados (agregados de la provisión ya calculada)
+        resumen = construir_resumen('formato_deuda', df_provision, {
+            'provision': archivo_provision,
+            'anticipos': archivo_anticipos,
+            'excel': output_file,
+            'partes': partes if len(partes) > 1 else None,
+            'cubo': archivo_cubo
+        }, cronometro, obtener_fecha_cierre(fecha_cierre_str),
+            archivo_generado=output_file,
+            archivo_cubo=archivo_cubo,
+            etapas_recuperadas=puntos['recuperadas'],
+            registros_provision=len(df_provision),
+            registros_anticipos=len(df_anticipos),
+            registros_pesos=len(modelo_deuda['pesos']),
+            registros_divisas=len(modelo_deuda['divisas']),
+            registros_vencimientos=len(modelo_deuda['vencimientos']),
+            clientes_compensados=int((modelo_deuda['compensacion']['ANTICIPO APLICADO'] > 0).sum()),
+            anticipo_aplicado=float(modelo_deuda['compensacion']['ANTICIPO APLICADO'].sum()),
+            anticipo_no_aplicado=float(modelo_deuda['anticipos_no_aplicados']['ANTICIPO NO APLICADO'].sum())
+        )
         
         # Guardar resumen en JSON
-        resumen_path = output_file.replace('.xlsx', '_resumen.json')
-        with open(resumen_path, 'w', encoding='utf-8') as f:
-            json.dump(resumen, f, indent=2, ensure_ascii=False)
+        guardar_resumen(resumen, output_file)
         
-        print("PROCESAMIENTO COMPLETADO EXITOSAMENTE")
-        print("="*80)
+        log.info("PROCESAMIENTO COMPLETADO EXITOSAMENTE")
+        log.info("="*80)
         return resumen
         
     except Exception as e:
-        print(f"Error en el procesamiento: {str(e)}")
+        log.error(f"Falló el procesamiento: {str(e)}")
         raise
 
 if __name__ == "__main__":
     # Procesamiento desde línea de comandos
-    if len(sys.argv) < 3:
-        print("Uso: python procesador_formato_deuda.py <archivo_provision> <archivo_anticipos> [archivo_balance] [archivo_situacion] [archivo_focus] [fecha_cierre]")
+    jobs, argumentos = extraer_opcion(sys.argv[1:], '--jobs')
+    sin_historico, argumentos = extraer_opcion(argumentos, '--sin-historico', es_bandera=True)
+    # Recuperar las etapas con punto de control válido de una ejecución anterior fallida
+    reanudar, argumentos = extraer_opcion(argumentos, '--reanudar', es_bandera=True)
+    resume, argumentos = extraer_opcion(argumentos, '--resume', es_bandera=True)
+    # Modo silencioso: la única salida estándar es el resultado final en JSON
+    silencioso, argumentos = extraer_opcion(argumentos, '--silencioso', es_bandera=True)
+    quiet, argumentos = extraer_opcion(argumentos, '--quiet', es_bandera=True)
+    nivel_log, argumentos = extraer_opcion(argumentos, '--nivel-log', 'INFO')
+    # Tamaño máximo de cada archivo generado (MB); el resto pasa a <salida>_parteN.xlsx
+    max_mb, argumentos = extraer_opcion(argumentos, '--max-mb')
+    silencioso = silencioso or quiet
+    
+    if len(argumentos) < 2:
+        print("Uso: python procesador_formato_deuda.py <archivo_provision> <archivo_anticipos> [archivo_balance] [archivo_situacion] [archivo_focus] [fecha_cierre] [--jobs N] [--sin-historico] [--reanudar] [--max-mb MB] [--silencioso] [--nivel-log NIVEL]")
         sys.exit(1)
     
-    archivo_provision = sys.argv[1]
-    archivo_anticipos = sys.argv[2]
-    archivo_balance = sys.argv[3] if len(sys.argv) > 3 else None
-    archivo_situacion = sys.argv[4] if len(sys.argv) > 4 else None
-    archivo_focus = sys.argv[5] if len(sys.argv) > 5 else None
-    fecha_cierre = sys.argv[6] if len(sys.argv) > 6 else None
+    archivo_provision = argumentos[0]
+    archivo_anticipos = argumentos[1]
+    archivo_balance = argumentos[2] if len(argumentos) > 2 else None
+    archivo_situacion = argumentos[3] if len(argumentos) > 3 else None
+    archivo_focus = argumentos[4] if len(argumentos) > 4 else None
+    fecha_cierre = argumentos[5] if len(argumentos) > 5 else None
     
+    ruta_log = configurar_bitacora('formato_deuda', silencioso, nivel_log)
     try:
-        resumen = procesar_formato_deuda_completo(
-            archivo_provision, archivo_anticipos, archivo_balance, 
-            archivo_situacion, archivo_focus, fecha_cierre
-        )
-        print("Procesamiento completado exitosamente")
-        print(f"Archivo generado: {resumen['archivo_generado']}")
+        with salida_silenciosa(silencioso):
+            resumen = procesar_formato_deuda_completo(
+                archivo_provision, archivo_anticipos, archivo_balance, 
+                archivo_situacion, archivo_focus, fecha_cierre, jobs=jobs,
+                guardar_historico=not sin_historico, reanudar=reanudar or resume,
+                max_mb=float(max_mb) if max_mb else None
+            )
+        registrar_resumen_errores(log)
+        log.info("Procesamiento completado exitosamente")
+        log.info(f"Archivo generado: {resumen['archivo_generado']}")
+        if silencioso:
+            emitir_resultado({'success': True, **resumen, 'log': ruta_log})
     except Exception as e:
-        print(f"Error: {str(e)}")
-        sys.exit(1) 
\ No newline at end of file
+        log.error(str(e))
+        if silencioso:
+            emitir_resultado({'success': False, 'error': str(e), 'errores_conversion': resumen_errores(),
+                              'log': ruta_log})
+        sys.exit(1)
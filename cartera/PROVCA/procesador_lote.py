@@ -0,0 +1,310 @@
+# -*- coding: utf-8 -*-
+"""
+PROCESADOR POR LOTES - GRUPO PLANETA
+
+Procesa de una sola vez muchas exportaciones PROVCA/ANTICI (varias empresas y varios
+meses) para cierres trimestrales y cargas históricas de auditoría, en lugar de llamar
+a procesador_cartera.py una vez por archivo.
+
+PROCESO:
+1. Trabajos a partir de un manifiesto JSON o de un patrón de archivos (glob). La fecha
+   de cierre de cada archivo se toma del manifiesto, de --fecha o del nombre del
+   archivo (AAAA-MM-DD, AAAAMMDD, AAAA-MM o AAAAMM; sin día, el último del mes).
+2. Cada trabajo se identifica por el hash del contenido del archivo, el tipo y la fecha
+   de cierre; los ya procesados en el directorio de salida se omiten (salvo --forzar).
+3. Los trabajos se ejecutan en un pool de procesos limitado por --jobs (0 = todos
+   los núcleos), de mayor a menor tamaño de archivo, con la salida de cada uno en su
+   propio log.
+4. Reporte consolidado LOTE_<fecha>.json con tiempos, resultados y fallos de cada archivo.
+
+MANIFIESTO (JSON):
+    [
+        {"archivo": "PROVCA_PL_2025-07.csv", "tipo": "cartera", "fecha_cierre": "2025-07-31"},
+        {"archivo": "ANTICI_PL_2025-07.csv", "fechas": ["2025-07-31", "2025-08-31"]}
+    ]
+    Las rutas relativas se resuelven desde la carpeta del manifiesto; sin "tipo" se
+    deduce del esquema del archivo (ANTICI = anticipos, el resto = cartera).
+"""
+
+import os
+import re
+import sys
+import json
+import glob
+import time
+import contextlib
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+from utilidades_cartera import extraer_opcion, hash_archivo, calcular_trabajadores
+from registro_esquemas import validar_archivo_entrada
+from resumen_ejecucion import cargar_resumen
+from bitacora import reiniciar_errores
+
+# Carpeta de salida por defecto (la misma de los procesadores)
+DIRECTORIO_RESULTADOS = r'C:\wamp64\www\modelo-deuda-python\cartera\resultados'
+
+# Registro de trabajos terminados dentro de la carpeta de salida
+NOMBRE_REGISTRO = 'lote_procesados.json'
+
+# Prefijo del archivo de salida de cada tipo de trabajo
+PREFIJOS_SALIDA = {
+    'cartera': 'CARTERA_PROCESADA',
+    'anticipos': 'ANTICIPOS_PROCESADOS'
+}
+
+# Fecha de cierre en el nombre del archivo: AAAA-MM-DD, AAAAMMDD, AAAA-MM o AAAAMM
+PATRON_FECHA_NOMBRE = re.compile(r'(?<!\d)(20\d{2})[-_]?(0[1-9]|1[0-2])(?:[-_]?(0[1-9]|[12]\d|3[01]))?(?!\d)')
+
+def fecha_desde_nombre(ruta):
+    """Fecha de cierre (AAAA-MM-DD) contenida en el nombre del archivo o None"""
+    coincidencia = PATRON_FECHA_NOMBRE.search(os.path.basename(ruta))
+    if not coincidencia:
+        return None
+    anio, mes, dia = coincidencia.groups()
+    if dia:
+        return f'{anio}-{mes}-{dia}'
+    return (pd.Timestamp(f'{anio}-{mes}-01') + pd.offsets.MonthEnd(0)).strftime('%Y-%m-%d')
+
+def fecha_por_defecto():
+    """Fecha de cierre por defecto de los procesadores (último día del mes actual)"""
+    return (pd.Timestamp.now().normalize() + pd.offsets.MonthEnd(0)).strftime('%Y-%m-%d')
+
+def tipo_desde_esquema(ruta):
+    """Tipo de trabajo según el esquema detectado: ANTICI = anticipos, el resto = cartera"""
+    esquema = validar_archivo_entrada(ruta, ['PROVCA', 'CARTERA_NOMBRES', 'ANTICI'])['esquema']
+    return 'anticipos' if esquema == 'ANTICI' else 'cartera'
+
+def leer_manifiesto(ruta):
+    """Entradas del manifiesto JSON (lista o {"trabajos": [...]}) con rutas absolutas"""
+    with open(ruta, 'r', encoding='utf-8') as f:
+        contenido = json.load(f)
+    entradas = contenido.get('trabajos', []) if isinstance(contenido, dict) else contenido
+    base = os.path.dirname(os.path.abspath(ruta))
+    resultado = []
+    for entrada in entradas:
+        if 'archivo' not in entrada:
+            raise ValueError(f"Entrada del manifiesto sin 'archivo': {entrada}")
+        fechas = entrada.get('fechas') or [entrada.get('fecha_cierre')]
+        for fecha in fechas:
+            resultado.append({
+                'archivo': os.path.join(base, entrada['archivo']),
+                'tipo': entrada.get('tipo'),
+                'fecha_cierre': fecha
+            })
+    return resultado
+
+def construir_trabajos(origen, fecha=None, tipo=None):
+    """
+    Trabajos del lote a partir de un manifiesto (.json) o de un patrón glob. La fecha y el
+    tipo indicados se aplican a los trabajos que no los traen del manifiesto.
+    """
+    if origen.lower().endswith('.json') and os.path.isfile(origen):
+        entradas = leer_manifiesto(origen)
+    else:
+        rutas = sorted(glob.glob(origen))
+        if not rutas:
+            raise ValueError(f"No hay archivos que coincidan con {origen}")
+        entradas = [{'archivo': os.path.abspath(ruta), 'tipo': None, 'fecha_cierre': None} for ruta in rutas]
+
+    trabajos = []
+    for entrada in entradas:
+        trabajo = dict(entrada)
+        trabajo['tipo'] = trabajo['tipo'] or tipo
+        trabajo['fecha_cierre'] = trabajo['fecha_cierre'] or fecha or fecha_desde_nombre(trabajo['archivo'])
+        if not trabajo['fecha_cierre']:
+            trabajo['fecha_cierre'] = fecha_por_defecto()
+            print(f"ADVERTENCIA: Sin fecha de cierre para {trabajo['archivo']}; se usa {trabajo['fecha_cierre']}")
+        trabajos.append(trabajo)
+    return trabajos
+
+def cargar_registro(directorio):
+    """Trabajos ya procesados en la carpeta de salida (clave -> datos)"""
+    ruta = os.path.join(directorio, NOMBRE_REGISTRO)
+    if not os.path.exists(ruta):
+        return {}
+    with open(ruta, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def guardar_registro(registro, directorio):
+    """Guarda el registro de trabajos procesados (escritura atómica)"""
+    ruta = os.path.join(directorio, NOMBRE_REGISTRO)
+    temporal = ruta + '.tmp'
+    with open(temporal, 'w', encoding='utf-8') as f:
+        json.dump(registro, f, indent=2, ensure_ascii=False)
+    os.replace(temporal, ruta)
+
+def registrar_trabajo(registro, resultado, directorio):
+    """Anota un trabajo procesado en el registro de la carpeta de salida y lo guarda"""
+    registro[resultado['clave']] = {
+        'archivo': resultado['archivo'],
+        'tipo': resultado['tipo'],
+        'fecha_cierre': resultado['fecha_cierre'],
+        'salida': resultado['salida'],
+        'fecha_procesamiento': datetime.now().isoformat()
+    }
+    guardar_registro(registro, directorio)
+
+def ya_procesado(registro, trabajo):
+    """Salida registrada del trabajo (misma clave de contenido, tipo y fecha) si aún existe; si no, None"""
+    previo = registro.get(trabajo['clave'])
+    if previo and os.path.exists(previo['salida']):
+        return previo['salida']
+    return None
+
+def preparar_trabajo(trabajo, directorio):
+    """Completa un trabajo con tipo, tamaño, clave de contenido y rutas de salida y log"""
+    trabajo['tipo'] = trabajo['tipo'] or tipo_desde_esquema(trabajo['archivo'])
+    if trabajo['tipo'] not in PREFIJOS_SALIDA:
+        raise ValueError(f"Tipo de trabajo no válido: {trabajo['tipo']} (cartera o anticipos)")
+    trabajo['tamano'] = os.path.getsize(trabajo['archivo'])
+    trabajo['hash'] = hash_archivo(trabajo['archivo'])
+    trabajo['clave'] = f"{trabajo['hash']}|{trabajo['tipo']}|{trabajo['fecha_cierre']}"
+
+    nombre = os.path.splitext(os.path.basename(trabajo['archivo']))[0]
+    base = os.path.join(directorio, f"{PREFIJOS_SALIDA[trabajo['tipo']]}_{nombre}_{trabajo['fecha_cierre']}")
+    trabajo['salida'] = base + '.xlsx'
+    trabajo['log'] = base + '.log'
+    return trabajo
+
+def ejecutar_trabajo(trabajo, guardar_historico=True):
+    """
+    Ejecuta un trabajo en el proceso trabajador con su salida en el log del trabajo.
+    Devuelve el trabajo con estado, segundos y, si hay resumen, registros y saldo.
+    """
+    inicio = time.perf_counter()
+    resultado = dict(trabajo)
+    # Los contadores de errores de conversión son del proceso: cada trabajo empieza de cero
+    reiniciar_errores()
+    try:
+        with open(trabajo['log'], 'w', encoding='utf-8') as log, \
+                contextlib.redirect_stdout(log), contextlib.redirect_stderr(log):
+            # Importación local: cada trabajador carga solo el procesador que necesita
+            if trabajo['tipo'] == 'cartera':
+                from procesador_cartera import procesar_cartera
+                salida = procesar_cartera(trabajo['archivo'], trabajo['salida'], trabajo['fecha_cierre'],
+                                          guardar_historico=guardar_historico)
+            else:
+                from procesador_anticipos import procesar_anticipos
+                salida = procesar_anticipos(trabajo['archivo'], trabajo['salida'], trabajo['fecha_cierre'])
+        if not salida:
+            raise RuntimeError(f"El procesador no generó salida (ver {trabajo['log']})")
+        resultado['estado'] = 'procesado'
+        try:
+            resumen = cargar_resumen(salida)
+            resultado['registros'] = resumen.get('registros')
+            resultado['saldo_total'] = resumen.get('saldo_total')
+        except (OSError, ValueError):
+            pass
+    except Exception as e:
+        resultado['estado'] = 'error'
+        resultado['error'] = str(e)
+    resultado['segundos'] = round(time.perf_counter() - inicio, 3)
+    return resultado
+
+def procesar_lote(origen, directorio=None, fecha=None, tipo=None, jobs=None, forzar=False,
+                  guardar_historico=True):
+    """
+    Procesa un lote de exportaciones en un pool de procesos y guarda el reporte
+    consolidado. Devuelve el reporte.
+    """
+    inicio = time.perf_counter()
+    directorio = directorio or DIRECTORIO_RESULTADOS
+    os.makedirs(directorio, exist_ok=True)
+    trabajadores = calcular_trabajadores(jobs, por_defecto=os.cpu_count() or 1)
+
+    print("=" * 80)
+    print("PROCESADOR POR LOTES - CARTERA Y ANTICIPOS")
+    print("=" * 80)
+
+    registro = cargar_registro(directorio)
+    resultados = []
+    pendientes = []
+    for trabajo in construir_trabajos(origen, fecha, tipo):
+        try:
+            preparar_trabajo(trabajo, directorio)
+        except Exception as e:
+            print(f"ERROR en {trabajo['archivo']}: {e}")
+            resultados.append({**trabajo, 'estado': 'error', 'error': str(e), 'segundos': 0.0})
+            continue
+        salida_previa = ya_procesado(registro, trabajo)
+        if salida_previa and not forzar:
+            print(f"Omitido (ya procesado): {trabajo['archivo']} -> {salida_previa}")
+            resultados.append({**trabajo, 'estado': 'omitido', 'salida': salida_previa, 'segundos': 0.0})
+            continue
+        pendientes.append(trabajo)
+
+    # Trabajos más largos primero (por tamaño de archivo) para acortar el tiempo total
+    pendientes.sort(key=lambda t: t['tamano'], reverse=True)
+    print(f"Trabajos: {len(pendientes)} pendientes, {len(resultados)} omitidos o con error. "
+          f"Procesos: {trabajadores}")
+
+    if pendientes:
+        with ProcessPoolExecutor(max_workers=min(trabajadores, len(pendientes))) as executor:
+            futuros = [executor.submit(ejecutar_trabajo, trabajo, guardar_historico) for trabajo in pendientes]
+            for trabajo, futuro in zip(pendientes, futuros):
+                # Un trabajador que termina de forma anormal (p. ej. sin memoria) rompe el pool:
+                # ese trabajo y los que no llegaron a terminar se registran como error
+                try:
+                    resultado = futuro.result()
+                except Exception as e:
+                    resultado = {**trabajo, 'estado': 'error', 'error': str(e) or type(e).__name__, 'segundos': 0.0}
+                resultados.append(resultado)
+                if resultado['estado'] == 'procesado':
+                    print(f"OK ({resultado['segundos']:.1f} s): {resultado['archivo']} -> {resultado['salida']}")
+                    registrar_trabajo(registro, resultado, directorio)
+                else:
+                    print(f"ERROR ({resultado['segundos']:.1f} s): {resultado['archivo']}: {resultado['error']}")
+
+    conteo = {estado: sum(1 for r in resultados if r['estado'] == estado)
+              for estado in ('procesado', 'omitido', 'error')}
+    reporte = {
+        'fecha_procesamiento': datetime.now().isoformat(),
+        'origen': origen,
+        'directorio_salida': directorio,
+        'procesos': trabajadores,
+        'trabajos': len(resultados),
+        'procesados': conteo['procesado'],
+        'omitidos': conteo['omitido'],
+        'errores': conteo['error'],
+        'segundos_trabajos': round(sum(r.get('segundos', 0.0) for r in resultados), 3),
+        'segundos_total': round(time.perf_counter() - inicio, 3),
+        'detalle': [
+            {clave: r.get(clave) for clave in ('archivo', 'tipo', 'fecha_cierre', 'estado', 'segundos',
+                                               'salida', 'log', 'registros', 'saldo_total', 'error', 'hash')}
+            for r in resultados
+        ]
+    }
+
+    ruta_reporte = os.path.join(directorio, f"LOTE_{datetime.now().strftime('%Y-%m-%d_%H-%M-%S')}.json")
+    with open(ruta_reporte, 'w', encoding='utf-8') as f:
+        json.dump(reporte, f, indent=2, ensure_ascii=False, default=str)
+    reporte['reporte'] = ruta_reporte
+
+    print("\n" + "=" * 80)
+    print(f"LOTE TERMINADO: {conteo['procesado']} procesados, {conteo['omitido']} omitidos, "
+          f"{conteo['error']} con error en {reporte['segundos_total']:.1f} s")
+    print(f"Reporte: {ruta_reporte}")
+    return reporte
+
+if __name__ == "__main__":
+    fecha, argumentos = extraer_opcion(sys.argv[1:], '--fecha')
+    tipo, argumentos = extraer_opcion(argumentos, '--tipo')
+    directorio, argumentos = extraer_opcion(argumentos, '--salida')
+    jobs, argumentos = extraer_opcion(argumentos, '--jobs')
+    forzar, argumentos = extraer_opcion(argumentos, '--forzar', es_bandera=True)
+    sin_historico, argumentos = extraer_opcion(argumentos, '--sin-historico', es_bandera=True)
+
+    if len(argumentos) > 0:
+        try:
+            reporte = procesar_lote(argumentos[0], directorio, fecha, tipo, jobs, forzar, not sin_historico)
+        except Exception as e:
+            print(f"ERROR: {e}")
+            sys.exit(1)
+        sys.exit(1 if reporte['errores'] else 0)
+    else:
+        print("Uso: python procesador_lote.py <manifiesto.json|patron_archivos> [--fecha AAAA-MM-DD] "
+              "[--tipo cartera|anticipos] [--salida DIRECTORIO] [--jobs N] [--forzar] [--sin-historico]")
+        print('Ejemplo: python procesador_lote.py "exportaciones/PROVCA_*_2025-0[789].csv" --jobs 4')
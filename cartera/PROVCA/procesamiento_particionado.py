@@ -0,0 +1,203 @@
+# -*- coding: utf-8 -*-
+"""
+PROCESAMIENTO PARTICIONADO - GRUPO PLANETA
+
+Ejecución en paralelo de las etapas que se calculan factura por factura (vencimiento,
+dotación, rangos y validaciones de procesar_cartera). El DataFrame ya preparado se
+reparte en particiones por EMPRESA/ACTIVIDAD y cada partición se procesa en un proceso
+trabajador distinto.
+
+PROCESO:
+1. Cada fila recibe el hash de su clave EMPRESA/ACTIVIDAD. Los grupos se reparten entre
+   las particiones de mayor a menor tamaño, siempre a la partición con menos filas; un
+   grupo mayor que una fracción de la cuota de una partición se divide en trozos de esa
+   fracción para que las particiones queden equilibradas.
+2. Cada partición se entrega al trabajador como archivo IPC de Arrow en un directorio
+   temporal (no como DataFrame serializado por la tubería del pool). De vuelta solo se
+   guardan las columnas que la etapa creó o modificó; por la tubería viajan la ruta y
+   los conteos de validación de la partición.
+3. Las partes se unen en el orden original de las filas, se combinan con las columnas
+   sin cambios del DataFrame de entrada y los conteos se suman.
+
+procesar_por_bloques aplica la misma etapa a bloques consecutivos de filas en el propio
+proceso, uno tras otro, cuando lo que falta es memoria y no núcleos: la memoria adicional
+es la de un bloque y no la de una copia de todo el DataFrame.
+"""
+
+import io
+import os
+import logging
+import tempfile
+import contextlib
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from utilidades_cartera import guardar_dataframe_ipc, cargar_dataframe_ipc, calcular_trabajadores
+from resumen_ejecucion import contar_errores_validacion
+from bitacora import obtener_logger, nivel_temporal
+
+log = obtener_logger(__name__)
+
+# Clave de partición
+CLAVES_PARTICION = ['EMPRESA', 'ACTIVIDAD']
+
+# Por debajo de este número de registros el reparto cuesta más de lo que ahorra
+MINIMO_REGISTROS_PARALELO = 20000
+
+# Trozos en que se divide la cuota de filas de una partición para repartir los grupos grandes
+TROZOS_POR_PARTICION = 4
+
+# Posición original de cada fila dentro del DataFrame de entrada
+COLUMNA_FILA = '_FILA_ORIGEN'
+
+# Filas de cada bloque en procesar_por_bloques
+FILAS_POR_BLOQUE = 100000
+
+# Estrategias de ejecución de procesar_cartera (auto = la que elija planificador_capacidad)
+ESTRATEGIA_AUTO = 'auto'
+ESTRATEGIA_MEMORIA = 'memoria'
+ESTRATEGIA_PARTICIONADO = 'particionado'
+ESTRATEGIA_BLOQUES = 'bloques'
+ESTRATEGIAS = (ESTRATEGIA_AUTO, ESTRATEGIA_MEMORIA, ESTRATEGIA_PARTICIONADO, ESTRATEGIA_BLOQUES)
+
+def asignar_particiones(df, particiones, claves=CLAVES_PARTICION):
+    """
+    Partición de cada fila (array de enteros 0..particiones-1). Los grupos de la clave se
+    asignan completos salvo que superen la fracción TROZOS_POR_PARTICION de la cuota.
+    """
+    claves = [c for c in claves if c in df.columns]
+    if claves:
+        hashes = pd.util.hash_pandas_object(df[claves], index=False).to_numpy()
+    else:
+        hashes = np.zeros(len(df), dtype=np.uint64)
+    _, grupos = np.unique(hashes, return_inverse=True)
+
+    # Trozos de grupo de a lo sumo la fracción de cuota: posición de cada fila dentro de su grupo
+    cuota = max(1, -(-len(df) // (particiones * TROZOS_POR_PARTICION)))
+    orden = np.argsort(grupos, kind='stable')
+    inicios = np.searchsorted(grupos[orden], grupos[orden], side='left')
+    posicion = np.empty(len(df), dtype=np.int64)
+    posicion[orden] = np.arange(len(df)) - inicios
+    _, trozos = np.unique(grupos.astype(np.int64) * (len(df) + 1) + posicion // cuota, return_inverse=True)
+
+    # Trozos de mayor a menor tamaño, cada uno a la partición con menos filas
+    tamanos = np.bincount(trozos)
+    carga = np.zeros(particiones, dtype=np.int64)
+    destino = np.empty(len(tamanos), dtype=np.int64)
+    for trozo in np.argsort(-tamanos, kind='stable'):
+        particion = int(carga.argmin())
+        destino[trozo] = particion
+        carga[particion] += tamanos[trozo]
+    return destino[trozos]
+
+def _ejecutar_particion(funcion, ruta_entrada, ruta_salida, argumentos):
+    """
+    Procesa una partición en el trabajador. Guarda en ruta_salida las columnas creadas o
+    modificadas (con la posición de cada fila) y devuelve el orden de columnas del
+    resultado y los errores de validación de la partición.
+    """
+    entrada = cargar_dataframe_ipc(ruta_entrada)
+    originales = {col: entrada[col] for col in entrada.columns}
+    # Los mensajes de progreso de cada etapa se omiten: el proceso principal informa del total
+    with contextlib.redirect_stdout(io.StringIO()):
+        resultado = funcion(entrada, *argumentos)
+    columnas, cambiadas = _columnas_cambiadas(resultado, originales)
+    guardar_dataframe_ipc(resultado[cambiadas + [COLUMNA_FILA]], ruta_salida)
+    return columnas, contar_errores_validacion(resultado)
+
+def _columnas_cambiadas(resultado, originales):
+    """Columnas del resultado y las que la etapa creó o modificó respecto a originales"""
+    columnas = [col for col in resultado.columns if col != COLUMNA_FILA]
+    cambiadas = [col for col in columnas if col not in originales or not resultado[col].equals(originales[col])]
+    return columnas, cambiadas
+
+def _combinar_partes(df, partes, columnas):
+    """
+    Une las columnas cambiadas de cada parte (con COLUMNA_FILA) en el orden original de
+    las filas y las combina con las columnas sin cambios de df
+    """
+    # Una columna sin cambios en alguna parte se completa con los valores de entrada
+    cambiadas = list(dict.fromkeys(col for parte in partes for col in parte.columns if col != COLUMNA_FILA))
+    for parte in partes:
+        for col in cambiadas:
+            if col not in parte.columns:
+                parte[col] = df[col].to_numpy()[parte[COLUMNA_FILA].to_numpy()]
+    cambios = pd.concat(partes, ignore_index=True).sort_values(COLUMNA_FILA, kind='stable')
+    cambios = cambios.drop(columns=COLUMNA_FILA).reset_index(drop=True)
+    sin_cambios = [col for col in columnas if col not in cambios.columns]
+    return pd.concat([df[sin_cambios], cambios], axis=1)[columnas]
+
+def procesar_particionado(df, funcion, argumentos=(), trabajadores=None, claves=CLAVES_PARTICION):
+    """
+    Aplica funcion(df_particion, *argumentos) a las particiones de df en un pool de procesos.
+    funcion debe estar definida a nivel de módulo y tratar cada fila de forma independiente.
+    Devuelve (resultado en el orden original, errores de validación sumados).
+    """
+    trabajadores = calcular_trabajadores(trabajadores)
+    df = df.reset_index(drop=True)
+    particiones = asignar_particiones(df, trabajadores, claves)
+    log.info(f"Procesando {len(df)} registros en {trabajadores} particiones "
+             f"({', '.join(claves)}) con {trabajadores} procesos")
+
+    partes = []
+    columnas = None
+    errores = {}
+    with tempfile.TemporaryDirectory(prefix='particiones_') as directorio, \
+            ProcessPoolExecutor(max_workers=trabajadores) as executor:
+        futuros = {}
+        for particion in range(trabajadores):
+            filas = np.flatnonzero(particiones == particion)
+            if len(filas) == 0:
+                continue
+            ruta_entrada = os.path.join(directorio, f'entrada_{particion}.arrow')
+            ruta_salida = os.path.join(directorio, f'salida_{particion}.arrow')
+            guardar_dataframe_ipc(df.iloc[filas].assign(**{COLUMNA_FILA: filas}), ruta_entrada)
+            futuros[ruta_salida] = executor.submit(_ejecutar_particion, funcion, ruta_entrada,
+                                                   ruta_salida, tuple(argumentos))
+        for ruta_salida, futuro in futuros.items():
+            columnas, conteo = futuro.result()
+            partes.append(cargar_dataframe_ipc(ruta_salida))
+            for nombre, cantidad in conteo.items():
+                errores[nombre] = errores.get(nombre, 0) + cantidad
+
+    resultado = _combinar_partes(df, partes, columnas)
+    _informar_errores(errores)
+    log.info(f"Particiones procesadas: {len(partes)}. Registros: {len(resultado)}")
+    return resultado, errores
+
+def _informar_errores(errores):
+    """Advertencia por cada validación con registros erróneos (sumados entre partes)"""
+    for nombre, cantidad in errores.items():
+        if cantidad > 0:
+            log.warning(f"{cantidad} registros con error en la validación '{nombre}'")
+
+def procesar_por_bloques(df, funcion, argumentos=(), filas=FILAS_POR_BLOQUE):
+    """
+    Aplica funcion(df_bloque, *argumentos) a bloques consecutivos de filas de df en este
+    proceso, uno tras otro; de cada bloque solo se conservan las columnas creadas o
+    modificadas. Mismas condiciones y resultado que procesar_particionado.
+    """
+    df = df.reset_index(drop=True)
+    log.info(f"Procesando {len(df)} registros en bloques de {filas}")
+
+    partes = []
+    columnas = None
+    errores = {}
+    for inicio in range(0, len(df), filas):
+        bloque = df.iloc[inicio:inicio + filas]
+        originales = {col: bloque[col] for col in bloque.columns}
+        # Progreso de cada bloque omitido: los errores de validación se informan sumados
+        with nivel_temporal(logging.ERROR):
+            resultado = funcion(bloque.copy(), *argumentos)
+        columnas, cambiadas = _columnas_cambiadas(resultado, originales)
+        partes.append(resultado[cambiadas].assign(**{COLUMNA_FILA: np.arange(inicio, inicio + len(resultado))}))
+        for nombre, cantidad in contar_errores_validacion(resultado).items():
+            errores[nombre] = errores.get(nombre, 0) + cantidad
+        del resultado
+
+    resultado = _combinar_partes(df, partes, columnas) if partes else funcion(df, *argumentos)
+    _informar_errores(errores)
+    log.info(f"Bloques procesados: {len(partes)}. Registros: {len(resultado)}")
+    return resultado, errores
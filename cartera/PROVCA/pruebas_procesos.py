@@ -0,0 +1,369 @@
+# -*- coding: utf-8 -*-
+"""
+PRUEBAS DE PROCESOS - SISTEMA FORMATO DEUDA
+GRUPO PLANETA
+
+Pruebas de las funciones de cálculo con datos pequeños construidos en la propia
+prueba (no necesitan archivos de entrada ni la carpeta de resultados)
+"""
+
+import os
+import tempfile
+import pandas as pd
+from datetime import datetime
+
+from pruebas_simples import imprimir_seccion, imprimir_resultado
+
+def prueba_compensacion_anticipos():
+    """Prueba que los anticipos se apliquen de la factura más antigua a la más reciente"""
+    imprimir_seccion("COMPENSACIÓN DE ANTICIPOS")
+
+    try:
+        from compensacion_anticipos import compensar_anticipos
+
+        provision = pd.DataFrame({
+            'CODIGO CLIENTE': ['1', '1', '1', '2'],
+            'FECHA VTO': ['20250310', '20250110', '20250210', '20250115'],
+            'SALDO': ['200', '100', '50', '30']
+        })
+        anticipos = pd.DataFrame({
+            'CODIGO CLIENTE': ['1', '2', '3'],
+            'SALDO': ['-120', '-50', '-10']
+        })
+        resultado = compensar_anticipos(provision, anticipos, '2025-06-30')
+
+        # Cliente 1: 120 cubren la factura de enero (100) y 20 de la de febrero
+        aplicado = resultado['facturas'].sort_index()['ANTICIPO APLICADO'].tolist()
+        orden_correcto = aplicado == [0.0, 100.0, 20.0, 30.0]
+        imprimir_resultado("aplicacion_mas_antigua_primero", orden_correcto, f"Aplicado por factura: {aplicado}")
+
+        # Cliente 2 con anticipo mayor que su deuda y cliente 3 sin facturas
+        no_aplicados = resultado['anticipos_no_aplicados'].set_index('CLIENTE')['ANTICIPO NO APLICADO'].to_dict()
+        resto_correcto = no_aplicados == {'2': 20.0, '3': 10.0}
+        imprimir_resultado("anticipo_no_aplicado", resto_correcto, f"No aplicado por cliente: {no_aplicados}")
+
+        neto = resultado['neto_clientes'].set_index('CLIENTE')['SALDO NETO'].to_dict()
+        neto_correcto = neto == {'1': 230.0, '2': 0.0}
+        imprimir_resultado("saldo_neto_cliente", neto_correcto, f"Saldo neto: {neto}")
+
+        return orden_correcto and resto_correcto and neto_correcto
+
+    except Exception as e:
+        imprimir_resultado("compensacion_anticipos", False, str(e))
+        return False
+
+def prueba_movimientos_cartera():
+    """Prueba la conciliación de deuda: inicial + cobros + facturación + vencidos = final"""
+    imprimir_seccion("MOVIMIENTOS DE CARTERA")
+
+    try:
+        from movimientos_cartera import calcular_movimientos
+
+        # Cortes como los deja cargar_corte: una fila por factura
+        anterior = pd.DataFrame({
+            'EMPRESA': ['PL', 'PL', 'PL', 'PL'],
+            'NUMERO FACTURA': ['1', '2', '3', '4'],
+            'FECHA VTO': pd.to_datetime(['2025-04-15', '2025-06-15', '2025-07-20', '2025-06-20']),
+            'SALDO': [100.0, 200.0, 50.0, 30.0]
+        })
+        actual = pd.DataFrame({
+            'EMPRESA': ['PL', 'PL', 'PL', 'PL'],
+            'NUMERO FACTURA': ['1', '2', '4', '5'],
+            'FECHA VTO': pd.to_datetime(['2025-04-15', '2025-06-15', '2025-06-20', '2025-08-01']),
+            'SALDO': [40.0, 200.0, 80.0, 500.0]
+        })
+        resultado = calcular_movimientos(anterior, actual, '2025-05-31', '2025-06-30')
+        calculos = resultado['resumen_calculos']
+        deuda = resultado['deuda']
+
+        # Cobro parcial (60) y factura cobrada (50); aumento (50) y factura nueva (500)
+        totales_correctos = calculos['cobros']['total'] == -110.0 and calculos['facturacion']['total'] == 550.0
+        imprimir_resultado("cobros_y_facturacion", totales_correctos,
+                           f"Cobros: {calculos['cobros']['total']}, facturación: {calculos['facturacion']['total']}")
+
+        vencida = deuda['inicial']['vencida'] + calculos['cobros']['vencida'] + \
+            calculos['facturacion']['vencida'] + calculos['vencidos']['vencido']
+        no_vencida = deuda['inicial']['no_vencida'] + calculos['cobros']['no_vencida'] + \
+            calculos['facturacion']['no_vencida'] + calculos['vencidos']['no_vencido']
+        concilia = abs(vencida - deuda['final']['vencida']) < 0.005 and \
+            abs(no_vencida - deuda['final']['no_vencida']) < 0.005
+        imprimir_resultado("conciliacion_deuda", concilia,
+                           f"Vencida {vencida} / {deuda['final']['vencida']}, "
+                           f"no vencida {no_vencida} / {deuda['final']['no_vencida']}")
+
+        # Facturas 2 y 4 pasan a vencidas en junio con el saldo que permanece (200 + 30)
+        vencidos_correctos = calculos['vencidos']['vencido'] == 230.0 and resultado['conteos']['NUEVA VENCIDA'] == 2
+        imprimir_resultado("nuevas_vencidas", vencidos_correctos, f"Vencidos: {calculos['vencidos']['vencido']}")
+
+        return totales_correctos and concilia and vencidos_correctos
+
+    except Exception as e:
+        imprimir_resultado("movimientos_cartera", False, str(e))
+        return False
+
+def prueba_resolucion_clientes():
+    """Prueba que un registro sin identificación no una dos clientes con identificaciones distintas"""
+    imprimir_seccion("RESOLUCIÓN DE CLIENTES")
+
+    try:
+        from resolucion_clientes import construir_resolucion, resolver_clientes
+
+        df = pd.DataFrame({
+            'NOMBRE': ['JUAN PEREZ', 'JUAN PEREZ', 'JUAN PEREZ', 'DISTRIBUIDORA ACME', 'DISTRIBUIDORA ACMES'],
+            'IDENTIFICACION': ['79111222', '80222333', '', '900123', '']
+        })
+        resolucion = construir_resolucion([df])
+        claves = dict(zip(zip(resolucion['NOMBRE'], resolucion['ID']), resolucion['CLAVE CLIENTE']))
+
+        # Dos identificaciones distintas: el registro sin identificación queda aparte
+        separados = len({claves[('JUAN PEREZ', '79111222')], claves[('JUAN PEREZ', '80222333')],
+                         claves[('JUAN PEREZ', '')]}) == 3
+        imprimir_resultado("identificaciones_distintas_separadas", separados,
+                           f"Claves: {[clave for (nombre, _), clave in claves.items() if nombre == 'JUAN PEREZ']}")
+
+        # Una sola identificación en el grupo de nombres similares: el registro sin
+        # identificación se une a ella
+        unidos = claves[('DISTRIBUIDORA ACME', '900123')] == claves[('DISTRIBUIDORA ACMES', '')] == '900123'
+        imprimir_resultado("identificacion_unica_unida", unidos,
+                           f"Claves: {claves[('DISTRIBUIDORA ACME', '900123')]}, {claves[('DISTRIBUIDORA ACMES', '')]}")
+
+        # Archivo sin filas: resolución vacía en lugar de fallar
+        vacio = pd.DataFrame({'NOMBRE': pd.Series(dtype=float), 'IDENTIFICACION': pd.Series(dtype=float)})
+        resolucion_vacia = resolver_clientes([vacio])
+        sin_filas = resolucion_vacia.empty and 'CLAVE CLIENTE' in vacio.columns
+        imprimir_resultado("archivo_sin_filas", sin_filas, f"Columnas: {vacio.columns.tolist()}")
+
+        return separados and unidos and sin_filas
+
+    except Exception as e:
+        imprimir_resultado("resolucion_clientes", False, str(e))
+        return False
+
+def prueba_procesamiento_particionado():
+    """Prueba el reparto en particiones y que al combinarlas se conserve el orden de las filas"""
+    imprimir_seccion("PROCESAMIENTO PARTICIONADO")
+
+    try:
+        from procesamiento_particionado import asignar_particiones, _combinar_partes, COLUMNA_FILA
+
+        # Un grupo grande (se reparte en trozos) y varios menores que la cuota de un trozo
+        # (100 filas / (3 particiones * 4 trozos) = 9), que se asignan completos
+        df = pd.DataFrame({
+            'EMPRESA': ['PL'] * 70 + ['CT'] * 16 + ['ED'] * 14,
+            'ACTIVIDAD': ['20'] * 70 + ['25', '41'] * 8 + ['20', '25'] * 7,
+            'SALDO': [float(i) for i in range(100)]
+        }).sample(frac=1, random_state=0).reset_index(drop=True)
+        particiones = asignar_particiones(df, 3)
+
+        cargas = pd.Series(particiones).value_counts()
+        repartidas = sorted(cargas.index) == [0, 1, 2] and cargas.max() - cargas.min() <= 10
+        imprimir_resultado("reparto_equilibrado", repartidas, f"Filas por partición: {cargas.sort_index().tolist()}")
+
+        pequenos = df['EMPRESA'] != 'PL'
+        completos = pd.Series(particiones[pequenos.to_numpy()]).groupby(
+            (df.loc[pequenos, 'EMPRESA'] + df.loc[pequenos, 'ACTIVIDAD']).to_numpy()).nunique().max() == 1
+        imprimir_resultado("grupos_pequenos_completos", completos)
+
+        # Cada partición cambia SALDO y crea DOBLE; una de ellas no cambia SALDO
+        partes = []
+        for particion in (2, 0, 1):
+            filas = (particiones == particion).nonzero()[0]
+            parte = pd.DataFrame({COLUMNA_FILA: filas, 'DOBLE': df['SALDO'].to_numpy()[filas] * 2})
+            if particion != 1:
+                parte['SALDO'] = df['SALDO'].to_numpy()[filas] + 1
+            partes.append(parte.sample(frac=1, random_state=particion))
+        combinado = _combinar_partes(df, partes, ['EMPRESA', 'ACTIVIDAD', 'SALDO', 'DOBLE'])
+
+        esperado = df.assign(SALDO=df['SALDO'] + (particiones != 1), DOBLE=df['SALDO'] * 2)
+        ordenado = combinado.equals(esperado)
+        imprimir_resultado("orden_filas_conservado", ordenado, f"Filas: {len(combinado)}")
+
+        return repartidas and completos and ordenado
+
+    except Exception as e:
+        imprimir_resultado("procesamiento_particionado", False, str(e))
+        return False
+
+def prueba_salida_dividida():
+    """Prueba que las filas y los totales se conserven al repartir una hoja en partes y archivos"""
+    imprimir_seccion("SALIDA DIVIDIDA EN PARTES")
+
+    try:
+        from openpyxl import load_workbook
+        from escritura_excel import (abrir_salida_dividida, iniciar_hoja, escribir_filas,
+                                     cerrar_salida_dividida, NOMBRE_HOJA_TOTALES)
+
+        df = pd.DataFrame({
+            'FACTURA': [f'F{i:04d}' for i in range(500)],
+            'CLIENTE': [f'CLIENTE {i % 37} S.A.S.' for i in range(500)],
+            'SALDO': [round(i * 1234.5, 2) for i in range(500)]
+        })
+
+        with tempfile.TemporaryDirectory() as directorio:
+            # Hojas de 150 filas y archivos de unos 10 KB; las filas llegan en dos bloques
+            salida = abrir_salida_dividida(os.path.join(directorio, 'SALIDA.xlsx'), max_mb=0.01, max_filas=151)
+            iniciar_hoja(salida, 'PESOS', list(df.columns))
+            escribir_filas(salida, df.iloc[:230], df[['SALDO']].iloc[:230])
+            escribir_filas(salida, df.iloc[230:], df[['SALDO']].iloc[230:])
+            rutas = cerrar_salida_dividida(salida)
+
+            partes = []
+            totales = None
+            for ruta in rutas:
+                libro = load_workbook(ruta, read_only=True)
+                for hoja in libro.worksheets:
+                    filas = list(hoja.values)
+                    if hoja.title == NOMBRE_HOJA_TOTALES:
+                        totales = [fila for fila in filas if fila[1] == 'TOTAL'][0]
+                    else:
+                        partes.append(pd.DataFrame(filas[1:], columns=filas[0]))
+                libro.close()
+
+        leidas = pd.concat(partes, ignore_index=True)
+        dividida = len(rutas) > 1 and max(len(parte) for parte in partes) <= 150
+        imprimir_resultado("varios_archivos_y_hojas", dividida, f"Archivos: {len(rutas)}, hojas: {len(partes)}")
+
+        conservadas = leidas['FACTURA'].tolist() == df['FACTURA'].tolist()
+        imprimir_resultado("filas_en_orden", conservadas, f"Filas leídas: {len(leidas)}")
+
+        total = round(df['SALDO'].sum(), 2)
+        cuadra = abs(leidas['SALDO'].sum() - total) < 0.005 and totales is not None \
+            and totales[3] == len(df) and abs(totales[4] - total) < 0.005
+        imprimir_resultado("totales_entre_partes", cuadra, f"Total: {total}, hoja TOTALES: {totales}")
+
+        return dividida and conservadas and cuadra
+
+    except Exception as e:
+        imprimir_resultado("salida_dividida", False, str(e))
+        return False
+
+def prueba_almacen_historico():
+    """Prueba que el histórico conserve la última ejecución de cada empresa de un mismo cierre"""
+    imprimir_seccion("ALMACÉN HISTÓRICO")
+
+    try:
+        from almacen_historico import guardar_corte_historico, consultar_historico
+
+        with tempfile.TemporaryDirectory() as directorio:
+            # Dos exportaciones del mismo cierre con empresas distintas y una repetición de PL10
+            guardar_corte_historico(pd.DataFrame({'EMPRESA': ['PL10'], 'SALDO': ['100']}), '2025-06-30',
+                                    'cartera', directorio)
+            guardar_corte_historico(pd.DataFrame({'EMPRESA': ['PL20'], 'SALDO': ['200']}), '2025-06-30',
+                                    'cartera', directorio)
+            guardar_corte_historico(pd.DataFrame({'EMPRESA': ['PL10', 'PL10'], 'SALDO': ['150', '50']}),
+                                    '2025-06-30', 'cartera', directorio)
+            resultado = consultar_historico(['SALDO'], directorio=directorio)
+
+        saldos = resultado.set_index('EMPRESA')['SALDO'].to_dict()
+        correcto = saldos == {'PL10': 200.0, 'PL20': 200.0}
+        imprimir_resultado("ultima_ejecucion_por_empresa", correcto, f"Saldo por empresa: {saldos}")
+
+        return correcto
+
+    except Exception as e:
+        imprimir_resultado("almacen_historico", False, str(e))
+        return False
+
+def prueba_codificacion_texto():
+    """Prueba la codificación de exportaciones latin1 cuyo primer acento está lejos del inicio"""
+    imprimir_seccion("CODIFICACIÓN DE ARCHIVOS DE TEXTO")
+
+    try:
+        from utilidades_cartera import detectar_formato_archivo, leer_archivo_tabular, TAMANO_MUESTRA_DETECCION
+
+        filas = TAMANO_MUESTRA_DETECCION // 20 + 100
+        with tempfile.TemporaryDirectory() as directorio:
+            ruta_latin1 = os.path.join(directorio, 'latin1.csv')
+            with open(ruta_latin1, 'w', encoding='latin1', newline='') as f:
+                f.write('NOMBRE;SALDO\n' + 'CLIENTE SAS;1000\n' * filas + 'MUÑOZ;2000\n')
+            ruta_utf8 = os.path.join(directorio, 'utf8.csv')
+            with open(ruta_utf8, 'w', encoding='utf-8', newline='') as f:
+                f.write('NOMBRE;SALDO\nMUÑOZ;2000\n')
+
+            formato = detectar_formato_archivo(ruta_latin1)
+            df = leer_archivo_tabular(ruta_latin1, formato=formato)
+            latin1 = formato['encoding'] == 'latin1' and df['NOMBRE'].iloc[-1] == 'MUÑOZ'
+            imprimir_resultado("latin1_acento_tras_muestra", latin1,
+                               f"Codificación: {formato['encoding']}, última fila: {df['NOMBRE'].iloc[-1]}")
+
+            utf8 = detectar_formato_archivo(ruta_utf8)['encoding'] == 'utf-8' and \
+                leer_archivo_tabular(ruta_utf8)['NOMBRE'].iloc[0] == 'MUÑOZ'
+            imprimir_resultado("utf8_con_acentos", utf8)
+
+            # Detección equivocada (utf-8): la lectura se repite en latin1
+            df = leer_archivo_tabular(ruta_latin1, formato={**formato, 'encoding': 'utf-8'})
+            reintento = df['NOMBRE'].iloc[-1] == 'MUÑOZ'
+            imprimir_resultado("reintento_latin1", reintento, f"Filas: {len(df)}")
+
+        return latin1 and utf8 and reintento
+
+    except Exception as e:
+        imprimir_resultado("codificacion_texto", False, str(e))
+        return False
+
+def prueba_indice_consulta():
+    """Prueba que el índice de consulta no mezcla claves con ceros a la izquierda ni las muy largas"""
+    imprimir_seccion("ÍNDICE DE CONSULTA")
+
+    try:
+        from consulta_resultados import generar_consulta, abrir_consulta, buscar, buscar_rango
+
+        df = pd.DataFrame({
+            'CODIGO CLIENTE': ['0123', '123', '1234567890123456789012', '0123'],
+            'CODIGO AGENTE': ['10', '9', '100', '9'],
+            'SALDO': [100, 200, 300, 400]
+        })
+        with tempfile.TemporaryDirectory() as directorio:
+            consulta = abrir_consulta(generar_consulta(df, os.path.join(directorio, 'CARTERA.xlsx')))
+
+            ceros = buscar(consulta, 'CODIGO CLIENTE', '0123')['SALDO'].tolist() == [100, 400] and \
+                buscar(consulta, 'CODIGO CLIENTE', '123')['SALDO'].tolist() == [200]
+            imprimir_resultado("ceros_a_la_izquierda", ceros)
+
+            larga = buscar(consulta, 'CODIGO CLIENTE', '1234567890123456789012')['SALDO'].tolist() == [300]
+            imprimir_resultado("clave_mayor_que_int64", larga)
+
+            rango = buscar_rango(consulta, 'CODIGO AGENTE', '9', '10')['SALDO'].tolist() == [100, 200, 400]
+            imprimir_resultado("rango_numerico", rango)
+
+        return ceros and larga and rango
+
+    except Exception as e:
+        imprimir_resultado("indice_consulta", False, str(e))
+        return False
+
+def main():
+    """Función principal de pruebas"""
+    print("PRUEBAS DE PROCESOS - SISTEMA FORMATO DEUDA")
+    print("GRUPO PLANETA")
+    print(f"Fecha: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+
+    # Ejecutar pruebas
+    resultados = []
+
+    resultados.append(("Compensación de anticipos", prueba_compensacion_anticipos()))
+    resultados.append(("Movimientos de cartera", prueba_movimientos_cartera()))
+    resultados.append(("Resolución de clientes", prueba_resolucion_clientes()))
+    resultados.append(("Procesamiento particionado", prueba_procesamiento_particionado()))
+    resultados.append(("Salida dividida en partes", prueba_salida_dividida()))
+    resultados.append(("Almacén histórico", prueba_almacen_historico()))
+    resultados.append(("Codificación de archivos de texto", prueba_codificacion_texto()))
+    resultados.append(("Índice de consulta", prueba_indice_consulta()))
+
+    # Resumen
+    imprimir_seccion("RESUMEN")
+
+    total = len(resultados)
+    exitosas = sum(1 for _, resultado in resultados if resultado)
+
+    print(f"Total de pruebas: {total}")
+    print(f"Pruebas exitosas: {exitosas}")
+    print(f"Pruebas fallidas: {total - exitosas}")
+    for nombre, resultado in resultados:
+        if not resultado:
+            print(f"   ❌ {nombre}")
+
+    return exitosas == total
+
+if __name__ == "__main__":
+    exit(0 if main() else 1)
@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+"""
+PUNTOS DE CONTROL - GRUPO PLANETA
+
+Guarda el resultado tipado de cada etapa de un proceso (uno o varios DataFrames) para
+que, si una etapa posterior falla (p. ej. la escritura del Excel por un archivo
+bloqueado o una hoja FOCUS incorrecta), la siguiente ejecución con --reanudar recupere
+las etapas ya terminadas en lugar de recalcularlas.
+
+PROCESO:
+1. La clave de cada etapa es el SHA-256 de su nombre, el contenido de sus archivos de
+   entrada, sus parámetros y las claves de las etapas de las que depende.
+2. Al terminar una etapa sus DataFrames se guardan como archivos IPC de Arrow en una
+   carpeta temporal que luego sustituye a la anterior, con el manifiesto escrito al
+   final: una etapa interrumpida a medias nunca queda como válida.
+3. Al reanudar, una etapa se recupera si su manifiesto tiene la misma clave y están
+   todos sus archivos. Si se recalcula, las etapas que dependen de ella también.
+
+ESTRUCTURA (una carpeta por etapa; cada proceso conserva el último punto de cada etapa):
+    <resultados>/puntos_control/<proceso>/<etapa>/manifiesto.json
+    <resultados>/puntos_control/<proceso>/<etapa>/<nombre>.arrow
+"""
+
+import os
+import json
+import shutil
+import hashlib
+from datetime import datetime
+
+import pandas as pd
+
+from utilidades_cartera import guardar_dataframe_ipc, cargar_dataframe_ipc, hash_archivo
+from bitacora import obtener_logger
+
+log = obtener_logger(__name__)
+
+CARPETA_PUNTOS_CONTROL = 'puntos_control'
+NOMBRE_MANIFIESTO = 'manifiesto.json'
+
+# Cambiar al modificar el cálculo de una etapa para invalidar los puntos guardados
+VERSION_PUNTOS_CONTROL = 1
+
+# Nombre del único DataFrame de una etapa que no devuelve un diccionario
+NOMBRE_UNICO = 'datos'
+
+def iniciar_puntos_control(directorio, archivos, parametros=None, reanudar=False):
+    """
+    Contexto de puntos de control de una ejecución. archivos (nombre -> ruta) se
+    identifican por su contenido; parametros se incluyen en la clave de todas las etapas.
+    """
+    return {
+        'directorio': directorio,
+        'digests': {nombre: hash_archivo(ruta) for nombre, ruta in archivos.items()},
+        'parametros': parametros or {},
+        'reanudar': reanudar,
+        'claves': {},
+        'recalculadas': set(),
+        'recuperadas': []
+    }
+
+def clave_etapa(contexto, etapa, archivos=(), dependencias=(), parametros=None):
+    """Clave de la etapa: archivos de entrada, parámetros y claves de sus dependencias"""
+    contenido = {
+        'version': VERSION_PUNTOS_CONTROL,
+        'etapa': etapa,
+        'archivos': {nombre: contexto['digests'][nombre] for nombre in archivos},
+        'parametros': {**contexto['parametros'], **(parametros or {})},
+        'dependencias': {dep: contexto['claves'][dep] for dep in dependencias}
+    }
+    return hashlib.sha256(json.dumps(contenido, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+def cargar_punto_control(directorio, clave):
+    """DataFrames del punto de control si su manifiesto tiene la clave indicada; si no, None"""
+    ruta_manifiesto = os.path.join(directorio, NOMBRE_MANIFIESTO)
+    if not os.path.exists(ruta_manifiesto):
+        return None
+    try:
+        with open(ruta_manifiesto, 'r', encoding='utf-8') as f:
+            manifiesto = json.load(f)
+        if manifiesto.get('clave') != clave:
+            return None
+        return {nombre: cargar_dataframe_ipc(os.path.join(directorio, f'{nombre}.arrow'))
+                for nombre in manifiesto['tablas']}
+    except Exception as e:
+        log.warning(f"Punto de control no válido en {directorio}: {e}")
+        return None
+
+def guardar_punto_control(directorio, clave, tablas, etapa=None):
+    """Guarda los DataFrames de una etapa reemplazando de forma atómica el punto anterior"""
+    temporal = f'{directorio}.tmp-{os.getpid()}'
+    shutil.rmtree(temporal, ignore_errors=True)
+    os.makedirs(temporal)
+    for nombre, df in tablas.items():
+        guardar_dataframe_ipc(df, os.path.join(temporal, f'{nombre}.arrow'))
+    with open(os.path.join(temporal, NOMBRE_MANIFIESTO), 'w', encoding='utf-8') as f:
+        json.dump({
+            'etapa': etapa,
+            'clave': clave,
+            'tablas': list(tablas),
+            'registros': {nombre: len(df) for nombre, df in tablas.items()},
+            'fecha': datetime.now().isoformat()
+        }, f, indent=2, ensure_ascii=False)
+    shutil.rmtree(directorio, ignore_errors=True)
+    os.replace(temporal, directorio)
+    return directorio
+
+def recuperar_etapa(contexto, etapa, archivos=(), dependencias=(), parametros=None):
+    """
+    Registra la clave de la etapa y, al reanudar, devuelve su resultado guardado si sigue
+    siendo válido y ninguna de sus dependencias se ha recalculado. Si no, None.
+    """
+    clave = clave_etapa(contexto, etapa, archivos, dependencias, parametros)
+    contexto['claves'][etapa] = clave
+    if not contexto['reanudar'] or any(dep in contexto['recalculadas'] for dep in dependencias):
+        return None
+    tablas = cargar_punto_control(os.path.join(contexto['directorio'], etapa), clave)
+    if tablas is None:
+        log.info(f"Etapa {etapa}: sin punto de control válido, se recalcula")
+        return None
+    log.info(f"Etapa {etapa} recuperada del punto de control")
+    contexto['recuperadas'].append(etapa)
+    return tablas[NOMBRE_UNICO] if list(tablas) == [NOMBRE_UNICO] else tablas
+
+def registrar_etapa(contexto, etapa, resultado):
+    """
+    Marca la etapa como recalculada y guarda su resultado (DataFrame o diccionario de
+    DataFrames). Un fallo al guardar no detiene el procesamiento.
+    """
+    contexto['recalculadas'].add(etapa)
+    tablas = {NOMBRE_UNICO: resultado} if isinstance(resultado, pd.DataFrame) else resultado
+    try:
+        guardar_punto_control(os.path.join(contexto['directorio'], etapa), contexto['claves'][etapa],
+                              tablas, etapa)
+    except Exception as e:
+        log.warning(f"No se pudo guardar el punto de control de la etapa {etapa}: {e}")
+    return resultado
+
+def ejecutar_etapa(contexto, etapa, funcion, *args, archivos=(), dependencias=(), parametros=None, **kwargs):
+    """Resultado de la etapa desde su punto de control o, si no es válido, calculándolo y guardándolo"""
+    resultado = recuperar_etapa(contexto, etapa, archivos, dependencias, parametros)
+    if resultado is not None:
+        return resultado
+    return registrar_etapa(contexto, etapa, funcion(*args, **kwargs))
@@ -0,0 +1,183 @@
+# -*- coding: utf-8 -*-
+"""
+REGISTRO DE ESQUEMAS DE EXPORTACIONES PISA - GRUPO PLANETA
+
+Identifica qué exportación de Pisa es un archivo a partir de su encabezado y valida
+columnas requeridas y tipos sobre una muestra pequeña, antes de cargar el archivo completo.
+
+PROCESO:
+1. Detectar el formato del archivo (Excel o texto) sin parsearlo
+2. Leer solo el encabezado y una muestra de filas
+3. Calcular la huella del encabezado e identificar el esquema registrado
+4. Validar columnas requeridas y tipos de la muestra
+5. Rechazar el archivo o devolver el esquema para enrutar el procesamiento
+"""
+
+import hashlib
+import json
+import re
+import sys
+
+from utilidades_cartera import detectar_formato_archivo, leer_archivo_tabular
+
+# Esquemas conocidos. Cada uno declara el encabezado completo de la exportación (para la
+# identificación exacta por huella), sus columnas requeridas y opcionales y el tipo
+# esperado de algunas columnas.
+ESQUEMAS = {
+    'PROVCA': {
+        'descripcion': 'Provisión de cartera Pisa (columnas PC*)',
+        'encabezado': ['PCCDEM', 'PCCDAC', 'PCDEAC', 'PCCDAG', 'PCNMAG', 'PCCDCO', 'PCNMCO', 'PCCDCL',
+                       'PCCDDN', 'PCNMCL', 'PCNMCM', 'PCNMDO', 'PCTLF1', 'PCNMPO', 'PCNUFC', 'PCORPD',
+                       'PCFEFA', 'PCFEVE', 'PCVAFA', 'PCSALD', 'PCIMCO'],
+        'columnas_requeridas': ['PCCDEM', 'PCCDAC', 'PCCDCL', 'PCNUFC', 'PCFEVE', 'PCSALD'],
+        'columnas_opcionales': ['PCDEAC', 'PCCDAG', 'PCNMAG', 'PCCDCO', 'PCNMCO', 'PCCDDN', 'PCNMCL',
+                                'PCNMCM', 'PCNMDO', 'PCTLF1', 'PCNMPO', 'PCORPD', 'PCFEFA', 'PCVAFA',
+                                'PCIMCO'],
+        'tipos': {'PCFEVE': 'fecha', 'PCFEFA': 'fecha', 'PCSALD': 'numero', 'PCVAFA': 'numero',
+                  'PCCDAC': 'entero'}
+    },
+    'ANTICI': {
+        'descripcion': 'Anticipos Pisa (columnas NC*/WW*)',
+        'encabezado': ['NCCDEM', 'NCCDAC', 'NCCDCL', 'WWNIT', 'WWNMCL', 'WWNMDO', 'WWTLF1', 'WWNMPO',
+                       'CCCDFB', 'BDNMNM', 'BDNMPA', 'NCMOMO', 'NCCDR3', 'NCIMAN', 'NCFEGR'],
+        'columnas_requeridas': ['NCCDEM', 'NCCDAC', 'NCCDCL', 'NCIMAN', 'NCFEGR'],
+        'columnas_opcionales': ['WWNIT', 'WWNMCL', 'WWNMDO', 'WWTLF1', 'WWNMPO', 'CCCDFB', 'BDNMNM',
+                                'BDNMPA', 'NCMOMO', 'NCCDR3'],
+        'tipos': {'NCIMAN': 'numero', 'NCFEGR': 'fecha', 'NCCDAC': 'entero'}
+    },
+    'CARTERA_NOMBRES': {
+        'descripcion': 'Cartera con columnas ya renombradas (EMPRESA, SALDO, FECHA VTO...)',
+        'encabezado': ['EMPRESA', 'ACTIVIDAD', 'CODIGO AGENTE', 'AGENTE', 'CODIGO COBRADOR', 'COBRADOR',
+                       'CODIGO CLIENTE', 'IDENTIFICACION', 'NOMBRE', 'DENOMINACION COMERCIAL',
+                       'DIRECCION', 'TELEFONO', 'CIUDAD', 'NUMERO FACTURA', 'TIPO', 'FECHA',
+                       'FECHA VTO', 'VALOR', 'SALDO'],
+        'columnas_requeridas': ['EMPRESA', 'ACTIVIDAD', 'CODIGO CLIENTE', 'NUMERO FACTURA',
+                                'FECHA VTO', 'SALDO'],
+        'columnas_opcionales': ['CODIGO AGENTE', 'AGENTE', 'CODIGO COBRADOR', 'COBRADOR',
+                                'IDENTIFICACION', 'NOMBRE', 'DENOMINACION COMERCIAL', 'DIRECCION',
+                                'TELEFONO', 'CIUDAD', 'TIPO', 'FECHA', 'VALOR'],
+        'tipos': {'FECHA VTO': 'fecha', 'SALDO': 'numero'}
+    }
+}
+
+# Filas de muestra leídas para validar tipos
+FILAS_MUESTRA = 200
+
+# Proporción mínima de valores no vacíos de la muestra que deben tener el tipo esperado
+UMBRAL_TIPO_VALIDO = 0.95
+
+PATRONES_TIPO = {
+    'fecha': re.compile(r'^\d{8}(\.0+)?$'),
+    'numero': re.compile(r'^-?[\d.,]+-?$'),
+    'entero': re.compile(r'^-?\d+(\.0+)?$')
+}
+
+class ErrorEsquema(ValueError):
+    """El archivo no corresponde a ningún esquema aceptado o su muestra no es válida"""
+
+def normalizar_columna(columna):
+    """Normaliza un nombre de columna para compararlo (sin espacios sobrantes, mayúsculas)"""
+    columna = str(columna).strip().upper()
+    return columna.replace('DENOMINACIÓN', 'DENOMINACION')
+
+def huella_encabezado(columnas):
+    """Huella del encabezado: hash corto de los nombres de columna normalizados en orden"""
+    texto = '|'.join(normalizar_columna(c) for c in columnas)
+    return hashlib.sha1(texto.encode('utf-8')).hexdigest()[:16]
+
+# Huellas de los encabezados completos de cada esquema (identificación exacta en O(1))
+HUELLAS_CONOCIDAS = {huella_encabezado(esq['encabezado']): nombre for nombre, esq in ESQUEMAS.items()}
+
+def identificar_esquema(columnas):
+    """
+    Identifica el esquema de un encabezado. Primero busca la huella exacta; si no coincide,
+    elige el esquema con más columnas requeridas presentes.
+    Devuelve un diccionario con 'esquema' (None si no hay candidato), 'huella',
+    'exacta' y 'faltantes' (columnas requeridas ausentes del mejor candidato).
+    """
+    huella = huella_encabezado(columnas)
+    if huella in HUELLAS_CONOCIDAS:
+        return {'esquema': HUELLAS_CONOCIDAS[huella], 'huella': huella, 'exacta': True, 'faltantes': []}
+
+    presentes = {normalizar_columna(c) for c in columnas}
+    mejor, mejor_faltantes, mejor_cobertura = None, [], 0.0
+    for nombre, esq in ESQUEMAS.items():
+        requeridas = esq['columnas_requeridas']
+        faltantes = [c for c in requeridas if c not in presentes]
+        cobertura = 1 - len(faltantes) / len(requeridas)
+        if cobertura > mejor_cobertura:
+            mejor, mejor_faltantes, mejor_cobertura = nombre, faltantes, cobertura
+
+    if mejor is not None and mejor_faltantes:
+        return {'esquema': None, 'candidato': mejor, 'huella': huella, 'exacta': False,
+                'faltantes': mejor_faltantes}
+    return {'esquema': mejor, 'huella': huella, 'exacta': False, 'faltantes': []}
+
+def validar_muestra(df_muestra, nombre_esquema):
+    """Valida los tipos de las columnas declaradas del esquema sobre la muestra; devuelve los errores"""
+    errores = []
+    columnas = {normalizar_columna(c): c for c in df_muestra.columns}
+
+    for columna, tipo in ESQUEMAS[nombre_esquema]['tipos'].items():
+        if columna not in columnas:
+            continue
+        valores = df_muestra[columnas[columna]].dropna().astype(str).str.strip()
+        valores = valores[valores != '']
+        if valores.empty:
+            continue
+        validos = valores.str.match(PATRONES_TIPO[tipo])
+        proporcion = validos.mean()
+        if proporcion < UMBRAL_TIPO_VALIDO:
+            ejemplos = valores[~validos].head(3).tolist()
+            errores.append(f"Columna {columna}: se esperaba tipo {tipo}, "
+                           f"{(1 - proporcion):.0%} de la muestra no lo cumple (p. ej. {ejemplos})")
+    return errores
+
+def validar_archivo_entrada(ruta, esquemas_aceptados=None, filas_muestra=FILAS_MUESTRA):
+    """
+    Validación previa de un archivo de entrada: detecta el formato, lee el encabezado y
+    una muestra, identifica el esquema y valida tipos.
+    Devuelve un diccionario con 'esquema', 'huella', 'formato' y 'columnas'.
+    Lanza ErrorEsquema si el esquema no se reconoce, no está entre los aceptados o
+    la muestra no cumple los tipos esperados.
+    """
+    formato = detectar_formato_archivo(ruta)
+    muestra = leer_archivo_tabular(ruta, formato=formato, nrows=filas_muestra)
+    muestra.columns = [str(c).strip() for c in muestra.columns]
+
+    identificacion = identificar_esquema(muestra.columns)
+    nombre = identificacion['esquema']
+
+    if nombre is None:
+        detalle = ''
+        if identificacion.get('candidato'):
+            detalle = (f" Parece {identificacion['candidato']} pero faltan las columnas: "
+                       f"{', '.join(identificacion['faltantes'])}.")
+        raise ErrorEsquema(f"Estructura de archivo no reconocida en {ruta}.{detalle}")
+
+    if esquemas_aceptados and nombre not in esquemas_aceptados:
+        raise ErrorEsquema(f"El archivo {ruta} es una exportación {nombre} "
+                           f"({ESQUEMAS[nombre]['descripcion']}); se esperaba: {', '.join(esquemas_aceptados)}")
+
+    errores = validar_muestra(muestra, nombre)
+    if errores:
+        raise ErrorEsquema(f"El archivo {ruta} ({nombre}) no supera la validación de tipos: " + '; '.join(errores))
+
+    return {
+        'esquema': nombre,
+        'huella': identificacion['huella'],
+        'exacta': identificacion['exacta'],
+        'formato': formato,
+        'columnas': list(muestra.columns)
+    }
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        try:
+            info = validar_archivo_entrada(sys.argv[1])
+            print(json.dumps(info, ensure_ascii=False, indent=2))
+        except (ErrorEsquema, ValueError, FileNotFoundError) as e:
+            print(json.dumps({'esquema': None, 'error': str(e)}, ensure_ascii=False, indent=2))
+            sys.exit(1)
+    else:
+        print("Uso: python registro_esquemas.py <ruta_archivo>")
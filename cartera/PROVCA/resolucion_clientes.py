@@ -0,0 +1,331 @@
+# -*- coding: utf-8 -*-
+"""
+RESOLUCIÓN DE CLIENTES - GRUPO PLANETA
+
+Asigna a cada registro una clave canónica de cliente (CLAVE CLIENTE) y un nombre
+canónico (CLIENTE CANONICO), de modo que un mismo cliente escrito de formas distintas
+en varias EMPRESAS o en los anticipos se agregue como uno solo.
+
+PROCESO:
+1. Normalizar en bloque nombres (tildes, puntuación, sufijos societarios como S.A.S.)
+   e identificaciones (solo dígitos, sin dígito de verificación)
+2. Trabajar sobre los pares únicos nombre + identificación, no sobre las filas
+3. Unir los que comparten identificación
+4. Índice de bloques por trigramas y palabras: cada nombre solo se indexa por sus
+   trigramas más raros (filtro de prefijo) y sus palabras, sin bloques demasiado
+   grandes, así que solo se comparan nombres que comparten alguna clave y nunca todos
+   contra todos
+5. Candidatos con similitud de trigramas >= UMBRAL_SIMILITUD y los mismos números: un
+   registro sin identificación se une al cliente de la única identificación de su grupo de
+   similitud; si el grupo no tiene ninguna se une a los demás nombres similares sin
+   identificación, y si tiene varias queda aparte. Nunca se unen dos identificaciones distintas
+6. Clave canónica por grupo: la identificación más frecuente o, si no hay, el nombre normalizado
+"""
+
+import re
+import sys
+import json
+
+import numpy as np
+import pandas as pd
+
+from utilidades_cartera import leer_archivo_tabular, extraer_opcion
+from bitacora import obtener_logger
+
+log = obtener_logger(__name__)
+
+# Similitud mínima (Jaccard de trigramas) para considerar dos nombres el mismo cliente
+UMBRAL_SIMILITUD = 0.8
+
+# Bloques del índice: los trigramas presentes en más nombres no se indexan (no discriminan)
+MAXIMO_BLOQUE = 500
+# Nombres por lote al cruzar el índice consigo mismo (limita la memoria de los pares)
+TAMANO_LOTE = 10000
+
+# Sufijos societarios que se eliminan del final del nombre (ya sin puntuación)
+SUFIJOS_LEGALES = [
+    'SOCIEDAD POR ACCIONES SIMPLIFICADA', 'SOCIEDAD ANONIMA', 'LIMITADA', 'EN LIQUIDACION',
+    'S EN C S', 'S EN C', 'Y CIA', 'CIA', 'SAS', 'SA', 'LTDA', 'SCA', 'SCS', 'EU', 'ESP', 'BIC'
+]
+PATRON_SUFIJOS = re.compile(r'(?:\s+(?:' + '|'.join(re.escape(s) for s in SUFIJOS_LEGALES) + r'))+$')
+
+# Columnas de nombre e identificación, en orden de preferencia
+COLUMNAS_NOMBRE = ['DENOMINACION COMERCIAL', 'NOMBRE', 'NOMBRE COMERCIAL']
+COLUMNAS_IDENTIFICACION = ['IDENTIFICACION', 'NIT/CEDULA']
+
+# Columnas que se añaden a cada registro
+COLUMNA_CLAVE = 'CLAVE CLIENTE'
+COLUMNA_CANONICO = 'CLIENTE CANONICO'
+
+def normalizar_nombres(serie):
+    """Nombre comparable: mayúsculas sin tildes ni puntuación y sin sufijo societario"""
+    texto = (serie.fillna('').astype(str).str.upper()
+             .str.normalize('NFKD').str.encode('ascii', errors='ignore').str.decode('ascii'))
+    # Las siglas con puntos se juntan (S.A.S. -> SAS) antes de quitar la puntuación
+    texto = texto.str.replace(r'(?<=\b[A-Z])\.(?=[A-Z]\b)', '', regex=True).str.replace('.', '', regex=False)
+    texto = texto.str.replace(r'[^A-Z0-9&]+', ' ', regex=True).str.replace('&', ' Y ', regex=False)
+    texto = texto.str.replace(r'\s+', ' ', regex=True).str.strip()
+    return texto.str.replace(PATRON_SUFIJOS, '', regex=True).str.strip()
+
+def normalizar_identificaciones(serie):
+    """Identificación comparable: solo dígitos, sin '.0' de lectura numérica ni dígito de verificación"""
+    texto = serie.fillna('').astype(str).str.strip().str.replace(r'\.0+$', '', regex=True)
+    texto = texto.str.replace(r'-\s*\d$', '', regex=True)
+    texto = texto.str.replace(r'\D', '', regex=True).str.lstrip('0')
+    return texto
+
+def _primera_columna(df, candidatas):
+    """Primera columna candidata presente en el DataFrame (None si no hay ninguna)"""
+    return next((c for c in candidatas if c in df.columns), None)
+
+def _trigramas(nombres):
+    """
+    Trigramas de cada nombre normalizado (ASCII, con bordes) codificados como enteros.
+    Devuelve (ids, codigos) ordenados por id y código, sin repetidos dentro de un nombre.
+    """
+    textos = np.array([f' {nombre} ' for nombre in nombres], dtype=bytes)
+    ancho = textos.dtype.itemsize
+    caracteres = textos.view(np.uint8).reshape(len(textos), ancho).astype(np.int64)
+    codigos = (caracteres[:, :-2] << 16) | (caracteres[:, 1:-1] << 8) | caracteres[:, 2:]
+    validos = np.arange(ancho - 2)[None, :] < (np.char.str_len(textos) - 2)[:, None]
+    claves = np.unique((np.nonzero(validos)[0].astype(np.int64) << 24) | codigos[validos])
+    return claves >> 24, claves & 0xFFFFFF
+
+def _componentes(n, origen, destino):
+    """Componente conexo de cada nodo (etiqueta = menor nodo del grupo) por propagación de etiquetas"""
+    etiquetas = np.arange(n)
+    if len(origen) == 0:
+        return etiquetas
+    while True:
+        minimo = np.minimum(etiquetas[origen], etiquetas[destino])
+        nuevas = etiquetas.copy()
+        np.minimum.at(nuevas, origen, minimo)
+        np.minimum.at(nuevas, destino, minimo)
+        nuevas = nuevas[nuevas]  # salto de punteros: acorta las cadenas de etiquetas
+        if np.array_equal(nuevas, etiquetas):
+            return etiquetas
+        etiquetas = nuevas
+
+def pares_candidatos(nombres, umbral=UMBRAL_SIMILITUD):
+    """
+    Pares de nombres (posiciones en nombres) con similitud de trigramas >= umbral.
+    Filtro de prefijo: con los trigramas ordenados del más raro al más común, dos nombres
+    con Jaccard >= umbral comparten al menos uno de los |t| - ceil(umbral * |t|) + 1
+    primeros trigramas de cada uno; solo esos se indexan. Los candidatos se filtran por
+    longitud antes de verificar la similitud exacta.
+    """
+    vacio = np.empty(0, dtype=np.int64)
+    if len(nombres) == 0:
+        return vacio, vacio
+    ids, codigos = _trigramas(nombres)
+    claves = (ids << 24) | codigos
+    tamanos = np.bincount(ids, minlength=len(nombres))
+
+    # Orden de rareza: frecuencia global del trigrama y, a igualdad, su código
+    unicos, inversa, frecuencias = np.unique(codigos, return_inverse=True, return_counts=True)
+    frecuencia = frecuencias[inversa]
+    orden = np.lexsort((codigos, frecuencia, ids))
+    inicio = np.concatenate([[0], np.cumsum(tamanos)[:-1]])
+    posicion = np.arange(len(orden)) - inicio[ids[orden]]
+    prefijo = tamanos - np.ceil(umbral * tamanos - 1e-9).astype(np.int64) + 1
+    en_prefijo = (posicion < prefijo[ids[orden]]) & (frecuencia[orden] <= MAXIMO_BLOQUE)
+    indice = pd.DataFrame({'ID': ids[orden][en_prefijo], 'CLAVE': codigos[orden][en_prefijo],
+                           'POSICION': posicion[en_prefijo]})
+
+    # Segunda clave de bloque: palabras completas (recupera los nombres cuyos trigramas
+    # de prefijo son todos demasiado frecuentes para indexarse)
+    palabras = pd.Series(list(nombres)).str.split(' ').explode()
+    palabras = palabras[palabras.str.len() >= 4]
+    indice_palabras = pd.DataFrame({
+        'ID': palabras.index.to_numpy(np.int64),
+        'CLAVE': (pd.util.hash_array(palabras.to_numpy(dtype=object)) >> np.uint64(3)).astype(np.int64) | (1 << 60),
+        'POSICION': 0
+    }).drop_duplicates(['ID', 'CLAVE'])
+    indice_palabras = indice_palabras[indice_palabras.groupby('CLAVE')['ID'].transform('size') <= MAXIMO_BLOQUE]
+    indice = pd.concat([indice, indice_palabras], ignore_index=True)
+
+    resultado_a, resultado_b = [vacio], [vacio]
+    for desde in range(0, len(nombres), TAMANO_LOTE):
+        # Bloques: nombres del lote que comparten un trigrama de prefijo con cualquier otro
+        lote = indice[(indice['ID'] >= desde) & (indice['ID'] < desde + TAMANO_LOTE)]
+        pares = lote.merge(indice, on='CLAVE', suffixes=('_A', '_B'))
+        pares = pares[pares['ID_A'].to_numpy() < pares['ID_B'].to_numpy()]
+
+        # Filtro de longitud: Jaccard >= umbral exige umbral <= |A| / |B| <= 1 / umbral
+        tamano_a, tamano_b = tamanos[pares['ID_A'].to_numpy()], tamanos[pares['ID_B'].to_numpy()]
+        pares = pares[(tamano_b >= umbral * tamano_a) & (tamano_a >= umbral * tamano_b)]
+
+        # Filtro de posición: el primer trigrama común (en el orden de rareza) está en las
+        # posiciones i y j, así que |A ∩ B| <= min(|A| - i, |B| - j) (las palabras cuentan como 0)
+        pares = pares.groupby(['ID_A', 'ID_B'], sort=False)[['POSICION_A', 'POSICION_B']].min().reset_index()
+        a, b = pares['ID_A'].to_numpy(), pares['ID_B'].to_numpy()
+        cota = np.minimum(tamanos[a] - pares['POSICION_A'].to_numpy(), tamanos[b] - pares['POSICION_B'].to_numpy())
+        posible = cota * (1 + umbral) >= umbral * (tamanos[a] + tamanos[b]) - 1e-9
+        a, b = a[posible], b[posible]
+        if len(a) == 0:
+            continue
+
+        # Verificación exacta: cada trigrama de A se busca entre los de B (claves ordenadas)
+        par = np.repeat(np.arange(len(a)), tamanos[a])
+        desplazamiento = np.arange(len(par)) - np.repeat(np.cumsum(tamanos[a]) - tamanos[a], tamanos[a])
+        buscadas = (b[par] << 24) | codigos[inicio[a][par] + desplazamiento]
+        encontradas = np.searchsorted(claves, buscadas)
+        encontradas = claves[np.minimum(encontradas, len(claves) - 1)] == buscadas
+        comunes = np.bincount(par, weights=encontradas, minlength=len(a))
+
+        # |A ∩ B| >= umbral * |A ∪ B|  <=>  |A ∩ B| * (1 + umbral) >= umbral * (|A| + |B|)
+        similares = comunes * (1 + umbral) >= umbral * (tamanos[a] + tamanos[b]) - 1e-9
+        resultado_a.append(a[similares])
+        resultado_b.append(b[similares])
+    return np.concatenate(resultado_a), np.concatenate(resultado_b)
+
+def construir_resolucion(marcos, umbral=UMBRAL_SIMILITUD):
+    """
+    Tabla de resolución a partir de uno o varios DataFrames: una fila por par único
+    nombre normalizado + identificación, con su CLAVE CLIENTE y CLIENTE CANONICO.
+    """
+    partes = []
+    for df in marcos:
+        columna_nombre = _primera_columna(df, COLUMNAS_NOMBRE)
+        columna_id = _primera_columna(df, COLUMNAS_IDENTIFICACION)
+        partes.append(pd.DataFrame({
+            'NOMBRE ORIGINAL': df[columna_nombre].fillna('').astype(str).str.strip() if columna_nombre
+            else pd.Series('', index=df.index),
+            'ID': normalizar_identificaciones(df[columna_id]) if columna_id else pd.Series('', index=df.index)
+        }))
+    registros = pd.concat(partes, ignore_index=True)
+    if registros.empty:
+        # Sin filas no hay clientes que resolver (el procesador informa del archivo vacío)
+        return pd.DataFrame(columns=['NOMBRE', 'ID', COLUMNA_CLAVE, COLUMNA_CANONICO])
+
+    # Normalización sobre los nombres distintos, no sobre cada fila
+    originales = registros['NOMBRE ORIGINAL'].drop_duplicates()
+    registros['NOMBRE'] = registros['NOMBRE ORIGINAL'].map(
+        pd.Series(normalizar_nombres(originales).to_numpy(), index=originales.to_numpy()))
+
+    # Entidades: pares únicos nombre normalizado + identificación, con su número de filas
+    entidades = registros.groupby(['NOMBRE', 'ID'], sort=False).size().rename('FILAS').reset_index()
+    n = len(entidades)
+    origen, destino = [], []
+
+    # Misma identificación
+    con_id = entidades[entidades['ID'] != ''].reset_index()
+    origen.append(con_id['index'].to_numpy())
+    destino.append(con_id.groupby('ID')['index'].transform('first').to_numpy())
+    primera_por_id = con_id.groupby('ID')['index'].first()
+
+    # Nombres similares (incluidos los idénticos) con números iguales
+    nombres = entidades['NOMBRE'].drop_duplicates()
+    nombres = nombres[nombres.str.len() >= 3]
+    a, b = pares_candidatos(nombres.tolist(), umbral)
+    numeros = nombres.str.findall(r'\d+').str.join(' ').to_numpy()
+    mismos_numeros = numeros[a] == numeros[b]
+    a, b = a[mismos_numeros], b[mismos_numeros]
+    todos = np.arange(len(nombres))
+    vecinos = pd.DataFrame({'POSICION': np.concatenate([todos, a, b]), 'VECINO': np.concatenate([todos, b, a])})
+
+    # Identificaciones distintas del grupo de similitud de cada nombre (un par por vecino,
+    # sin cruzar el grupo consigo mismo)
+    posicion = entidades['NOMBRE'].map(pd.Series(todos, index=nombres.to_numpy()))
+    indexados = posicion.notna()
+    ids_nombre = pd.DataFrame({'VECINO': posicion[indexados & (entidades['ID'] != '')].astype(np.int64),
+                               'ID': entidades.loc[indexados & (entidades['ID'] != ''), 'ID']})
+    ids_grupo = vecinos.merge(ids_nombre, on='VECINO')[['POSICION', 'ID']].drop_duplicates()
+    ids_grupo = ids_grupo.groupby('POSICION')['ID'].agg(['nunique', 'first'])
+
+    # Sin identificación: al cliente de la única identificación del grupo; si el grupo no
+    # tiene ninguna, con los nombres similares también sin ella; con varias, aparte
+    sin_id = pd.Series(entidades.index[indexados & (entidades['ID'] == '')],
+                       index=posicion[indexados & (entidades['ID'] == '')].astype(np.int64).to_numpy())
+    unica = ids_grupo[ids_grupo['nunique'] == 1]
+    unidas = sin_id[sin_id.index.isin(unica.index)]
+    origen.append(unidas.to_numpy())
+    destino.append(primera_por_id.loc[unica.loc[unidas.index, 'first']].to_numpy())
+    sueltas = sin_id[~sin_id.index.isin(ids_grupo.index)]
+    entre_sueltas = np.isin(a, sueltas.index) & np.isin(b, sueltas.index)
+    origen.append(sueltas.loc[a[entre_sueltas]].to_numpy())
+    destino.append(sueltas.loc[b[entre_sueltas]].to_numpy())
+
+    entidades['GRUPO'] = _componentes(n, np.concatenate(origen).astype(np.int64),
+                                      np.concatenate(destino).astype(np.int64))
+
+    # Clave canónica: identificación más frecuente del grupo o, si no tiene, su nombre más frecuente
+    ordenadas = entidades.sort_values(['GRUPO', 'FILAS'], ascending=[True, False], kind='mergesort')
+    nombre_grupo = ordenadas.groupby('GRUPO')['NOMBRE'].first()
+    id_grupo = ordenadas[ordenadas['ID'] != ''].groupby('GRUPO')['ID'].first()
+    clave = ('NOM ' + nombre_grupo).where(~nombre_grupo.index.isin(id_grupo.index), id_grupo.reindex(nombre_grupo.index))
+    entidades[COLUMNA_CLAVE] = entidades['GRUPO'].map(clave)
+
+    # Nombre canónico: el nombre original más frecuente del grupo
+    registros = registros.merge(entidades[['NOMBRE', 'ID', 'GRUPO']], on=['NOMBRE', 'ID'], how='left')
+    canonico = (registros.groupby(['GRUPO', 'NOMBRE ORIGINAL']).size().rename('FILAS').reset_index()
+                .sort_values(['GRUPO', 'FILAS'], ascending=[True, False], kind='mergesort')
+                .groupby('GRUPO')['NOMBRE ORIGINAL'].first())
+    entidades[COLUMNA_CANONICO] = entidades['GRUPO'].map(canonico)
+
+    log.info(f"Clientes resueltos: {entidades['GRUPO'].nunique()} a partir de {n} variantes de nombre e identificación")
+    return entidades.drop(columns=['FILAS', 'GRUPO'])
+
+def aplicar_resolucion(df, resolucion):
+    """Añade CLAVE CLIENTE y CLIENTE CANONICO a un DataFrame (en el mismo objeto) y lo devuelve"""
+    if df.empty:
+        df[COLUMNA_CLAVE] = pd.Series(dtype=object)
+        df[COLUMNA_CANONICO] = pd.Series(dtype=object)
+        return df
+    columna_nombre = _primera_columna(df, COLUMNAS_NOMBRE)
+    columna_id = _primera_columna(df, COLUMNAS_IDENTIFICACION)
+    nombre = df[columna_nombre].fillna('').astype(str).str.strip() if columna_nombre else pd.Series('', index=df.index)
+    originales = nombre.drop_duplicates()
+    claves = pd.DataFrame({
+        'NOMBRE': nombre.map(pd.Series(normalizar_nombres(originales).to_numpy(), index=originales.to_numpy())),
+        'ID': normalizar_identificaciones(df[columna_id]) if columna_id else pd.Series('', index=df.index)
+    })
+    resuelto = claves.merge(resolucion, on=['NOMBRE', 'ID'], how='left')
+    df[COLUMNA_CLAVE] = resuelto[COLUMNA_CLAVE].to_numpy()
+    df[COLUMNA_CANONICO] = resuelto[COLUMNA_CANONICO].to_numpy()
+    return df
+
+def resolver_clientes(marcos, umbral=UMBRAL_SIMILITUD):
+    """
+    Resuelve los clientes de varios DataFrames a la vez (p. ej. provisión y anticipos) para
+    que compartan claves. Las columnas se añaden en los mismos objetos; devuelve la tabla
+    de resolución.
+    """
+    log.info("Resolviendo clientes...")
+    resolucion = construir_resolucion(marcos, umbral)
+    for df in marcos:
+        aplicar_resolucion(df, resolucion)
+    return resolucion
+
+def clave_agrupacion(df):
+    """Clave de cliente para agregaciones: CLAVE CLIENTE si el DataFrame ya está resuelto"""
+    if COLUMNA_CLAVE in df.columns:
+        return df[COLUMNA_CLAVE].fillna('').astype(str)
+    return None
+
+if __name__ == "__main__":
+    # python resolucion_clientes.py <archivo> [<archivo> ...] [--umbral 0.8]
+    umbral, argumentos = extraer_opcion(sys.argv[1:], '--umbral', UMBRAL_SIMILITUD)
+    umbral = float(umbral)
+
+    if argumentos:
+        from procesador_cartera import MAPEO_PROVISION
+        from procesador_anticipos import alinear_anticipos_antici, MAPEO_ANTICIPOS_ANTICI
+        marcos = []
+        for ruta in argumentos:
+            df = leer_archivo_tabular(ruta)
+            if any(c in MAPEO_ANTICIPOS_ANTICI for c in df.columns):
+                df = alinear_anticipos_antici(df)
+            else:
+                df = df.rename(columns=MAPEO_PROVISION)
+                df = df.loc[:, ~df.columns.duplicated()]
+            marcos.append(df)
+        resolucion = construir_resolucion(marcos, umbral)
+        agrupadas = resolucion.groupby(COLUMNA_CLAVE).filter(lambda g: len(g) > 1)
+        print(json.dumps({
+            'variantes': len(resolucion),
+            'clientes': int(resolucion[COLUMNA_CLAVE].nunique()),
+            'unificados': agrupadas.groupby(COLUMNA_CLAVE)['NOMBRE'].apply(list).to_dict()
+        }, indent=2, ensure_ascii=False))
+    else:
+        print("Uso: python resolucion_clientes.py <archivo> [<archivo> ...] [--umbral 0.8]")
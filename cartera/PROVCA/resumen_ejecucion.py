@@ -0,0 +1,193 @@
+# -*- coding: utf-8 -*-
+"""
+RESUMEN DE EJECUCIÓN - GRUPO PLANETA
+
+Resumen estructurado (JSON) que cada procesador guarda junto a su archivo de salida:
+totales de saldo por rango de vencimiento, dotación, principales deudores, conteo de
+errores de validación, tiempos de cada etapa y rutas generadas. Se calcula sobre el
+resultado tipado que el procesador ya tiene en memoria, de modo que las páginas PHP
+obtienen los resultados sin volver a leer el Excel generado.
+
+ESTRUCTURA (junto al Excel generado):
+    CARTERA_PROCESADA_<fecha>.xlsx
+    CARTERA_PROCESADA_<fecha>_resumen.json
+"""
+
+import os
+import sys
+import json
+import time
+from datetime import datetime
+
+import pandas as pd
+
+from almacen_historico import preparar_corte_historico
+from bitacora import obtener_logger, resumen_errores
+
+log = obtener_logger(__name__)
+
+# Número de deudores del ranking
+TOP_DEUDORES = 20
+
+# Rangos de vencimiento del resumen (mismos nombres que VENCIMIENTOS_RANGOS)
+RANGOS_RESUMEN = ['SALDO NO VENCIDO', 'VENCIDO 30', 'VENCIDO 60', 'VENCIDO 90',
+                  'VENCIDO 180', 'VENCIDO 360', 'VENCIDO + 360']
+
+# Columnas de validación de cada procesador: texto 'ERROR' (cartera) o diferencia numérica (formato deuda)
+COLUMNAS_VALIDACION = {
+    'suma_saldos': ['Verificación Suma Saldos', 'VALIDACION_SALDO'],
+    'vencimientos': ['Validación Vencimientos', 'VALIDACION_VENCIMIENTOS']
+}
+
+SUFIJO_RESUMEN = '_resumen.json'
+
+def iniciar_cronometro():
+    """Cronómetro de etapas: guarda la duración de cada etapa desde la marca anterior"""
+    return {'inicio': time.perf_counter(), 'ultimo': time.perf_counter(), 'etapas': {}}
+
+def marcar_etapa(cronometro, nombre):
+    """Registra la duración (segundos) de la etapa que acaba de terminar"""
+    ahora = time.perf_counter()
+    cronometro['etapas'][nombre] = round(ahora - cronometro['ultimo'], 3)
+    cronometro['ultimo'] = ahora
+
+def tiempos_etapas(cronometro):
+    """Tiempos por etapa y total de la ejecución"""
+    return {
+        'etapas': dict(cronometro['etapas']),
+        'total': round(time.perf_counter() - cronometro['inicio'], 3)
+    }
+
+def _redondear(valor):
+    """Número JSON con dos decimales"""
+    return round(float(valor), 2)
+
+def contar_errores_validacion(df, corte=None):
+    """Registros que no superan cada validación del procesador y fechas de vencimiento no válidas"""
+    errores = {}
+    for nombre, candidatas in COLUMNAS_VALIDACION.items():
+        columna = next((c for c in candidatas if c in df.columns), None)
+        if columna is None:
+            continue
+        valores = df[columna]
+        if pd.api.types.is_numeric_dtype(valores):
+            errores[nombre] = int((valores.abs() >= 0.01).sum())
+        else:
+            errores[nombre] = int((valores == 'ERROR').sum())
+    if corte is not None and 'FECHA VTO' in corte.columns:
+        errores['fecha_vto_no_valida'] = int(corte['FECHA VTO'].isna().sum())
+    return errores
+
+def totales_por_rango(corte):
+    """
+    Saldo por rango de vencimiento: suma de las columnas de rango si el procesador ya
+    las calculó; si no, agrupación del saldo por el rango de sus días vencidos.
+    """
+    if all(rango in corte.columns for rango in RANGOS_RESUMEN):
+        return {rango: _redondear(corte[rango].sum()) for rango in RANGOS_RESUMEN}
+    if 'DIAS VENCIDO' not in corte.columns:
+        return {}
+
+    # Importación local: compensacion_anticipos depende de procesador_cartera
+    from compensacion_anticipos import rango_vencimiento
+    rangos = rango_vencimiento(corte['DIAS VENCIDO'].clip(lower=0))
+    totales = corte['SALDO'].groupby(rangos, sort=False).sum()
+    return {rango: _redondear(totales.get(rango, 0.0)) for rango in RANGOS_RESUMEN}
+
+def principales_deudores(corte, top=TOP_DEUDORES):
+    """
+    Clientes con mayor saldo (en valor absoluto, para que los anticipos también se ordenen),
+    agrupados por la clave canónica del cliente cuando el procesador la resolvió
+    """
+    if 'CLAVE CLIENTE' in corte.columns:
+        clave = corte['CLAVE CLIENTE']
+        nombres = corte['CLIENTE CANONICO'] if 'CLIENTE CANONICO' in corte.columns \
+            else corte.get('DENOMINACION COMERCIAL', pd.Series('', index=corte.index))
+    elif 'CODIGO CLIENTE' in corte.columns:
+        clave = corte['CODIGO CLIENTE'].where(corte['CODIGO CLIENTE'] != '', 'ID ' + corte.get('IDENTIFICACION', ''))
+        nombres = corte['DENOMINACION COMERCIAL'] if 'DENOMINACION COMERCIAL' in corte.columns \
+            else pd.Series('', index=corte.index)
+    else:
+        return []
+    agrupado = pd.DataFrame({'CLIENTE': clave, 'NOMBRE': nombres, 'SALDO': corte['SALDO']}) \
+        .groupby('CLIENTE', sort=False).agg(NOMBRE=('NOMBRE', 'first'), SALDO=('SALDO', 'sum'),
+                                            FACTURAS=('SALDO', 'size'))
+    agrupado = agrupado.loc[agrupado['SALDO'].abs().nlargest(top).index]
+    return [
+        {'cliente': cliente, 'nombre': fila['NOMBRE'], 'saldo': _redondear(fila['SALDO']),
+         'facturas': int(fila['FACTURAS'])}
+        for cliente, fila in agrupado.iterrows()
+    ]
+
+def resumir_resultado(df, top=TOP_DEUDORES):
+    """Agregados principales del resultado tipado de un procesador"""
+    corte = preparar_corte_historico(df)
+    if 'SALDO' not in corte.columns:
+        raise ValueError("El resultado no tiene columna SALDO; no se puede resumir")
+
+    resumen = {
+        'registros': len(corte),
+        'saldo_total': _redondear(corte['SALDO'].sum()),
+        'saldo_vencido': _redondear(corte['SALDO VENCIDO'].sum()) if 'SALDO VENCIDO' in corte.columns else None,
+        'dotacion': _redondear(corte['VALOR DOTACION'].sum()) if 'VALOR DOTACION' in corte.columns else None,
+        'saldo_por_rango': totales_por_rango(corte),
+        'saldo_por_empresa': {empresa: _redondear(valor)
+                              for empresa, valor in corte.groupby('EMPRESA', sort=True)['SALDO'].sum().items()},
+        'principales_deudores': principales_deudores(corte, top),
+        'errores_validacion': contar_errores_validacion(df, corte)
+    }
+    return resumen
+
+def construir_resumen(tipo, df, archivos, cronometro=None, fecha_cierre=None, **adicionales):
+    """
+    Resumen completo de una ejecución: agregados del resultado tipado (df), rutas
+    generadas (archivos), tiempos de etapa, errores de conversión acumulados y datos
+    adicionales del procesador.
+    """
+    resumen = {
+        'tipo': tipo,
+        'fecha_procesamiento': datetime.now().isoformat(),
+        'fecha_cierre': pd.Timestamp(fecha_cierre).strftime('%Y-%m-%d') if fecha_cierre is not None else None
+    }
+    if df is not None:
+        resumen.update(resumir_resultado(df))
+    resumen.update(adicionales)
+    errores_conversion = resumen_errores()
+    if errores_conversion:
+        resumen['errores_conversion'] = errores_conversion
+    resumen['archivos'] = {clave: ruta for clave, ruta in archivos.items() if ruta}
+    if cronometro is not None:
+        resumen['tiempos'] = tiempos_etapas(cronometro)
+    return resumen
+
+def guardar_resumen(resumen, output_path):
+    """Guarda el resumen junto al archivo de salida y devuelve su ruta"""
+    ruta = os.path.splitext(output_path)[0] + SUFIJO_RESUMEN
+    resumen.setdefault('archivos', {})['resumen'] = ruta
+    with open(ruta, 'w', encoding='utf-8') as f:
+        json.dump(resumen, f, indent=2, ensure_ascii=False, default=str)
+    log.info(f"Resumen de ejecución guardado: {ruta}")
+    return ruta
+
+def generar_resumen(tipo, df, output_path, archivos, cronometro=None, fecha_cierre=None, **adicionales):
+    """Construye y guarda el resumen; un fallo no detiene el procesamiento"""
+    try:
+        return guardar_resumen(
+            construir_resumen(tipo, df, archivos, cronometro, fecha_cierre, **adicionales), output_path
+        )
+    except Exception as e:
+        log.warning(f"No se pudo generar el resumen de ejecución: {e}")
+        return None
+
+def cargar_resumen(ruta):
+    """Carga un resumen guardado (acepta la ruta del resumen o la del archivo de salida)"""
+    if not ruta.endswith(SUFIJO_RESUMEN):
+        ruta = os.path.splitext(ruta)[0] + SUFIJO_RESUMEN
+    with open(ruta, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        print(json.dumps(cargar_resumen(sys.argv[1]), indent=2, ensure_ascii=False))
+    else:
+        print("Uso: python resumen_ejecucion.py <archivo_salida|archivo_resumen>")
@@ -0,0 +1,209 @@
+# -*- coding: utf-8 -*-
+"""
+SALIDA FRAGMENTADA POR COBRADOR O AGENTE - GRUPO PLANETA
+
+Divide el resultado de procesar_cartera en un libro por CODIGO COBRADOR o CODIGO AGENTE
+para enviarlo a los equipos de campo, con subtotales por cliente y el total del fragmento,
+más un índice con los fragmentos generados y sus totales.
+
+PROCESO:
+1. Cada fila recibe la clave normalizada de su cobrador o agente (vacía = SIN_CODIGO)
+2. Los fragmentos se reparten entre los procesos trabajadores de mayor a menor número de
+   filas, siempre al trabajador con menos filas; cada trabajador recibe sus filas como
+   archivo IPC de Arrow en un directorio temporal
+3. Cada trabajador escribe sus libros en modo de solo escritura: filas agrupadas por
+   cliente, una fila SUBTOTAL tras cada cliente y una fila TOTAL al final
+4. Los totales se calculan con los importes numéricos (no con el texto ya formateado) y
+   se muestran con el mismo formato colombiano que el resto del libro
+
+ESTRUCTURA (junto al Excel generado):
+    CARTERA_PROCESADA_<fecha>_cobrador/
+        COBRADOR_<codigo>.xlsx
+        ...
+        indice.json                      fragmentos, registros, clientes y totales
+"""
+
+import os
+import re
+import json
+import tempfile
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+from openpyxl.styles import Font
+
+from bitacora import obtener_logger
+from consulta_resultados import normalizar_claves
+from escritura_excel import crear_libro_streaming, guardar_libro_streaming
+from procesador_cartera import celdas_alineadas
+from utilidades_cartera import (guardar_dataframe_ipc, cargar_dataframe_ipc, formatear_numero_colombiano,
+                                calcular_trabajadores)
+
+log = obtener_logger('salida_fragmentada')
+
+# Campo de cada tipo de fragmento
+CAMPOS_FRAGMENTO = {
+    'cobrador': 'CODIGO COBRADOR',
+    'agente': 'CODIGO AGENTE'
+}
+
+# Campo por el que se agrupan las filas (y sus subtotales) dentro de cada fragmento
+CAMPO_SUBTOTAL = 'CODIGO CLIENTE'
+
+ETIQUETA_SUBTOTAL = 'SUBTOTAL'
+ETIQUETA_TOTAL = 'TOTAL'
+CLAVE_VACIA = 'SIN_CODIGO'
+ARCHIVO_INDICE = 'indice.json'
+
+FUENTE_TOTAL = Font(bold=True)
+
+def _nombre_archivo(tipo, clave):
+    """Nombre del libro de un fragmento (sin caracteres no válidos en rutas)"""
+    return f"{tipo.upper()}_{re.sub(r'[^0-9A-Za-z_-]', '_', clave)}.xlsx"
+
+def _grupos(valores):
+    """Valores distintos en orden de aparición y las filas de cada uno"""
+    codigos, unicos = pd.factorize(valores)
+    orden = np.argsort(codigos, kind='stable')
+    return unicos, np.split(orden, np.cumsum(np.bincount(codigos, minlength=len(unicos)))[:-1])
+
+def _fila_total(columnas, etiquetas, totales):
+    """Fila de subtotal o total: etiquetas en sus columnas e importes con formato colombiano"""
+    fila = []
+    for columna in columnas:
+        if columna in totales:
+            fila.append(formatear_numero_colombiano(round(float(totales[columna]), 2)))
+        else:
+            fila.append(etiquetas.get(columna))
+    return fila
+
+def escribir_fragmento(df, importes, output_path, campo, clave):
+    """
+    Escribe el libro de un fragmento: las filas de cada cliente seguidas de su subtotal
+    y el total del fragmento al final. importes tiene los valores numéricos de las
+    columnas a totalizar, en el mismo orden de filas que df.
+    Devuelve la entrada del fragmento para el índice.
+    """
+    columnas = list(df.columns)
+    primera = columnas[0]
+    libro = crear_libro_streaming()
+    hoja = libro.create_sheet(title='Sheet1')
+    hoja.append(celdas_alineadas(hoja, [str(c) for c in columnas]))
+
+    valores = df.astype(object).where(df.notna(), None)
+    clientes = normalizar_claves(df[CAMPO_SUBTOTAL]) if CAMPO_SUBTOTAL in df.columns \
+        else pd.Series('', index=df.index)
+    # Clientes en el orden en que aparecen por primera vez
+    unicos, grupos = _grupos(clientes.to_numpy())
+    for cliente, filas in zip(unicos, grupos):
+        for fila in valores.iloc[filas].itertuples(index=False, name=None):
+            hoja.append(celdas_alineadas(hoja, fila))
+        if CAMPO_SUBTOTAL in df.columns:
+            etiquetas = {primera: ETIQUETA_SUBTOTAL, CAMPO_SUBTOTAL: cliente or None}
+            hoja.append(celdas_alineadas(hoja, _fila_total(columnas, etiquetas, importes.iloc[filas].sum()), FUENTE_TOTAL))
+
+    totales = importes.sum()
+    hoja.append(celdas_alineadas(hoja, _fila_total(columnas, {primera: ETIQUETA_TOTAL, campo: clave}, totales), FUENTE_TOTAL))
+    guardar_libro_streaming(libro, output_path)
+
+    return {
+        'clave': clave,
+        'archivo': os.path.basename(output_path),
+        'registros': len(df),
+        'clientes': len(unicos) if CAMPO_SUBTOTAL in df.columns else None,
+        'totales': {col: round(float(valor), 2) for col, valor in totales.items()}
+    }
+
+def _escribir_fragmentos(df, importes, claves, directorio, tipo):
+    """Escribe el libro de cada clave de fragmento presente en df"""
+    campo = CAMPOS_FRAGMENTO[tipo]
+    entradas = []
+    for clave, filas in zip(*_grupos(claves)):
+        ruta = os.path.join(directorio, _nombre_archivo(tipo, clave))
+        entradas.append(escribir_fragmento(df.iloc[filas], importes.iloc[filas], ruta, campo, clave))
+    return entradas
+
+def _ejecutar_lote(ruta_filas, ruta_importes, ruta_claves, directorio, tipo):
+    """Escribe en el trabajador los fragmentos de un lote guardado como IPC"""
+    claves = cargar_dataframe_ipc(ruta_claves)['CLAVE'].to_numpy()
+    return _escribir_fragmentos(cargar_dataframe_ipc(ruta_filas), cargar_dataframe_ipc(ruta_importes),
+                                claves, directorio, tipo)
+
+def asignar_lotes(claves, trabajadores):
+    """
+    Lote de cada fila (array 0..trabajadores-1): los fragmentos completos se asignan de
+    mayor a menor número de filas al lote con menos filas
+    """
+    unicos, grupos, tamanos = np.unique(claves, return_inverse=True, return_counts=True)
+    carga = np.zeros(trabajadores, dtype=np.int64)
+    destino = np.empty(len(unicos), dtype=np.int64)
+    for grupo in np.argsort(-tamanos, kind='stable'):
+        lote = int(carga.argmin())
+        destino[grupo] = lote
+        carga[lote] += tamanos[grupo]
+    return destino[grupos]
+
+def _orden_claves(clave):
+    """Orden del índice: claves numéricas por valor, luego el resto alfabéticamente"""
+    return (0, int(clave), '') if clave.isdigit() else (1, 0, clave)
+
+def generar_fragmentos(df, importes, output_path, tipo='cobrador', jobs=None):
+    """
+    Genera un libro por cada cobrador o agente (tipo) del resultado formateado df y el
+    índice de fragmentos en <salida>_<tipo>/. importes tiene los valores numéricos de
+    las columnas a totalizar, en el mismo orden de filas que df. jobs es el número de
+    procesos (por defecto todos los núcleos). Devuelve la ruta del índice.
+    """
+    if tipo not in CAMPOS_FRAGMENTO:
+        raise ValueError(f"Tipo de fragmento no válido '{tipo}' (opciones: {', '.join(CAMPOS_FRAGMENTO)})")
+    campo = CAMPOS_FRAGMENTO[tipo]
+    if campo not in df.columns:
+        raise ValueError(f"No se encontró la columna '{campo}' en el resultado")
+
+    df = df.reset_index(drop=True)
+    importes = importes.reset_index(drop=True)
+    claves = normalizar_claves(df[campo]).replace('', CLAVE_VACIA).to_numpy().astype(str)
+    fragmentos = len(np.unique(claves))
+    trabajadores = min(calcular_trabajadores(jobs, por_defecto=0), fragmentos)
+
+    directorio = os.path.splitext(output_path)[0] + f'_{tipo}'
+    os.makedirs(directorio, exist_ok=True)
+    log.info(f"Generando {fragmentos} libros por {campo} con {trabajadores} procesos: {directorio}")
+
+    if trabajadores <= 1:
+        entradas = _escribir_fragmentos(df, importes, claves, directorio, tipo)
+    else:
+        entradas = []
+        lotes = asignar_lotes(claves, trabajadores)
+        with tempfile.TemporaryDirectory(prefix='fragmentos_') as temporal, \
+                ProcessPoolExecutor(max_workers=trabajadores) as executor:
+            futuros = []
+            for lote in range(trabajadores):
+                filas = np.flatnonzero(lotes == lote)
+                if len(filas) == 0:
+                    continue
+                rutas = [os.path.join(temporal, f'{nombre}_{lote}.arrow') for nombre in ('filas', 'importes', 'claves')]
+                guardar_dataframe_ipc(df.iloc[filas], rutas[0])
+                guardar_dataframe_ipc(importes.iloc[filas], rutas[1])
+                guardar_dataframe_ipc(pd.DataFrame({'CLAVE': claves[filas]}), rutas[2])
+                futuros.append(executor.submit(_ejecutar_lote, *rutas, directorio, tipo))
+            for futuro in futuros:
+                entradas.extend(futuro.result())
+
+    entradas.sort(key=lambda entrada: _orden_claves(entrada['clave']))
+    ruta_indice = os.path.join(directorio, ARCHIVO_INDICE)
+    with open(ruta_indice, 'w', encoding='utf-8') as f:
+        json.dump({
+            'origen': output_path,
+            'campo': campo,
+            'fecha': datetime.now().isoformat(),
+            'fragmentos': len(entradas),
+            'registros': len(df),
+            'totales': {col: round(float(valor), 2) for col, valor in importes.sum().items()},
+            'lista': entradas
+        }, f, indent=2, ensure_ascii=False)
+
+    log.info(f"Libros por {campo} generados: {len(entradas)}. Índice: {ruta_indice}")
+    return ruta_indice
@@ -1,7 +1,15 @@
 # -*- coding: utf-8 -*-
 import pandas as pd
+import numpy as np
 from datetime import datetime
+import os
 import re
+import hashlib
+import importlib.util
+
+from bitacora import obtener_logger, contar_error
+
+log = obtener_logger(__name__)
 
 def convertir_fecha(fecha_str):
     try:
@@ -10,6 +18,25 @@ def convertir_fecha(fecha_str):
     except Exception:
         return "", "", "", "", None
 
+def convertir_fechas_serie(serie):
+    """
+    Versión vectorizada de convertir_fecha: decodifica en bloque una columna de fechas
+    YYYYMMDD (texto o numérica). Devuelve una serie datetime64 con NaT en las no válidas.
+    """
+    texto = serie.astype(str).str.strip().str.replace(r'\.0+$', '', regex=True)
+    return pd.to_datetime(texto, format='%Y%m%d', errors='coerce')
+
+def descomponer_fechas(fechas, formato='%d/%m/%Y'):
+    """
+    A partir de una serie datetime64 devuelve (texto, día, mes, año) como columnas de
+    objetos, con cadena vacía donde la fecha no es válida, igual que convertir_fecha.
+    """
+    validas = fechas.notna()
+    texto = fechas.dt.strftime(formato).where(validas, '')
+    partes = [fechas.dt.day, fechas.dt.month, fechas.dt.year]
+    dia, mes, anio = [p.astype('Int64').astype(object).where(validas, '') for p in partes]
+    return texto, dia, mes, anio
+
 def convertir_valor(valor_str):
     try:
         if valor_str is None:
@@ -19,7 +46,8 @@ def convertir_valor(valor_str):
         
         # Limpiar el valor: eliminar espacios, caracteres invisibles y espacios al final
         s = str(valor_str).strip().replace('\u200b', '').replace(' ', '')
-        if s == '' or s.lower() == 'nan':
+        # Vacío o '-' (el marcador de cero de los propios resultados): 0 sin contarlo como error
+        if s in ('', '-') or s.lower() == 'nan':
             return 0.0
         
         # Casos problemáticos específicos que hemos visto
@@ -84,9 +112,37 @@ def convertir_valor(valor_str):
             
         return resultado
     except Exception as e:
-        print(f"Error convirtiendo valor: {valor_str}, Error: {e}")
+        contar_error('convertir_valor', valor_str, e)
         return 0.0
 
+def convertir_valores_serie(serie):
+    """
+    Versión vectorizada de convertir_valor para una columna completa.
+    Los valores con a lo sumo un punto y una coma (el caso habitual) se convierten en bloque;
+    los formatos irregulares se delegan a convertir_valor para conservar sus mismas reglas.
+    """
+    if pd.api.types.is_numeric_dtype(serie):
+        return pd.to_numeric(serie, errors='coerce').astype(float).fillna(0.0)
+    
+    nulos = serie.isna()
+    s = serie.astype(str).str.strip().str.replace('\u200b', '', regex=False).str.replace(' ', '', regex=False)
+    vacios = nulos | s.isin(['', '-']) | (s.str.lower() == 'nan')
+    
+    # Con coma: los puntos son de miles y la coma es decimal (1.234,56 -> 1234.56)
+    con_coma = s.str.contains(',', regex=False)
+    s = s.where(~con_coma, s.str.replace('.', '', regex=False).str.replace(',', '.', regex=False))
+    simples = (serie.astype(str).str.count(r'\.') <= 1) & (serie.astype(str).str.count(',') <= 1)
+    
+    resultado = pd.to_numeric(s.where(simples & ~vacios), errors='coerce')
+    
+    # Formatos irregulares o no numéricos: aplicar las reglas completas de convertir_valor
+    pendientes = resultado.isna() & ~vacios
+    if pendientes.any():
+        resultado[pendientes] = serie[pendientes].apply(convertir_valor)
+    
+    resultado = resultado.fillna(0.0).astype(float)
+    return resultado.replace([np.inf, -np.inf], 0.0)
+
 def validar_formato_colombiano(valor_original, valor_formateado):
     """
     Valida que el formato colombiano se aplique correctamente
@@ -104,7 +160,7 @@ def validar_formato_colombiano(valor_original, valor_formateado):
         if valor_formateado.count('.') > 0 and valor_formateado.count(',') == 1:
             return True
         else:
-            print(f"Formato incorrecto: {valor_original} -> {valor_formateado}")
+            contar_error('formato_colombiano', f"{valor_original} -> {valor_formateado}")
             return False
     except Exception:
         return False
@@ -168,7 +224,7 @@ def formatear_numero_colombiano(valor, es_porcentaje=False):
         
         return valor_str
     except Exception as e:
-        print(f"Error formateando número: {valor}, Error: {e}")
+        contar_error('formatear_numero', valor, e)
         return "-"
 
 def aplicar_formato_colombiano_dataframe(df, columnas_numericas=None):
@@ -201,8 +257,370 @@ def aplicar_formato_colombiano_dataframe(df, columnas_numericas=None):
                         lambda x: formatear_numero_colombiano(x, es_porcentaje)
                     )
                 except Exception as e:
-                    print(f"Error aplicando formato a columna {columna}: {e}")
+                    log.warning(f"Error aplicando formato a columna {columna}: {e}")
                     # Si hay error, mantener la columna original
                     continue
     
-    return df_formateado 
\ No newline at end of file
+    return df_formateado 
+
+# Prefijos que identifican el formato de un DataFrame serializado
+_PREFIJO_ARROW = b'ARROW1'
+_PREFIJO_PICKLE = b'PICKL1'
+
+# Sufijo de la parte de texto de una columna mixta (números y texto, p. ej. saldo o '-')
+_SUFIJO_TEXTO_MIXTO = '__texto'
+_METADATO_MIXTAS = b'columnas_mixtas'
+
+def _separar_columnas_mixtas(df):
+    """
+    Divide las columnas de objetos con números y texto, que Arrow no puede representar,
+    en una columna numérica y otra de texto. Devuelve (copia, nombres de las mixtas).
+    """
+    import pyarrow as pa
+    mixtas = []
+    copia = df
+    for col in df.columns:
+        if df[col].dtype != 'object':
+            continue
+        try:
+            pa.array(df[col], from_pandas=True)
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            if copia is df:
+                copia = df.copy(deep=False)
+            # Si lo que no es texto tampoco es número, astype falla y se recurre a pickle
+            es_texto = df[col].map(lambda v: isinstance(v, str)).astype(bool)
+            copia[col] = df[col].where(~es_texto).astype('float64')
+            copia[f'{col}{_SUFIJO_TEXTO_MIXTO}'] = df[col].where(es_texto)
+            mixtas.append(col)
+    return copia, mixtas
+
+def _tabla_arrow(df):
+    """Tabla Arrow del DataFrame; las columnas mixtas quedan anotadas en los metadatos"""
+    import pyarrow as pa
+    copia, mixtas = _separar_columnas_mixtas(df)
+    tabla = pa.Table.from_pandas(copia, preserve_index=False)
+    if mixtas:
+        tabla = tabla.replace_schema_metadata({
+            **(tabla.schema.metadata or {}), _METADATO_MIXTAS: '\n'.join(mixtas).encode('utf-8')
+        })
+    return tabla
+
+def _dataframe_arrow(tabla):
+    """DataFrame a partir de una tabla de _tabla_arrow (vuelve a unir las columnas mixtas)"""
+    df = tabla.to_pandas()
+    mixtas = (tabla.schema.metadata or {}).get(_METADATO_MIXTAS)
+    for col in (mixtas.decode('utf-8').split('\n') if mixtas else []):
+        texto = df.pop(f'{col}{_SUFIJO_TEXTO_MIXTO}').astype(object)
+        df[col] = df[col].astype(object).where(texto.isna(), texto)
+    return df
+
+def serializar_dataframe(df):
+    """
+    Serializa un DataFrame a bytes compactos para pasarlo entre procesos.
+    Usa el formato IPC de Arrow si pyarrow está disponible y las columnas son
+    compatibles (las columnas mixtas de números y texto se dividen en dos);
+    en caso contrario recurre a pickle.
+    """
+    try:
+        import pyarrow as pa
+        tabla = _tabla_arrow(df)
+        sink = pa.BufferOutputStream()
+        with pa.ipc.new_stream(sink, tabla.schema) as escritor:
+            escritor.write_table(tabla)
+        return _PREFIJO_ARROW + sink.getvalue().to_pybytes()
+    except Exception:
+        import pickle
+        return _PREFIJO_PICKLE + pickle.dumps(df, protocol=pickle.HIGHEST_PROTOCOL)
+
+def deserializar_dataframe(datos):
+    """Reconstruye un DataFrame serializado con serializar_dataframe"""
+    if datos is None:
+        return None
+    if datos.startswith(_PREFIJO_ARROW):
+        import pyarrow as pa
+        return _dataframe_arrow(pa.ipc.open_stream(pa.py_buffer(datos[len(_PREFIJO_ARROW):])).read_all())
+    if datos.startswith(_PREFIJO_PICKLE):
+        import pickle
+        return pickle.loads(datos[len(_PREFIJO_PICKLE):])
+    raise ValueError("Formato de DataFrame serializado no reconocido")
+
+def guardar_dataframe_ipc(df, ruta):
+    """
+    Guarda un DataFrame en un archivo IPC de Arrow para pasarlo a otro proceso sin
+    copiarlo por la tubería del pool. Si las columnas no son compatibles con Arrow se
+    guarda serializado con pickle.
+    """
+    try:
+        import pyarrow as pa
+        tabla = _tabla_arrow(df)
+    except Exception:
+        with open(ruta, 'wb') as f:
+            f.write(serializar_dataframe(df))
+        return ruta
+    with pa.OSFile(ruta, 'wb') as destino, pa.ipc.new_file(destino, tabla.schema) as escritor:
+        escritor.write_table(tabla)
+    return ruta
+
+def cargar_dataframe_ipc(ruta):
+    """Carga un DataFrame guardado con guardar_dataframe_ipc"""
+    with open(ruta, 'rb') as f:
+        inicio = f.read(len(_PREFIJO_PICKLE))
+    if inicio == _PREFIJO_PICKLE:
+        with open(ruta, 'rb') as f:
+            return deserializar_dataframe(f.read())
+    # Lectura completa (sin memoria mapeada) para que el archivo pueda borrarse en Windows
+    import pyarrow as pa
+    with pa.OSFile(ruta, 'rb') as origen:
+        return _dataframe_arrow(pa.ipc.open_file(origen).read_all())
+
+def extraer_opcion(argumentos, nombre, por_defecto=None, es_bandera=False):
+    """
+    Extrae una opción de línea de comandos (--nombre valor, --nombre=valor o
+    --nombre si es bandera) y devuelve (valor, argumentos_restantes).
+    """
+    restantes = []
+    valor = por_defecto
+    i = 0
+    while i < len(argumentos):
+        arg = argumentos[i]
+        if arg == nombre:
+            if es_bandera:
+                valor = True
+            elif i + 1 < len(argumentos):
+                valor = argumentos[i + 1]
+                i += 1
+            else:
+                raise ValueError(f"La opción {nombre} requiere un valor")
+        elif arg.startswith(nombre + '='):
+            valor = arg.split('=', 1)[1]
+        else:
+            restantes.append(arg)
+        i += 1
+    return valor, restantes
+
+def calcular_trabajadores(jobs=None, por_defecto=1):
+    """
+    Número de procesos: el indicado con --jobs o, sin --jobs, por_defecto; en ambos
+    casos 0 (o negativo) significa todos los núcleos
+    """
+    if jobs is None or jobs == '':
+        jobs = por_defecto
+    jobs = int(jobs)
+    if jobs <= 0:
+        return os.cpu_count() or 1
+    return jobs
+
+def motor_excel_rapido(ruta):
+    """
+    Devuelve el motor de lectura más rápido disponible para el archivo:
+    'calamine' si python-calamine está instalado y pandas lo admite, None (motor por defecto) si no
+    """
+    if importlib.util.find_spec('python_calamine') is None:
+        return None
+    try:
+        version = tuple(int(p) for p in pd.__version__.split('.')[:2])
+    except ValueError:
+        return None
+    return 'calamine' if version >= (2, 2) else None
+
+def leer_encabezado_excel(ruta, hoja=0):
+    """Lee únicamente la fila de encabezado de una hoja Excel"""
+    return list(pd.read_excel(ruta, sheet_name=hoja, nrows=0, engine=motor_excel_rapido(ruta)).columns)
+
+def leer_excel_columnas(ruta, selector, hoja=0, dtype=str):
+    """
+    Lee de una hoja Excel solo las columnas necesarias.
+    Primero lee el encabezado, resuelve qué columnas cumple el selector (lista de nombres
+    o función nombre -> bool) y después carga únicamente esas columnas con usecols.
+    """
+    encabezado = leer_encabezado_excel(ruta, hoja)
+    if callable(selector):
+        posiciones = [i for i, col in enumerate(encabezado) if selector(str(col))]
+    else:
+        posiciones = [i for i, col in enumerate(encabezado) if col in selector]
+    
+    if not posiciones:
+        return pd.DataFrame()
+    
+    return pd.read_excel(ruta, sheet_name=hoja, usecols=posiciones, dtype=dtype,
+                         engine=motor_excel_rapido(ruta))
+
+def buscar_fila_excel(ruta, patron, columnas, hoja=0, columna_clave=0):
+    """
+    Recorre una hoja Excel fila a fila y se detiene en la primera fila cuya columna
+    clave contiene el patrón (sin distinguir mayúsculas). Devuelve un diccionario
+    columna -> valor con las columnas pedidas, o None si no se encuentra.
+    Para .xlsx la hoja se lee en modo de solo lectura sin materializarla completa.
+    """
+    patron = patron.lower()
+    
+    if not str(ruta).lower().endswith(('.xlsx', '.xlsm')):
+        encabezado = leer_encabezado_excel(ruta, hoja)
+        posiciones = sorted({columna_clave} | {encabezado.index(c) for c in columnas if c in encabezado})
+        df = pd.read_excel(ruta, sheet_name=hoja, usecols=posiciones, dtype=str)
+        clave = df.columns[posiciones.index(columna_clave)]
+        filtro = df[clave].astype(str).str.lower().str.contains(patron, na=False, regex=False)
+        if not filtro.any():
+            return None
+        fila = df[filtro].iloc[0]
+        return {c: fila[c] for c in columnas if c in df.columns}
+    
+    from openpyxl import load_workbook
+    libro = load_workbook(ruta, read_only=True, data_only=True)
+    try:
+        ws = libro.worksheets[hoja] if isinstance(hoja, int) else libro[hoja]
+        filas = ws.iter_rows(values_only=True)
+        encabezado = [str(v).strip() if v is not None else '' for v in next(filas, ())]
+        posiciones = {c: encabezado.index(c) for c in columnas if c in encabezado}
+        
+        for fila in filas:
+            if columna_clave < len(fila) and fila[columna_clave] is not None \
+                    and patron in str(fila[columna_clave]).lower():
+                return {c: fila[i] if i < len(fila) else None for c, i in posiciones.items()}
+        return None
+    finally:
+        libro.close()
+
+# Firmas (magic bytes) de los formatos de entrada admitidos
+FIRMA_ZIP = b'PK\x03\x04'
+FIRMA_OLE = b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1'
+BOMS_TEXTO = [
+    (b'\xef\xbb\xbf', 'utf-8-sig'),
+    (b'\xff\xfe', 'utf-16'),
+    (b'\xfe\xff', 'utf-16'),
+]
+SEPARADORES_CANDIDATOS = [';', ',', '\t', '|']
+TAMANO_MUESTRA_DETECCION = 64 * 1024
+
+def _inferir_separador(texto):
+    """Infiere el separador a partir de las primeras líneas de texto"""
+    import csv
+    lineas = [l for l in texto.splitlines()[:50] if l.strip()]
+    if not lineas:
+        raise ValueError("El archivo de texto no contiene líneas con datos")
+    # La última línea puede estar cortada por el tamaño de la muestra
+    if len(lineas) > 2:
+        lineas = lineas[:-1]
+    
+    # El encabezado no lleva comas decimales: el separador es el carácter que más se
+    # repite en él y que aparece al menos las mismas veces en todas las líneas de datos
+    conteos = {sep: lineas[0].count(sep) for sep in SEPARADORES_CANDIDATOS}
+    candidatos = [sep for sep, n in conteos.items() if n > 0 and all(l.count(sep) >= n for l in lineas)]
+    if candidatos:
+        return max(candidatos, key=lambda sep: conteos[sep])
+    
+    # Respaldo: el detector de la librería estándar (admite campos entre comillas)
+    try:
+        return csv.Sniffer().sniff('\n'.join(lineas), delimiters=''.join(SEPARADORES_CANDIDATOS)).delimiter
+    except csv.Error:
+        if not any(conteos.values()):
+            return ','  # Una sola columna: el separador no importa
+        raise ValueError("No se pudo determinar el separador del archivo de texto")
+
+def detectar_formato_archivo(ruta, tamano_muestra=TAMANO_MUESTRA_DETECCION):
+    """
+    Detecta el formato de un archivo de entrada leyendo solo sus primeros KB:
+    - Firma ZIP con libro de Excel -> 'xlsx'; firma OLE -> 'xls'
+    - Texto: detecta BOM y codificación e infiere el separador. Sin BOM se usa latin1 (la
+      codificación de las exportaciones de Pisa) salvo que la muestra tenga caracteres no
+      ASCII válidos en utf-8: unos primeros KB solo ASCII no indican la codificación
+    Devuelve un diccionario con 'tipo', 'encoding', 'separador' y 'bom'.
+    Lanza ValueError si el archivo está vacío o no es Excel ni texto delimitado.
+    """
+    if not os.path.exists(ruta):
+        raise FileNotFoundError(f"Archivo no encontrado: {ruta}")
+    
+    with open(ruta, 'rb') as f:
+        muestra = f.read(tamano_muestra)
+    
+    if not muestra:
+        raise ValueError(f"El archivo está vacío: {ruta}")
+    
+    formato = {'tipo': None, 'encoding': None, 'separador': None, 'bom': False}
+    
+    if muestra.startswith(FIRMA_ZIP):
+        import zipfile
+        try:
+            with zipfile.ZipFile(ruta) as zf:
+                nombres = zf.namelist()
+        except zipfile.BadZipFile:
+            raise ValueError(f"El archivo parece un ZIP/XLSX dañado: {ruta}")
+        if not any(n.startswith('xl/') for n in nombres):
+            raise ValueError(f"El archivo es un ZIP pero no un libro de Excel: {ruta}")
+        formato['tipo'] = 'xlsx'
+        return formato
+    
+    if muestra.startswith(FIRMA_OLE):
+        formato['tipo'] = 'xls'
+        return formato
+    
+    # Texto delimitado: BOM y codificación
+    encoding = None
+    for bom, codificacion in BOMS_TEXTO:
+        if muestra.startswith(bom):
+            encoding = codificacion
+            formato['bom'] = True
+            break
+    
+    if encoding is None:
+        if b'\x00' in muestra:
+            raise ValueError(f"El archivo no es Excel ni texto delimitado (contenido binario): {ruta}")
+        # Descartar un posible carácter multibyte cortado al final de la muestra
+        recorte = muestra if len(muestra) < tamano_muestra else muestra[:-4]
+        encoding = 'latin1'
+        if not recorte.isascii():
+            try:
+                recorte.decode('utf-8')
+                encoding = 'utf-8'
+            except UnicodeDecodeError:
+                pass
+    
+    texto = muestra.decode(encoding, errors='ignore')
+    formato['tipo'] = 'texto'
+    formato['encoding'] = encoding
+    formato['separador'] = _inferir_separador(texto)
+    return formato
+
+TAMANO_BLOQUE_HASH = 1 << 20
+
+def hash_archivo(ruta):
+    """SHA-256 del contenido del archivo"""
+    resumen = hashlib.sha256()
+    with open(ruta, 'rb') as f:
+        for bloque in iter(lambda: f.read(TAMANO_BLOQUE_HASH), b''):
+            resumen.update(bloque)
+    return resumen.hexdigest()
+
+def leer_archivo_tabular(ruta, dtype=str, formato=None, **kwargs):
+    """
+    Lee un archivo Excel o de texto delimitado eligiendo el lector correcto al primer
+    intento según detectar_formato_archivo. Los argumentos adicionales se pasan al lector.
+    Un texto detectado como utf-8 que no lo es más allá de la muestra se lee en latin1.
+    """
+    formato = formato or detectar_formato_archivo(ruta)
+    
+    if formato['tipo'] == 'xlsx':
+        return pd.read_excel(ruta, dtype=dtype, engine='openpyxl', **kwargs)
+    if formato['tipo'] == 'xls':
+        return pd.read_excel(ruta, dtype=dtype, engine='xlrd', **kwargs)
+    try:
+        return pd.read_csv(ruta, sep=formato['separador'], encoding=formato['encoding'], dtype=dtype, **kwargs)
+    except UnicodeDecodeError:
+        if formato['encoding'] != 'utf-8':
+            raise
+        log.warning(f"El archivo no es utf-8 después de la muestra; se lee en latin1: {ruta}")
+        return pd.read_csv(ruta, sep=formato['separador'], encoding='latin1', dtype=dtype, **kwargs)
+
+def inferir_tipos_columnas(df):
+    """
+    Copia de un DataFrame leído como texto con las columnas totalmente numéricas convertidas
+    a número, como las deja leer_archivo_tabular(..., dtype=None) al leer un CSV. Permite
+    leer un archivo una sola vez y servirlo a procesos que esperan tipos inferidos.
+    """
+    df = df.copy()
+    for col in df.columns:
+        try:
+            df[col] = pd.to_numeric(df[col])
+        except (ValueError, TypeError):
+            pass
+    return df
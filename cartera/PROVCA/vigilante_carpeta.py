@@ -0,0 +1,231 @@
+# -*- coding: utf-8 -*-
+"""
+VIGILANTE DE CARPETA - GRUPO PLANETA
+
+Servicio que vigila la carpeta compartida donde Pisa deja las exportaciones de provisión
+y anticipos y las procesa en cuanto terminan de copiarse, sin descargarlas y subirlas de
+nuevo por front_php/procesar.php (ni pasar por su límite de tamaño de subida).
+
+PROCESO:
+1. Sondeo periódico de la carpeta (sin dependencias de inotify, funciona igual en la
+   carpeta compartida de Windows). Se ignoran temporales y archivos de otras extensiones.
+2. Un archivo está completo cuando su tamaño y fecha de modificación no cambian durante
+   CICLOS_ESTABLES sondeos seguidos; entonces se calcula su hash y se identifica por el
+   esquema del encabezado (ANTICI = anticipos, PROVCA = cartera). Los que no tienen un
+   esquema conocido se rechazan hasta que vuelvan a cambiar.
+3. Los trabajos se deduplican por hash del contenido, tipo y fecha de cierre con el mismo
+   registro que procesador_lote: un archivo ya procesado, o copiado otra vez con otro
+   nombre, no se vuelve a procesar.
+4. Los trabajos se ejecutan en un pool de procesos; cada resultado se publica en la
+   carpeta de resultados (Excel, resumen JSON y log del trabajo) y el estado del servicio
+   se guarda en vigilante_estado.json. Si un trabajador termina de forma anormal (p. ej.
+   sin memoria con una exportación grande), los trabajos de ese pool se registran como
+   error y el servicio sigue con un pool nuevo.
+"""
+
+import os
+import sys
+import json
+import time
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from utilidades_cartera import extraer_opcion, calcular_trabajadores
+from procesador_lote import (DIRECTORIO_RESULTADOS, fecha_desde_nombre, fecha_por_defecto, cargar_registro,
+                             preparar_trabajo, ejecutar_trabajo, registrar_trabajo, ya_procesado)
+
+# Segundos entre sondeos de la carpeta
+INTERVALO_SONDEO = 10
+
+# Sondeos seguidos sin cambios de tamaño ni fecha para considerar completo un archivo
+CICLOS_ESTABLES = 2
+
+EXTENSIONES_ENTRADA = ('.csv', '.txt', '.xlsx', '.xls')
+
+# Archivos temporales de copia o de Office que nunca se procesan
+PREFIJOS_TEMPORALES = ('~$', '.')
+SUFIJOS_TEMPORALES = ('.tmp', '.part', '.crdownload')
+
+NOMBRE_ESTADO = 'vigilante_estado.json'
+
+# Trabajos terminados que se conservan en el estado
+MAXIMO_HISTORIAL = 500
+
+def _mensaje(texto):
+    """Mensaje del servicio con la hora (salida sin búfer para los logs del servicio)"""
+    print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] {texto}", flush=True)
+
+def es_archivo_entrada(nombre):
+    """Indica si el nombre corresponde a una exportación a procesar (no temporal)"""
+    minusculas = nombre.lower()
+    return (minusculas.endswith(EXTENSIONES_ENTRADA)
+            and not nombre.startswith(PREFIJOS_TEMPORALES)
+            and not minusculas.endswith(SUFIJOS_TEMPORALES))
+
+def sondear_carpeta(carpeta, observados, ciclos_estables=CICLOS_ESTABLES):
+    """
+    Actualiza los archivos observados (ruta -> tamaño, fecha, sondeos sin cambios) y
+    devuelve las rutas que acaban de completarse. Un archivo que cambia vuelve a observarse.
+    """
+    completos = []
+    vistos = set()
+    for entrada in os.scandir(carpeta):
+        if not entrada.is_file() or not es_archivo_entrada(entrada.name):
+            continue
+        info = entrada.stat()
+        huella = (info.st_size, info.st_mtime_ns)
+        vistos.add(entrada.path)
+        previo = observados.get(entrada.path)
+        if previo is None or previo['huella'] != huella:
+            observados[entrada.path] = {'huella': huella, 'ciclos': 0, 'despachado': False}
+            continue
+        previo['ciclos'] += 1
+        if info.st_size > 0 and not previo['despachado'] and previo['ciclos'] >= ciclos_estables:
+            previo['despachado'] = True
+            completos.append(entrada.path)
+    for ruta in set(observados) - vistos:
+        del observados[ruta]
+    return completos
+
+def guardar_estado(estado, directorio):
+    """Guarda el estado del servicio en la carpeta de resultados (escritura atómica)"""
+    estado['actualizado'] = datetime.now().isoformat()
+    ruta = os.path.join(directorio, NOMBRE_ESTADO)
+    temporal = ruta + '.tmp'
+    with open(temporal, 'w', encoding='utf-8') as f:
+        json.dump(estado, f, indent=2, ensure_ascii=False, default=str)
+    os.replace(temporal, ruta)
+
+def _anotar(estado, lista, elemento):
+    """Añade un elemento a una lista del estado conservando solo los más recientes"""
+    estado[lista].append(elemento)
+    del estado[lista][:-MAXIMO_HISTORIAL]
+
+def _recoger_trabajo(futuro, trabajo, registro, estado, directorio):
+    """Registra y publica en el estado el resultado de un trabajo terminado"""
+    try:
+        resultado = futuro.result()
+    except Exception as e:
+        resultado = {**trabajo, 'estado': 'error', 'error': str(e)}
+    if resultado['estado'] == 'procesado':
+        registrar_trabajo(registro, resultado, directorio)
+        _mensaje(f"Procesado ({resultado['segundos']:.1f} s): {resultado['archivo']} -> {resultado['salida']}")
+        _anotar(estado, 'procesados', resultado)
+    else:
+        _mensaje(f"ERROR en {resultado['archivo']}: {resultado['error']} (ver {trabajo['log']})")
+        _anotar(estado, 'errores', resultado)
+
+def _reiniciar_pool(executor, trabajadores, en_curso, registro, estado, directorio):
+    """
+    Sustituye un pool roto por la terminación anormal de un trabajador: los trabajos que
+    tenía en curso se registran como error y se devuelve un pool nuevo
+    """
+    _mensaje("Un proceso trabajador terminó de forma anormal: se crea un pool de procesos nuevo")
+    executor.shutdown(wait=True, cancel_futures=True)
+    for futuro in list(en_curso):
+        _recoger_trabajo(futuro, en_curso.pop(futuro), registro, estado, directorio)
+    return ProcessPoolExecutor(max_workers=trabajadores)
+
+def vigilar_carpeta(carpeta, directorio=None, intervalo=INTERVALO_SONDEO, jobs=None, fecha=None,
+                    guardar_historico=True, una_vez=False, ciclos_estables=CICLOS_ESTABLES):
+    """
+    Vigila la carpeta y procesa cada exportación completa. Con una_vez termina cuando no
+    quedan archivos por completar ni trabajos en curso (para programarlo como tarea).
+    Devuelve el estado final del servicio.
+    """
+    if not os.path.isdir(carpeta):
+        raise FileNotFoundError(f"Carpeta no encontrada: {carpeta}")
+    directorio = directorio or DIRECTORIO_RESULTADOS
+    os.makedirs(directorio, exist_ok=True)
+    trabajadores = calcular_trabajadores(jobs, por_defecto=1)
+
+    registro = cargar_registro(directorio)
+    observados = {}
+    en_curso = {}
+    estado = {
+        'carpeta': os.path.abspath(carpeta),
+        'directorio_salida': directorio,
+        'inicio': datetime.now().isoformat(),
+        'en_curso': [],
+        'procesados': [],
+        'omitidos': [],
+        'errores': []
+    }
+    _mensaje(f"Vigilando {estado['carpeta']} cada {intervalo} s (resultados en {directorio}, "
+             f"{trabajadores} procesos)")
+
+    executor = ProcessPoolExecutor(max_workers=trabajadores)
+    try:
+        try:
+            while True:
+                for ruta in sondear_carpeta(carpeta, observados, ciclos_estables):
+                    trabajo = {'archivo': ruta, 'tipo': None,
+                               'fecha_cierre': fecha or fecha_desde_nombre(ruta) or fecha_por_defecto()}
+                    try:
+                        preparar_trabajo(trabajo, directorio)
+                    except Exception as e:
+                        _mensaje(f"Rechazado {ruta}: {e}")
+                        _anotar(estado, 'errores', {**trabajo, 'estado': 'rechazado', 'error': str(e)})
+                        continue
+                    salida_previa = ya_procesado(registro, trabajo)
+                    if salida_previa or any(t['clave'] == trabajo['clave'] for t in en_curso.values()):
+                        _mensaje(f"Omitido (ya procesado o en cola): {ruta}")
+                        _anotar(estado, 'omitidos', {**trabajo, 'estado': 'omitido', 'salida': salida_previa})
+                        continue
+                    _mensaje(f"En cola ({trabajo['tipo']}, cierre {trabajo['fecha_cierre']}): {ruta}")
+                    try:
+                        futuro = executor.submit(ejecutar_trabajo, trabajo, guardar_historico)
+                    except BrokenProcessPool:
+                        # El trabajo aún no había empezado: se lanza en el pool nuevo
+                        executor = _reiniciar_pool(executor, trabajadores, en_curso, registro, estado, directorio)
+                        futuro = executor.submit(ejecutar_trabajo, trabajo, guardar_historico)
+                    en_curso[futuro] = trabajo
+
+                terminados = [f for f in en_curso if f.done()]
+                roto = any(not f.cancelled() and isinstance(f.exception(), BrokenProcessPool) for f in terminados)
+                for futuro in terminados:
+                    _recoger_trabajo(futuro, en_curso.pop(futuro), registro, estado, directorio)
+                if roto:
+                    executor = _reiniciar_pool(executor, trabajadores, en_curso, registro, estado, directorio)
+
+                estado['en_curso'] = list(en_curso.values())
+                guardar_estado(estado, directorio)
+
+                pendientes = any(not o['despachado'] for o in observados.values())
+                if una_vez and not en_curso and not pendientes:
+                    break
+                time.sleep(intervalo)
+        except KeyboardInterrupt:
+            _mensaje(f"Deteniendo: se esperan {len(en_curso)} trabajos en curso")
+            for futuro, trabajo in en_curso.items():
+                _recoger_trabajo(futuro, trabajo, registro, estado, directorio)
+            estado['en_curso'] = []
+            guardar_estado(estado, directorio)
+    finally:
+        executor.shutdown()
+
+    _mensaje(f"Vigilante detenido: {len(estado['procesados'])} procesados, {len(estado['omitidos'])} omitidos, "
+             f"{len(estado['errores'])} con error")
+    return estado
+
+if __name__ == "__main__":
+    directorio, argumentos = extraer_opcion(sys.argv[1:], '--salida')
+    intervalo, argumentos = extraer_opcion(argumentos, '--intervalo')
+    jobs, argumentos = extraer_opcion(argumentos, '--jobs')
+    fecha, argumentos = extraer_opcion(argumentos, '--fecha')
+    una_vez, argumentos = extraer_opcion(argumentos, '--una-vez', es_bandera=True)
+    sin_historico, argumentos = extraer_opcion(argumentos, '--sin-historico', es_bandera=True)
+
+    if len(argumentos) > 0:
+        try:
+            estado = vigilar_carpeta(argumentos[0], directorio, float(intervalo or INTERVALO_SONDEO), jobs,
+                                     fecha, not sin_historico, una_vez)
+        except Exception as e:
+            print(f"ERROR: {e}")
+            sys.exit(1)
+        sys.exit(1 if una_vez and estado['errores'] else 0)
+    else:
+        print("Uso: python vigilante_carpeta.py <carpeta_exportaciones> [--salida DIRECTORIO] [--intervalo SEGUNDOS] "
+              "[--jobs N] [--fecha AAAA-MM-DD] [--una-vez] [--sin-historico]")
+        print(r"Ejemplo: python vigilante_carpeta.py \\servidor\pisa\exportaciones --intervalo 30 --jobs 2")
@@ -0,0 +1,303 @@
+# -*- coding: utf-8 -*-
+"""
+VISTA PREVIA DE CARTERA - GRUPO PLANETA
+
+Vista previa rápida de un archivo PROVCA antes de lanzar procesar_cartera: permite
+comprobar desde la interfaz web que se eligió el archivo y la fecha de cierre correctos
+sin esperar el procesamiento completo. El resultado se obtiene en torno a un segundo
+aunque el archivo tenga varios GB.
+
+PROCESO:
+1. Lectura acotada: de un archivo de texto se leen bloques de líneas repartidos a lo
+   largo de todo el archivo (posiciones de byte equidistantes), sin analizar el resto;
+   el total de registros se estima por el tamaño medio de línea. De un libro de Excel
+   se leen las primeras filas y el total se toma de la dimensión de la hoja. Los
+   archivos pequeños se leen completos.
+2. Muestra estratificada por ACTIVIDAD y rango de vencimiento (días vencidos a la fecha
+   de cierre): asignación proporcional con un mínimo por estrato, para que los estratos
+   pequeños también aparezcan.
+3. Sobre la muestra se ejecuta el mismo proceso que procesar_cartera (preparación,
+   clave de cliente y vencimientos) y los totales se extrapolan con el peso de cada
+   estrato (registros estimados del estrato / registros de la muestra).
+4. Se devuelven los totales estimados (con el error estándar del saldo) y las primeras
+   filas del archivo con el formato final. Con lectura por bloques la unidad de muestreo
+   es el bloque (las líneas de un bloque son contiguas y se parecen entre sí): el error
+   estándar se calcula con los totales ponderados de cada bloque leído. Con las primeras
+   filas no hay muestreo del archivo y el error estándar es solo una cota inferior.
+"""
+
+import io
+import os
+import sys
+import json
+import time
+import contextlib
+
+import numpy as np
+import pandas as pd
+
+from utilidades_cartera import leer_archivo_tabular, extraer_opcion, motor_excel_rapido
+from registro_esquemas import validar_archivo_entrada
+from almacen_historico import preparar_corte_historico
+from resumen_ejecucion import RANGOS_RESUMEN
+from resolucion_clientes import resolver_clientes
+from procesador_cartera import (obtener_fecha_cierre, preparar_registros, calcular_vencimientos,
+                                aplicar_formato_final)
+from compensacion_anticipos import rango_vencimiento
+from bitacora import obtener_logger
+
+log = obtener_logger(__name__)
+
+# Registros de la muestra estratificada y mínimo por estrato
+TAMANO_MUESTRA = 5000
+MINIMO_POR_ESTRATO = 5
+
+# Lectura por bloques: número de bloques y líneas leídas en cada uno
+BLOQUES_LECTURA = 1000
+LINEAS_POR_BLOQUE = 10
+
+# Por debajo de este tamaño el archivo se lee completo
+TAMANO_LECTURA_COMPLETA = 4 * 1024 * 1024
+
+# Primeras filas leídas de un libro de Excel (el lector de Excel es mucho más lento que el de texto)
+FILAS_EXCEL = 3000
+
+# Primeras filas formateadas que se devuelven
+FILAS_VISTA = 20
+
+SEMILLA_MUESTRA = 0
+
+ESTRATO_SIN_FECHA = 'SIN FECHA VTO'
+
+def _leer_bloques_texto(ruta, formato, bloques, lineas_por_bloque):
+    """
+    Lee bloques de líneas repartidos a lo largo del archivo de texto. Devuelve
+    (DataFrame como texto en el orden del archivo, registros estimados, bytes leídos,
+    bloque de cada fila o None si alguna línea no se pudo leer como registro).
+    """
+    tamano = os.path.getsize(ruta)
+    codificacion = 'utf-8' if formato['encoding'] == 'utf-8-sig' else formato['encoding']
+    lineas = []
+    bloque_linea = []
+    with open(ruta, 'rb') as f:
+        encabezado = f.readline()
+        inicio_datos = f.tell()
+        posiciones = [inicio_datos + (tamano - inicio_datos) * i // bloques for i in range(bloques)] + [tamano]
+        for i in range(bloques):
+            f.seek(posiciones[i])
+            if posiciones[i] > inicio_datos:
+                f.readline()  # Línea cortada por la posición del bloque
+            for _ in range(lineas_por_bloque):
+                if f.tell() >= posiciones[i + 1]:
+                    break
+                linea = f.readline()
+                if not linea:
+                    break
+                if linea.strip():
+                    lineas.append(linea)
+                    bloque_linea.append(i)
+
+    bytes_leidos = sum(len(linea) for linea in lineas)
+    estimados = round((tamano - inicio_datos) / (bytes_leidos / len(lineas))) if lineas else 0
+    texto = encabezado.decode(formato['encoding'], errors='replace') + \
+        b''.join(lineas).decode(codificacion, errors='replace')
+    df = pd.read_csv(io.StringIO(texto), sep=formato['separador'], dtype=str, on_bad_lines='skip')
+    bloques_filas = np.array(bloque_linea, dtype=np.int64) if len(df) == len(lineas) else None
+    return df, max(estimados, len(df)), bytes_leidos + len(encabezado), bloques_filas
+
+def _filas_hoja_excel(ruta, formato):
+    """Registros de la primera hoja según su dimensión (sin leer las filas) o None"""
+    try:
+        if formato['tipo'] == 'xlsx':
+            from openpyxl import load_workbook
+            libro = load_workbook(ruta, read_only=True)
+            try:
+                filas = libro.worksheets[0].max_row
+            finally:
+                libro.close()
+        else:
+            import xlrd
+            filas = xlrd.open_workbook(ruta, on_demand=True).sheet_by_index(0).nrows
+        return filas - 1 if filas else None
+    except Exception:
+        return None
+
+def leer_muestra_archivo(ruta, formato, bloques=BLOQUES_LECTURA, lineas_por_bloque=LINEAS_POR_BLOQUE,
+                         tamano_completo=TAMANO_LECTURA_COMPLETA):
+    """
+    Lectura acotada del archivo. Devuelve un diccionario con el DataFrame leído como
+    texto ('df', en el orden del archivo), los registros estimados del archivo, el método
+    y, en la lectura por bloques, el bloque de cada fila ('bloques') y los bloques leídos.
+    """
+    tamano = os.path.getsize(ruta)
+    if formato['tipo'] == 'texto' and tamano > tamano_completo and not formato['encoding'].startswith('utf-16'):
+        df, estimados, bytes_leidos, bloques_filas = _leer_bloques_texto(ruta, formato, bloques, lineas_por_bloque)
+        return {'df': df, 'registros_estimados': estimados, 'metodo': 'bloques', 'bytes_leidos': bytes_leidos,
+                'bloques': bloques_filas, 'bloques_leidos': bloques}
+
+    if formato['tipo'] == 'texto' and tamano <= tamano_completo:
+        df = leer_archivo_tabular(ruta, formato=formato)
+        return {'df': df, 'registros_estimados': len(df), 'metodo': 'completo', 'bytes_leidos': tamano}
+
+    # Excel (o texto UTF-16, sin posiciones de línea fiables): primeras filas
+    if formato['tipo'] == 'texto':
+        limite = bloques * lineas_por_bloque
+        df = leer_archivo_tabular(ruta, formato=formato, nrows=limite)
+    else:
+        limite = FILAS_EXCEL
+        motor = motor_excel_rapido(ruta) or ('openpyxl' if formato['tipo'] == 'xlsx' else 'xlrd')
+        df = pd.read_excel(ruta, dtype=str, engine=motor, nrows=limite)
+    if len(df) < limite:
+        return {'df': df, 'registros_estimados': len(df), 'metodo': 'completo', 'bytes_leidos': tamano}
+    estimados = _filas_hoja_excel(ruta, formato) if formato['tipo'] != 'texto' else None
+    if estimados is None:
+        log.warning("No se pudo estimar el total de registros; se usan los registros leídos")
+    return {'df': df, 'registros_estimados': max(estimados or 0, len(df)), 'metodo': 'primeras_filas',
+            'bytes_leidos': None}
+
+def asignar_estratos(df, fecha_cierre):
+    """Estrato de cada registro preparado: ACTIVIDAD y rango de vencimiento a la fecha de cierre"""
+    dias = (pd.Timestamp(fecha_cierre) - df['FECHA VTO_DT']).dt.days
+    rangos = rango_vencimiento(dias.clip(lower=0)).where(dias.notna(), ESTRATO_SIN_FECHA)
+    actividad = df['ACTIVIDAD'].fillna('').astype(str).str.strip() if 'ACTIVIDAD' in df.columns else ''
+    return actividad + ' | ' + rangos
+
+def seleccionar_muestra(estratos, tamano=TAMANO_MUESTRA, minimo=MINIMO_POR_ESTRATO, semilla=SEMILLA_MUESTRA):
+    """
+    Posiciones de la muestra estratificada y peso relativo de cada una (registros del
+    estrato / registros muestreados del estrato), con asignación proporcional y mínimo.
+    """
+    rng = np.random.default_rng(semilla)
+    codigos, grupos = np.unique(estratos.to_numpy(), return_inverse=True)
+    conteos = np.bincount(grupos)
+    cuotas = np.minimum(np.maximum(np.round(conteos / len(estratos) * tamano), minimo), conteos).astype(int)
+
+    posiciones = []
+    pesos = []
+    for grupo in range(len(codigos)):
+        filas = np.flatnonzero(grupos == grupo)
+        elegidas = np.sort(rng.choice(filas, cuotas[grupo], replace=False))
+        posiciones.append(elegidas)
+        pesos.append(np.full(len(elegidas), conteos[grupo] / cuotas[grupo]))
+    orden = np.argsort(np.concatenate(posiciones), kind='stable')
+    return np.concatenate(posiciones)[orden], np.concatenate(pesos)[orden], conteos, cuotas
+
+def error_estandar_total(valores, pesos, estratos, bloques=None, total_bloques=None):
+    """
+    Error estándar del total estimado. Sin bloques, muestreo estratificado sin reposición
+    de los registros. Con bloques (bloque de cada registro de la muestra, 0..total_bloques-1)
+    la primera etapa es la lectura de bloques: varianza entre los totales ponderados de los
+    bloques (conglomerado último), que incluye también la de la submuestra estratificada.
+    """
+    if bloques is not None and total_bloques and total_bloques > 1:
+        totales = np.bincount(bloques, weights=np.asarray(valores, dtype=float) * pesos, minlength=total_bloques)
+        return float(np.sqrt(total_bloques / (total_bloques - 1) * ((totales - totales.mean()) ** 2).sum()))
+    varianza = 0.0
+    for _, grupo in pd.DataFrame({'valor': valores, 'peso': pesos, 'estrato': estratos}).groupby('estrato'):
+        n = len(grupo)
+        total_estrato = grupo['peso'].sum()
+        if n > 1 and total_estrato > n:
+            varianza += total_estrato ** 2 * (1 - n / total_estrato) * grupo['valor'].var() / n
+    return float(np.sqrt(varianza))
+
+def _redondear(valor):
+    """Número JSON con dos decimales"""
+    return round(float(valor), 2)
+
+def vista_previa(ruta_archivo, fecha_cierre_str=None, filas=FILAS_VISTA, tamano_muestra=TAMANO_MUESTRA):
+    """
+    Vista previa de un archivo PROVCA: totales estimados sobre una muestra estratificada
+    y las primeras filas con el formato final. Devuelve un diccionario (serializable a JSON).
+    """
+    inicio = time.perf_counter()
+    fecha_cierre = obtener_fecha_cierre(fecha_cierre_str)
+
+    # Mensajes de progreso de las etapas omitidos: la salida es el resultado de la vista previa
+    with contextlib.redirect_stdout(io.StringIO()):
+        entrada = validar_archivo_entrada(ruta_archivo, ['PROVCA', 'CARTERA_NOMBRES'])
+        lectura = leer_muestra_archivo(ruta_archivo, entrada['formato'])
+        leidos = lectura['df']
+        if leidos.empty:
+            raise ValueError(f"No se leyeron registros del archivo: {ruta_archivo}")
+
+        preparados = preparar_registros(leidos).reset_index(drop=True)
+        if 'FECHA VTO_DT' not in preparados.columns or 'SALDO_NUM' not in preparados.columns:
+            raise ValueError("El archivo no tiene las columnas FECHA VTO y SALDO")
+        estratos = asignar_estratos(preparados, fecha_cierre)
+        posiciones, pesos, conteos, cuotas = seleccionar_muestra(estratos, tamano_muestra)
+
+        # Muestra y primeras filas del archivo, procesadas juntas
+        vista = np.arange(min(filas, len(preparados)))
+        seleccion = np.union1d(posiciones, vista)
+        resultado = preparados.iloc[seleccion].copy()
+        resolver_clientes([resultado])
+        resultado = calcular_vencimientos(resultado, fecha_cierre.strftime('%Y-%m-%d'))
+        en_muestra = np.isin(seleccion, posiciones)
+        corte = preparar_corte_historico(resultado[en_muestra])
+        formateadas = aplicar_formato_final(resultado[np.isin(seleccion, vista)])
+
+    # Peso de cada registro de la muestra respecto al total estimado del archivo
+    factor = lectura['registros_estimados'] / len(preparados)
+    pesos = pesos * factor
+    estratos_muestra = estratos.iloc[posiciones].to_numpy()
+    bloques = lectura.get('bloques')
+    if bloques is not None:
+        bloques = bloques[posiciones]
+        tipo_error = 'bloques'
+    elif lectura['metodo'] == 'completo':
+        tipo_error = 'estratificado'
+    else:
+        # Primeras filas (o bloques con líneas que no se pudieron leer): el error estándar
+        # no recoge la variación entre partes del archivo
+        tipo_error = 'cota_inferior'
+
+    def estimar(columna):
+        return _redondear((corte[columna].to_numpy() * pesos).sum()) if columna in corte.columns else None
+
+    saldo_por_actividad = pd.Series(corte['SALDO'].to_numpy() * pesos) \
+        .groupby(preparados['ACTIVIDAD'].iloc[posiciones].astype(str).str.strip().to_numpy()).sum() \
+        if 'ACTIVIDAD' in preparados.columns else pd.Series(dtype=float)
+
+    return {
+        'archivo': ruta_archivo,
+        'fecha_cierre': fecha_cierre.strftime('%Y-%m-%d'),
+        'esquema': entrada['esquema'],
+        'metodo_lectura': lectura['metodo'],
+        'registros_leidos': len(leidos),
+        'bytes_leidos': lectura['bytes_leidos'],
+        'registros_estimados': int(lectura['registros_estimados']),
+        'registros_muestra': int(len(posiciones)),
+        'estratos': {
+            str(codigo): {'registros_leidos': int(conteo), 'muestra': int(cuota)}
+            for codigo, conteo, cuota in zip(np.unique(estratos.to_numpy()), conteos, cuotas)
+        },
+        'estimaciones': {
+            'saldo_total': estimar('SALDO'),
+            'error_estandar_saldo': _redondear(error_estandar_total(corte['SALDO'].to_numpy(), pesos, estratos_muestra,
+                                                                    bloques, lectura.get('bloques_leidos'))),
+            'tipo_error_estandar': tipo_error,
+            'saldo_vencido': estimar('SALDO VENCIDO'),
+            'dotacion': estimar('VALOR DOTACION'),
+            'saldo_por_rango': {rango: estimar(rango) for rango in RANGOS_RESUMEN},
+            'saldo_por_actividad': {actividad: _redondear(valor) for actividad, valor in saldo_por_actividad.items()}
+        },
+        'columnas': list(formateadas.columns),
+        'filas': formateadas.astype(str).to_dict(orient='records'),
+        'segundos': round(time.perf_counter() - inicio, 3)
+    }
+
+if __name__ == "__main__":
+    filas, argumentos = extraer_opcion(sys.argv[1:], '--filas')
+    tamano_muestra, argumentos = extraer_opcion(argumentos, '--muestra')
+
+    if len(argumentos) > 0:
+        try:
+            resultado = vista_previa(argumentos[0], argumentos[1] if len(argumentos) > 1 else None,
+                                     int(filas or FILAS_VISTA), int(tamano_muestra or TAMANO_MUESTRA))
+        except Exception as e:
+            print(json.dumps({'error': str(e)}, ensure_ascii=False))
+            sys.exit(1)
+        print(json.dumps(resultado, indent=2, ensure_ascii=False, default=str))
+    else:
+        print("Uso: python vista_previa.py <archivo_provca> [fecha_cierre_YYYY-MM-DD] [--filas N] [--muestra N]")
+        print("Ejemplo: python vista_previa.py PROVCA_202509.csv 2025-09-30 --filas 50")
@@ -141,7 +141,7 @@ function generarNombreUnico($tipo, $extension) {
 }
 
 // Función para ejecutar script de Python con mejor manejo de errores
-function ejecutarScriptPython($script, $archivo) {
+function ejecutarScriptPython($script, $archivo, $argumentos = []) {
     // Verificar que el script existe
     if (!file_exists($script)) {
         throw new Exception("El script de Python no existe: $script");
@@ -157,7 +157,13 @@ function ejecutarScriptPython($script, $archivo) {
         chmod($script, 0755);
     }
     
-    $comando = PYTHON_PATH . " \"$script\" \"$archivo\" 2>&1";
+    // Argumentos posicionales adicionales (fecha de cierre, ruta de salida...)
+    $extra = '';
+    foreach ($argumentos as $argumento) {
+        $extra .= ' ' . escapeshellarg($argumento);
+    }
+    
+    $comando = PYTHON_PATH . " \"$script\" \"$archivo\"$extra 2>&1";
     escribirLog("Ejecutando comando: $comando");
     
     $output = [];
@@ -166,7 +172,7 @@ function ejecutarScriptPython($script, $archivo) {
     
     if ($returnCode !== 0) {
         // Intentar con python3 si falla
-        $comando = PYTHON_PATH_ALT . " \"$script\" \"$archivo\" 2>&1";
+        $comando = PYTHON_PATH_ALT . " \"$script\" \"$archivo\"$extra 2>&1";
         escribirLog("Reintentando con python3: $comando");
         exec($comando, $output, $returnCode);
         
@@ -181,6 +187,21 @@ function ejecutarScriptPython($script, $archivo) {
     return $output;
 }
 
+// Función para leer el resumen JSON que el procesador guarda junto a su archivo de salida
+function leerResumenEjecucion($archivoSalida) {
+    $rutaResumen = preg_replace('/\.xlsx$/i', '', $archivoSalida) . '_resumen.json';
+    if (!file_exists($rutaResumen)) {
+        escribirLog("No se encontró el resumen de ejecución: $rutaResumen");
+        return null;
+    }
+    
+    $resumen = json_decode(file_get_contents($rutaResumen), true);
+    if ($resumen === null) {
+        escribirErrorLog("Resumen de ejecución no válido: $rutaResumen");
+    }
+    return $resumen;
+}
+
 // Función para formatear bytes
 function formatBytes($bytes, $precision = 2) {
     $units = array('B', 'KB', 'MB', 'GB', 'TB');
@@ -126,16 +126,18 @@ if (!file_exists($python_path)) {
 $python_script = '';
 $comando = '';
 
+// Ruta de salida explícita: el procesador guarda el resumen JSON junto a ella
+$prefijo_salida = $tipo === 'cartera' ? 'CARTERA_PROCESADA_' : 'ANTICIPOS_PROCESADOS_';
+$archivo_salida = $output_dir . $prefijo_salida . $timestamp . '.xlsx';
+
 if ($tipo === 'cartera') {
     $python_script = 'PROVCA/procesador_cartera.py';
-    $comando = "\"$python_path\" \"$python_script\" \"$ruta_archivo\"";
-    if ($fecha_cierre) {
-        $comando .= " \"$fecha_cierre\"";
-    }
 } else { // anticipo
     $python_script = 'PROVCA/procesador_anticipos.py';
-    $comando = "\"$python_path\" \"$python_script\" \"$ruta_archivo\"";
 }
+// Tamaño máximo de cada Excel generado (MB): el resto se guarda en archivos _parteN.xlsx
+$max_mb_salida = 100;
+$comando = "\"$python_path\" \"$python_script\" \"$ruta_archivo\" \"" . ($fecha_cierre ? $fecha_cierre : '') . "\" \"$archivo_salida\" --max-mb $max_mb_salida";
 
 // Verificar que existe el script de Python
 if (!file_exists($python_script)) {
@@ -166,23 +168,13 @@ if ($return_var !== 0) {
     responder_json(false, "Error durante el procesamiento. Código: $return_var. Salida: $error_output");
 }
 
-// Buscar archivo de salida generado
-$archivos_salida = glob($output_dir . $tipo . '*_PROCESAD*' . $timestamp . '*.xlsx');
-if (empty($archivos_salida)) {
-    // Buscar archivos más recientes si no encuentra por timestamp exacto
-    $archivos_salida = glob($output_dir . $tipo . '*_PROCESAD*.xlsx');
-    // Ordenar por fecha de modificación (más reciente primero)
-    usort($archivos_salida, function($a, $b) {
-        return filemtime($b) - filemtime($a);
-    });
-}
-
-if (empty($archivos_salida)) {
-    unlink($ruta_archivo); // Eliminar archivo subido
-    responder_json(false, 'No se pudo encontrar el archivo de salida generado');
+// Leer el resumen de la ejecución (totales ya calculados por el procesador)
+$ruta_resumen = preg_replace('/\.xlsx$/i', '', $archivo_salida) . '_resumen.json';
+$resumen = file_exists($ruta_resumen) ? json_decode(file_get_contents($ruta_resumen), true) : null;
+if ($resumen && !empty($resumen['archivos']['excel'])) {
+    $archivo_salida = $resumen['archivos']['excel'];
 }
 
-$archivo_salida = $archivos_salida[0];
 $nombre_archivo_salida = basename($archivo_salida);
 
 // Verificar que el archivo de salida existe y no está vacío
@@ -201,6 +193,37 @@ $mensaje_exito = "El archivo de $tipo_titulo se ha procesado correctamente.";
 // Crear enlace de descarga
 $url_descarga = "descargar_resultado.php?file=" . urlencode($archivo_salida);
 
+// Enlaces de las partes adicionales si el resultado se dividió por tamaño
+$partes_html = '';
+if ($resumen && !empty($resumen['archivos']['partes'])) {
+    foreach (array_slice($resumen['archivos']['partes'], 1) as $indice => $parte) {
+        $url_parte = "descargar_resultado.php?file=" . urlencode($parte);
+        $partes_html .= "
+        <a href='$url_parte' class='btn-descarga' target='_blank'>
+            <i class='fas fa-download'></i>
+            Descargar Parte " . ($indice + 2) . "
+        </a>";
+    }
+}
+
+// Totales principales del resumen
+$resumen_html = '';
+if ($resumen) {
+    $formatear = function($valor) {
+        return $valor === null ? '-' : number_format($valor, 2, ',', '.');
+    };
+    $errores = isset($resumen['errores_validacion']) ? array_sum($resumen['errores_validacion']) : 0;
+    $resumen_html = "
+        <div class='archivo-info'>
+            <strong>Registros:</strong> " . number_format($resumen['registros'], 0, ',', '.') . "<br>
+            <strong>Saldo total:</strong> " . $formatear($resumen['saldo_total']) . "<br>
+            <strong>Saldo vencido:</strong> " . $formatear($resumen['saldo_vencido']) . "<br>
+            <strong>Dotación:</strong> " . $formatear($resumen['dotacion']) . "<br>
+            <strong>Errores de validación:</strong> $errores<br>
+            <strong>Tiempo de proceso:</strong> " . $resumen['tiempos']['total'] . " s
+        </div>";
+}
+
 // Respuesta HTML para el frontend
 $html_response = "
 <div class='resultado-procesamiento'>
@@ -213,12 +236,13 @@ $html_response = "
         <div class='archivo-info'>
             <strong>Archivo generado:</strong> $nombre_archivo_salida
         </div>
+        $resumen_html
     </div>
     <div class='resultado-actions'>
         <a href='$url_descarga' class='btn-descarga' target='_blank'>
             <i class='fas fa-download'></i>
             Descargar Archivo
-        </a>
+        </a>$partes_html
     </div>
 </div>";
 
@@ -40,9 +40,13 @@ try {
 
     escribirLog("Archivo anticipos subido: $nombreOriginal -> $rutaDestino");
 
-    // Ejecutar script de Python para procesar anticipos
+    // Ruta de salida explícita: el resumen JSON se guarda junto a ella
+    $timestamp = date('Y-m-d_H-i-s');
+    $rutaSalida = DIR_RESULTADOS . 'ANTICIPOS_PROCESADOS_' . $timestamp . '_' . uniqid() . '.xlsx';
+
+    // Ejecutar script de Python para procesar anticipos (fecha de cierre vacía: la de por defecto)
     try {
-        $output = ejecutarScriptPython(SCRIPT_ANTICIPOS, $rutaDestino);
+        $output = ejecutarScriptPython(SCRIPT_ANTICIPOS, $rutaDestino, ['', $rutaSalida]);
         escribirLog("Procesamiento de anticipos completado para: $nombreOriginal");
     } catch (Exception $e) {
         // Limpiar archivo temporal en caso de error
@@ -52,14 +56,16 @@ try {
         throw $e;
     }
 
-    // Buscar archivo de resultado generado
-    $timestamp = date('Y-m-d_H-i-s');
-    $archivosResultado = glob(DIR_RESULTADOS . '*anticipos*' . $timestamp . '*');
+    // Resultado a partir del resumen de ejecución (sin buscar ni abrir el Excel generado)
+    $resumen = leerResumenEjecucion($rutaSalida);
     $archivoResultado = null;
     
-    if (!empty($archivosResultado)) {
-        $archivoResultado = $archivosResultado[0];
-        escribirLog("Archivo de resultado encontrado: " . basename($archivoResultado));
+    if ($resumen && !empty($resumen['archivos']['excel'])) {
+        $archivoResultado = $resumen['archivos']['excel'];
+        escribirLog("Archivo de resultado: " . basename($archivoResultado));
+    } elseif (file_exists($rutaSalida)) {
+        $archivoResultado = $rutaSalida;
+        escribirLog("Archivo de resultado sin resumen: " . basename($archivoResultado));
     } else {
         escribirLog("No se encontró archivo de resultado para: $nombreOriginal");
     }
@@ -74,7 +80,8 @@ try {
             'tamano_archivo' => formatBytes($tamanoArchivo),
             'timestamp' => $timestamp,
             'tipo_procesamiento' => 'Anticipos',
-            'ruta_resultado' => $archivoResultado ? $archivoResultado : null
+            'ruta_resultado' => $archivoResultado ? $archivoResultado : null,
+            'resumen' => $resumen
         ]
     ];
 